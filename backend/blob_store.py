@@ -0,0 +1,295 @@
+"""
+Blob Store
+Content-addressed storage for uploaded files and generated documents.
+
+Blobs are keyed by the SHA-256 of their content, so identical uploads are
+stored once. Only the key and metadata (name, type, size) are kept in the
+JSONB documents; the bytes live in the blob store.
+
+Backends (BLOB_STORE_BACKEND):
+- postgres: BYTEA table document_blobs in the application database (default)
+- azure: Azure Blob Storage container AZURE_STORAGE_CONTAINER_NAME
+- local: files below BLOB_STORE_PATH (development only: container file
+  systems are neither persistent nor shared between replicas)
+"""
+
+import abc
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE_BACKEND = os.environ.get("BLOB_STORE_BACKEND", "postgres")
+BLOB_STORE_PATH = os.environ.get("BLOB_STORE_PATH", str(Path(__file__).parent / "data" / "blobs"))
+AZURE_STORAGE_CONNECTION_STRING = os.environ.get("AZURE_STORAGE_CONNECTION_STRING", "")
+AZURE_STORAGE_CONTAINER_NAME = os.environ.get("AZURE_STORAGE_CONTAINER_NAME", "documents")
+# Read and write size of the postgres backend when streaming content
+PG_READ_SIZE = 1024 * 1024
+
+
+def content_key(data: bytes) -> str:
+    """Blob key for content (hex SHA-256)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+async def _read_chunks(fileobj, size: int):
+    """Async iterator over a blocking file object in pieces of at most size bytes."""
+    while chunk := await asyncio.to_thread(fileobj.read, size):
+        yield chunk
+
+
+class BlobStore(abc.ABC):
+    """Interface of all blob store backends."""
+
+    @abc.abstractmethod
+    async def put(self, data: bytes, content_type: str = "application/octet-stream") -> str:
+        """Store content (no-op if already present) and return its key."""
+
+    @abc.abstractmethod
+    async def put_file(self, fileobj, key: str, content_type: str = "application/octet-stream") -> str:
+        """Store a file object's content under its precomputed content key (streamed)."""
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Content of a blob; raises BlobNotFound."""
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether a blob with this key is stored."""
+
+    @abc.abstractmethod
+    async def size(self, key: str) -> int:
+        """Size of a blob in bytes; raises BlobNotFound."""
+
+    @abc.abstractmethod
+    def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        """Async iterator over bytes start..end (inclusive) of a blob."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        """Remove a blob (missing blobs are ignored)."""
+
+
+class LocalFilesystemBlobStore(BlobStore):
+    """Blobs as files in a two-level fan-out directory tree (ab/cd/abcd...)."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        if len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+            raise ValueError(f"Invalid blob key: {key}")
+        return self.root / key[:2] / key[2:4] / key
+
+    def _write(self, key: str, data: bytes = None, fileobj=None):
+        path = self._path(key)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see partial content
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if fileobj is not None:
+                    shutil.copyfileobj(fileobj, f, 1024 * 1024)
+                else:
+                    f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _read(self, key: str) -> bytes:
+        try:
+            return self._path(key).read_bytes()
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    async def put(self, data: bytes, content_type: str = "application/octet-stream") -> str:
+        key = content_key(data)
+        await asyncio.to_thread(self._write, key, data)
+        return key
+
+    async def put_file(self, fileobj, key: str, content_type: str = "application/octet-stream") -> str:
+        await asyncio.to_thread(self._write, key, fileobj=fileobj)
+        return key
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._read, key)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._path(key).exists)
+
+    async def size(self, key: str) -> int:
+        try:
+            return (await asyncio.to_thread(self._path(key).stat)).st_size
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+
+    async def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        try:
+            f = await asyncio.to_thread(open, self._path(key), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+
+
+class PostgresBlobStore(BlobStore):
+    """Blobs as rows of a PgBinaryStore, keyed by their content hash."""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def put(self, data: bytes, content_type: str = "application/octet-stream") -> str:
+        key = content_key(data)
+        if not await self.store.head(key):
+            await self.store.put(key, data, content_type)
+        return key
+
+    async def put_file(self, fileobj, key: str, content_type: str = "application/octet-stream") -> str:
+        if not await self.store.head(key):
+            await self.store.put_stream(key, _read_chunks(fileobj, PG_READ_SIZE), content_type)
+        return key
+
+    async def get(self, key: str) -> bytes:
+        entry = await self.store.get(key)
+        if entry is None:
+            raise BlobNotFound(key)
+        return entry["data"]
+
+    async def exists(self, key: str) -> bool:
+        return await self.store.head(key) is not None
+
+    async def size(self, key: str) -> int:
+        meta = await self.store.head(key)
+        if meta is None:
+            raise BlobNotFound(key)
+        return meta["size"]
+
+    async def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        # One query per read block, cut into chunk_size pieces
+        read_size = chunk_size * max(1, PG_READ_SIZE // chunk_size)
+        offset = start
+        while offset <= end:
+            block = await self.store.get_range(key, offset, min(read_size, end - offset + 1))
+            if block is None:
+                raise BlobNotFound(key)
+            if not block:
+                break
+            for i in range(0, len(block), chunk_size):
+                yield block[i:i + chunk_size]
+            offset += len(block)
+
+    async def delete(self, key: str):
+        await self.store.delete(key)
+
+
+class AzureBlobStore(BlobStore):
+    """Blobs in an Azure Blob Storage container, named by their key."""
+
+    def __init__(self, connection_string: str, container: str):
+        from azure.storage.blob.aio import BlobServiceClient
+        self._service = BlobServiceClient.from_connection_string(connection_string)
+        self._container = self._service.get_container_client(container)
+
+    async def put(self, data: bytes, content_type: str = "application/octet-stream") -> str:
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import ContentSettings
+        key = content_key(data)
+        try:
+            # overwrite=False: identical content is already there
+            await self._container.upload_blob(
+                key, data, overwrite=False,
+                content_settings=ContentSettings(content_type=content_type),
+            )
+        except ResourceExistsError:
+            pass
+        return key
+
+    async def put_file(self, fileobj, key: str, content_type: str = "application/octet-stream") -> str:
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import ContentSettings
+        blob = self._container.get_blob_client(key)
+        if await blob.exists():
+            return key
+        try:
+            # The SDK reads and uploads the stream in blocks
+            await blob.upload_blob(
+                fileobj, overwrite=False, content_settings=ContentSettings(content_type=content_type)
+            )
+        except ResourceExistsError:
+            pass
+        return key
+
+    async def get(self, key: str) -> bytes:
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            downloader = await self._container.download_blob(key)
+            return await downloader.readall()
+        except ResourceNotFoundError:
+            raise BlobNotFound(key)
+
+    async def exists(self, key: str) -> bool:
+        return await self._container.get_blob_client(key).exists()
+
+    async def size(self, key: str) -> int:
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            props = await self._container.get_blob_client(key).get_blob_properties()
+            return props.size
+        except ResourceNotFoundError:
+            raise BlobNotFound(key)
+
+    async def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            downloader = await self._container.download_blob(key, offset=start, length=end - start + 1)
+        except ResourceNotFoundError:
+            raise BlobNotFound(key)
+        async for chunk in downloader.chunks():
+            yield chunk
+
+    async def delete(self, key: str):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            await self._container.delete_blob(key)
+        except ResourceNotFoundError:
+            pass
+
+
+def create_blob_store(db) -> BlobStore:
+    """Blob store configured via BLOB_STORE_BACKEND."""
+    if BLOB_STORE_BACKEND == "azure":
+        if not AZURE_STORAGE_CONNECTION_STRING:
+            raise RuntimeError("BLOB_STORE_BACKEND=azure requires AZURE_STORAGE_CONNECTION_STRING")
+        logger.info(f"Blob store: Azure container '{AZURE_STORAGE_CONTAINER_NAME}'")
+        return AzureBlobStore(AZURE_STORAGE_CONNECTION_STRING, AZURE_STORAGE_CONTAINER_NAME)
+    if BLOB_STORE_BACKEND == "local":
+        logger.warning(f"Blob store: local filesystem at {BLOB_STORE_PATH} (not persistent in containers)")
+        return LocalFilesystemBlobStore(BLOB_STORE_PATH)
+    if BLOB_STORE_BACKEND != "postgres":
+        raise RuntimeError(f"Unknown BLOB_STORE_BACKEND '{BLOB_STORE_BACKEND}'")
+    logger.info("Blob store: PostgreSQL table document_blobs")
+    return PostgresBlobStore(db.binary("document_blobs"))
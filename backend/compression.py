@@ -0,0 +1,123 @@
+"""
+Field Compression
+zstd compression of large JSONB fields into a binary side column.
+
+Designated fields of a collection (e.g. raw email HTML) that exceed
+min_size are removed from the JSONB document, serialised together and
+stored zstd-compressed in the table's "packed" BYTEA column. The document
+keeps a "_packed" list naming the moved fields. Reads only fetch and
+decompress the side column when the projection asks for a packed field.
+
+A dictionary trained on existing values can be added per collection; the
+zstd frame records the dictionary id, so values compressed with older
+dictionaries stay readable.
+"""
+
+import json
+import os
+
+import zstandard
+
+import metrics
+
+ZSTD_LEVEL = int(os.environ.get("ZSTD_LEVEL", "6"))
+MIN_SIZE = 1024
+
+# Collection -> fields stored compressed (registered via db.compress at startup)
+COMPRESSED_FIELDS = {
+    "klient_dokumente": ["file_data"],       # Legacy base64 documents (new ones live in the blob store)
+    "klient_kommunikation": ["inhalt"],      # Email bodies
+    "email_allgemein": ["inhalt"],
+}
+
+# Marker listing the fields that live in the side column
+PACKED_MARKER = "_packed"
+
+
+def _value_size(value) -> int:
+    return len(value) if isinstance(value, str) else len(json.dumps(value, default=str))
+
+
+class FieldCompressor:
+    def __init__(self, table: str, fields, min_size: int = MIN_SIZE, level: int = ZSTD_LEVEL):
+        self.table = table
+        self.fields = tuple(fields)
+        self.min_size = min_size
+        self.level = level
+        self.dictionary_id = 0
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressors = {0: zstandard.ZstdDecompressor()}
+
+        self.raw_bytes = metrics.counter(
+            f"db_{table}_compression_raw_bytes_total", f"Uncompressed bytes of packed {table} fields"
+        )
+        self.stored_bytes = metrics.counter(
+            f"db_{table}_compression_stored_bytes_total", f"Compressed bytes of packed {table} fields"
+        )
+        self.ratio = metrics.gauge(f"db_{table}_compression_ratio", f"Raw/stored size of packed {table} fields")
+        self.decompressions = metrics.counter(f"db_{table}_decompressions_total", f"Side column reads of {table}")
+
+    def add_dictionary(self, data: bytes, active: bool = True) -> int:
+        """Register a trained dictionary; active ones are used for new writes."""
+        dictionary = zstandard.ZstdCompressionDict(data)
+        dict_id = dictionary.dict_id()
+        self._decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        if active:
+            self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+            self.dictionary_id = dict_id
+        return dict_id
+
+    def wants_packed(self, projection: dict = None) -> bool:
+        """Whether a read with this projection needs the side column."""
+        fields = {k: v for k, v in (projection or {}).items() if k != "_id"}
+        values = set(fields.values())
+        if values == {0}:
+            return any(f not in fields for f in self.fields)
+        if values == {1}:
+            return any(f in fields for f in self.fields)
+        return True
+
+    def pack(self, doc: dict):
+        """Split doc into (document for JSONB, compressed side column or None)."""
+        doc = {k: v for k, v in doc.items() if k != PACKED_MARKER}
+        packed = {f: doc[f] for f in self.fields if doc.get(f) is not None and _value_size(doc[f]) >= self.min_size}
+        if not packed:
+            return doc, None
+        for field in packed:
+            del doc[field]
+        doc[PACKED_MARKER] = sorted(packed)
+        raw = json.dumps(packed, default=str).encode()
+        blob = self._compressor.compress(raw)
+        self.raw_bytes.inc(len(raw))
+        self.stored_bytes.inc(len(blob))
+        if self.stored_bytes.value:
+            self.ratio.set(round(self.raw_bytes.value / self.stored_bytes.value, 3))
+        return doc, blob
+
+    def unpack(self, blob: bytes) -> dict:
+        dict_id = zstandard.get_frame_parameters(blob).dict_id
+        decompressor = self._decompressors.get(dict_id)
+        if decompressor is None:
+            raise LookupError(f"Unknown zstd dictionary {dict_id} for {self.table}")
+        self.decompressions.inc()
+        return json.loads(decompressor.decompress(blob))
+
+    def restore(self, doc: dict, blob: bytes = None, projection: dict = None) -> dict:
+        """Put packed fields back into doc, honouring the projection."""
+        doc.pop(PACKED_MARKER, None)
+        if not blob:
+            return doc
+        fields = {k: v for k, v in (projection or {}).items() if k != "_id"}
+        values = set(fields.values())
+        for field, value in self.unpack(blob).items():
+            if values == {0} and field in fields:
+                continue
+            if values == {1} and field not in fields:
+                continue
+            doc[field] = value
+        return doc
+
+
+def train_dictionary(samples: list, dict_size: int = 64 * 1024) -> bytes:
+    """Train a zstd dictionary from sample values (bytes)."""
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
@@ -11,17 +11,38 @@ Extended version for Immobilienverwaltung with:
 - $inc update operator
 - upsert support
 - distinct() method
+- group_count() for GROUP BY aggregations
 - Field exclusion/inclusion projections
+- Change notifications (local callbacks + PostgreSQL LISTEN/NOTIFY)
+- Advisory locks for coordination between workers and replicas
+- Binary stores (BYTEA tables) for file content kept out of JSONB documents
+- Transparent zstd compression of designated large fields (see compression.py)
 """
 
+import asyncio
 import asyncpg
+import hashlib
 import json
 import os
 import logging
 import re
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from compression import FieldCompressor, train_dictionary
 
 logger = logging.getLogger(__name__)
 
+# Channel used to propagate collection changes to other workers/replicas
+CHANGE_CHANNEL = "domusvita_changes"
+
+# Identifies this process in NOTIFY payloads so it can skip its own echoes
+_PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+# Connections reserved for holding advisory locks (see PgDatabase.advisory_lock)
+LOCK_POOL_SIZE = int(os.environ.get("PG_LOCK_POOL_SIZE", "5"))
+
 
 class UpdateResult:
     """Mimics pymongo UpdateResult / DeleteResult."""
@@ -188,34 +209,46 @@ class PgCursor:
         self._skip = max(0, int(offset))
         return self
 
-    async def to_list(self, limit: int) -> list:
+    async def to_list(self, limit) -> list:
+        """Fetch up to limit documents (None: all of them, as in Motor)."""
         await self.collection._ensure_table()
         where, params = _build_where(self.query)
-        select_expr = _build_select(self.projection)
+        select_expr = self.collection._select_columns(self.projection)
         sql = f"SELECT {select_expr} FROM {self.collection.table}"
         if where:
             sql += f" WHERE {where}"
         if self._sort_field:
             # Use -> (JSONB) for type-aware sorting (numbers sort numerically)
             sql += f" ORDER BY data->'{self._sort_field}' {self._sort_dir}"
-        sql += f" LIMIT {int(limit)}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
         if self._skip > 0:
             sql += f" OFFSET {self._skip}"
 
         async with self.collection.pool.acquire() as conn:
             rows = await conn.fetch(sql, *params)
-            return [json.loads(row["data"]) for row in rows]
+            return [self.collection._decode(row, self.projection) for row in rows]
 
 
 class PgCollection:
     """MongoDB-compatible collection backed by a PostgreSQL table with JSONB."""
 
-    def __init__(self, pool, table_name: str):
+    def __init__(self, pool, table_name: str, database=None):
         _validate_table_name(table_name)
         self.pool = pool
         self.table = table_name
+        self.database = database
+        self.compressor = None
         self._table_created = False
 
+    async def _changed(self, conn, fields=None):
+        """Announce a write to this collection to all change listeners.
+
+        fields: the fields an update wrote, None for inserts and deletes.
+        """
+        if self.database is not None:
+            await self.database._publish_change(self.table, conn, fields)
+
     async def _ensure_table(self):
         if self._table_created:
             return
@@ -230,12 +263,43 @@ class PgCollection:
                 CREATE INDEX IF NOT EXISTS idx_{self.table}_gin
                 ON {self.table} USING GIN (data)
             """)
+            if self.compressor:
+                # zstd-compressed side column for large fields; already compressed, skip TOAST compression
+                await conn.execute(f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS packed BYTEA")
+                await conn.execute(f"ALTER TABLE {self.table} ALTER COLUMN packed SET STORAGE EXTERNAL")
         self._table_created = True
 
+    def _select_columns(self, projection=None) -> str:
+        """SELECT list for a read; includes the side column only if the projection needs it."""
+        select_expr = _build_select(projection)
+        if self.compressor and self.compressor.wants_packed(projection):
+            select_expr += ", packed"
+        return select_expr
+
+    def _decode(self, row, projection=None) -> dict:
+        doc = json.loads(row["data"])
+        if self.compressor:
+            self.compressor.restore(doc, row.get("packed"), projection)
+        return doc
+
+    def _encode(self, doc) -> tuple:
+        """(JSONB text, side column) for a document to be written."""
+        packed = None
+        if self.compressor:
+            doc, packed = self.compressor.pack(doc)
+        return json.dumps(doc, default=str), packed
+
+    async def _insert(self, conn, doc):
+        data, packed = self._encode(doc)
+        if self.compressor:
+            await conn.execute(f"INSERT INTO {self.table} (data, packed) VALUES ($1::jsonb, $2)", data, packed)
+        else:
+            await conn.execute(f"INSERT INTO {self.table} (data) VALUES ($1::jsonb)", data)
+
     async def find_one(self, query=None, projection=None):
         await self._ensure_table()
         where, params = _build_where(query or {})
-        select_expr = _build_select(projection)
+        select_expr = self._select_columns(projection)
         sql = f"SELECT {select_expr} FROM {self.table}"
         if where:
             sql += f" WHERE {where}"
@@ -243,7 +307,7 @@ class PgCollection:
 
         async with self.pool.acquire() as conn:
             row = await conn.fetchrow(sql, *params)
-            return json.loads(row["data"]) if row else None
+            return self._decode(row, projection) if row else None
 
     def find(self, query=None, projection=None):
         return PgCursor(self, query or {}, projection)
@@ -251,20 +315,17 @@ class PgCollection:
     async def insert_one(self, doc):
         await self._ensure_table()
         async with self.pool.acquire() as conn:
-            await conn.execute(
-                f"INSERT INTO {self.table} (data) VALUES ($1::jsonb)",
-                json.dumps(doc, default=str)
-            )
+            await self._insert(conn, doc)
+            await self._changed(conn)
 
     async def insert_many(self, docs):
         await self._ensure_table()
         async with self.pool.acquire() as conn:
             async with conn.transaction():
                 for doc in docs:
-                    await conn.execute(
-                        f"INSERT INTO {self.table} (data) VALUES ($1::jsonb)",
-                        json.dumps(doc, default=str)
-                    )
+                    await self._insert(conn, doc)
+            if docs:
+                await self._changed(conn)
 
     async def update_one(self, query, update, upsert=False):
         await self._ensure_table()
@@ -273,6 +334,9 @@ class PgCollection:
         where, where_params = _build_where(query)
         where_clause = where if where else "TRUE"
 
+        if self.compressor and any(f in self.compressor.fields for f in [*set_data, *inc_data]):
+            return await self._update_packed(query, where_clause, where_params, set_data, inc_data, upsert)
+
         # Build the data expression
         data_expr = "data"
         params = list(where_params)
@@ -312,14 +376,73 @@ class PgCollection:
                 doc.update(set_data)
                 for field, amount in inc_data.items():
                     doc[field] = doc.get(field, 0) + int(amount)
-                await conn.execute(
-                    f"INSERT INTO {self.table} (data) VALUES ($1::jsonb)",
-                    json.dumps(doc, default=str)
-                )
+                await self._insert(conn, doc)
+                await self._changed(conn)
                 return UpdateResult(1)
 
+            if count:
+                await self._changed(conn, [*set_data, *inc_data])
             return UpdateResult(count)
 
+    async def _update_packed(self, query, where_clause, where_params, set_data, inc_data, upsert):
+        """update_one touching compressed fields: read, modify and re-pack in Python."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                row = await conn.fetchrow(
+                    f"SELECT ctid, data, packed FROM {self.table} WHERE {where_clause} LIMIT 1 FOR UPDATE",
+                    *where_params
+                )
+                if row is None:
+                    if not upsert:
+                        return UpdateResult(0)
+                    doc = dict(query)
+                else:
+                    doc = self._decode(row)
+                doc.update(set_data)
+                for field, amount in inc_data.items():
+                    doc[field] = int(doc.get(field) or 0) + int(amount)
+                if row is None:
+                    await self._insert(conn, doc)
+                else:
+                    data, packed = self._encode(doc)
+                    await conn.execute(
+                        f"UPDATE {self.table} SET data = $1::jsonb, packed = $2 WHERE ctid = $3",
+                        data, packed, row["ctid"]
+                    )
+            await self._changed(conn, None if row is None else [*set_data, *inc_data])
+            return UpdateResult(1)
+
+    async def repack(self, batch_size: int = 200) -> int:
+        """Move large compressed fields of rows written before compression into the side column."""
+        await self._ensure_table()
+        if not self.compressor:
+            return 0
+        exists = " OR ".join(f"data ? '{field}'" for field in self.compressor.fields)
+        moved = 0
+        async with self.pool.acquire() as conn:
+            last_ctid = None
+            while True:
+                # Rows with no large values keep packed NULL, so walk by ctid instead of re-querying them
+                rows = await conn.fetch(
+                    f"""SELECT ctid, data FROM {self.table}
+                        WHERE packed IS NULL AND ({exists}) AND ($1::tid IS NULL OR ctid > $1::tid)
+                        ORDER BY ctid LIMIT {int(batch_size)}""",
+                    last_ctid
+                )
+                if not rows:
+                    break
+                async with conn.transaction():
+                    for row in rows:
+                        data, packed = self._encode(json.loads(row["data"]))
+                        if packed is not None:
+                            await conn.execute(
+                                f"UPDATE {self.table} SET data = $1::jsonb, packed = $2 WHERE ctid = $3",
+                                data, packed, row["ctid"]
+                            )
+                            moved += 1
+                last_ctid = rows[-1]["ctid"]
+        return moved
+
     async def delete_one(self, query):
         await self._ensure_table()
         where, params = _build_where(query)
@@ -335,6 +458,8 @@ class PgCollection:
         async with self.pool.acquire() as conn:
             result = await conn.execute(sql, *params)
             count = int(result.split()[-1])
+            if count:
+                await self._changed(conn)
             return UpdateResult(count)
 
     async def delete_many(self, query=None):
@@ -347,6 +472,8 @@ class PgCollection:
         async with self.pool.acquire() as conn:
             result = await conn.execute(sql, *params)
             count = int(result.split()[-1])
+            if count:
+                await self._changed(conn)
             return UpdateResult(count)
 
     async def count_documents(self, query=None):
@@ -368,7 +495,37 @@ class PgCollection:
             rows = await conn.fetch(sql)
             return [row[0] for row in rows]
 
-    async def create_index(self, field: str, unique: bool = False):
+    async def group_count(self, fields: list, query=None) -> list:
+        """Count documents grouped by one or more fields (SQL GROUP BY).
+
+        Returns a list of dicts with the group field values plus "count", e.g.
+        [{"pflege_wg_id": "wg-sterndamm", "status": "frei", "count": 1}, ...]
+        """
+        await self._ensure_table()
+        for field in fields:
+            _validate_field_name(field)
+        where, params = _build_where(query or {})
+        columns = ", ".join(f"data->>'{field}'" for field in fields)
+        sql = f"SELECT {columns}, COUNT(*) FROM {self.table}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" GROUP BY {', '.join(str(i + 1) for i in range(len(fields)))}"
+
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(sql, *params)
+            return [
+                {**{field: row[i] for i, field in enumerate(fields)}, "count": row[len(fields)]}
+                for row in rows
+            ]
+
+    async def create_index(self, field: str, unique: bool = False, required: bool = False):
+        """Create an index on data->>field unless it exists.
+
+        Failures are only logged, unless required is set: then they raise,
+        and so does an existing non-unique index where unique is asked for.
+        Use it for indexes correctness depends on (e.g. a unique key used
+        for deduplication), so startup fails instead of running without.
+        """
         await self._ensure_table()
         _validate_field_name(field)
         index_name = f"idx_{self.table}_{field}"
@@ -383,7 +540,150 @@ class PgCollection:
             try:
                 await conn.execute(sql)
             except Exception as e:
+                if required:
+                    raise RuntimeError(f"Index creation for {self.table}.{field} failed: {e}") from e
                 logger.warning(f"Index creation for {self.table}.{field}: {e}")
+                return
+            if required and unique:
+                # IF NOT EXISTS only compares names
+                is_unique = await conn.fetchval(
+                    "SELECT i.indisunique FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = $1",
+                    index_name,
+                )
+                if not is_unique:
+                    raise RuntimeError(f"Index {index_name} exists but is not unique")
+
+
+class PgBinaryStore:
+    """Key/value store for binary content backed by a BYTEA table.
+
+    Keeps large payloads (images, files) out of the JSONB documents so that
+    document queries never have to read them. Each entry carries its content
+    type and a strong ETag (SHA-256 of the content).
+    """
+
+    def __init__(self, pool, table_name: str):
+        _validate_table_name(table_name)
+        self.pool = pool
+        self.table = table_name
+        self._table_created = False
+
+    async def _ensure_table(self):
+        if self._table_created:
+            return
+        async with self.pool.acquire() as conn:
+            await conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    content_type TEXT NOT NULL,
+                    etag TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    data BYTEA NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            # Content is usually already compressed (JPEG/WebP/PDF) - skip TOAST compression
+            await conn.execute(f"ALTER TABLE {self.table} ALTER COLUMN data SET STORAGE EXTERNAL")
+        self._table_created = True
+
+    async def put(self, key: str, data: bytes, content_type: str) -> str:
+        """Store content under key (overwriting) and return its ETag."""
+        await self._ensure_table()
+        etag = hashlib.sha256(data).hexdigest()[:32]
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                f"""INSERT INTO {self.table} (key, content_type, etag, size, data)
+                    VALUES ($1, $2, $3, $4, $5)
+                    ON CONFLICT (key) DO UPDATE SET content_type = EXCLUDED.content_type,
+                        etag = EXCLUDED.etag, size = EXCLUDED.size, data = EXCLUDED.data""",
+                key, content_type, etag, len(data), data
+            )
+        return etag
+
+    async def put_stream(self, key: str, chunks, content_type: str) -> str:
+        """Store the content of an async iterator of chunks under key (overwriting).
+
+        Each chunk is appended with its own UPDATE, so only one chunk is held
+        in memory. The writes share a transaction: readers see the old entry
+        (or none) until the last chunk is stored.
+        """
+        await self._ensure_table()
+        digest = hashlib.sha256()
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    f"""INSERT INTO {self.table} (key, content_type, etag, size, data)
+                        VALUES ($1, $2, '', 0, '')
+                        ON CONFLICT (key) DO UPDATE SET content_type = EXCLUDED.content_type,
+                            etag = '', size = 0, data = ''""",
+                    key, content_type
+                )
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    await conn.execute(
+                        f"UPDATE {self.table} SET data = data || $2, size = size + $3 WHERE key = $1",
+                        key, chunk, len(chunk)
+                    )
+                etag = digest.hexdigest()[:32]
+                await conn.execute(f"UPDATE {self.table} SET etag = $2 WHERE key = $1", key, etag)
+        return etag
+
+    async def head(self, key: str):
+        """Metadata (content_type, etag, size) without reading the content."""
+        await self._ensure_table()
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                f"SELECT content_type, etag, size FROM {self.table} WHERE key = $1", key
+            )
+            return dict(row) if row else None
+
+    async def get(self, key: str):
+        """Metadata plus content (in 'data'), or None."""
+        await self._ensure_table()
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                f"SELECT content_type, etag, size, data FROM {self.table} WHERE key = $1", key
+            )
+            return dict(row) if row else None
+
+    async def get_range(self, key: str, offset: int, length: int):
+        """length bytes of content from offset (0-based), or None if key is missing.
+
+        Content is stored uncompressed (STORAGE EXTERNAL), so PostgreSQL only
+        reads the TOAST chunks covering the range.
+        """
+        await self._ensure_table()
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval(
+                f"SELECT substring(data FROM $2 FOR $3) FROM {self.table} WHERE key = $1",
+                key, offset + 1, length
+            )
+
+    async def delete(self, key: str) -> bool:
+        """Delete one entry; False if it did not exist."""
+        await self._ensure_table()
+        async with self.pool.acquire() as conn:
+            result = await conn.execute(f"DELETE FROM {self.table} WHERE key = $1", key)
+            return result.split()[-1] != "0"
+
+    async def list_prefix(self, prefix: str) -> list:
+        """[{"key", "size"}] of all entries whose key starts with prefix (no content)."""
+        await self._ensure_table()
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                f"SELECT key, size FROM {self.table} WHERE left(key, length($1)) = $1 ORDER BY key", prefix
+            )
+            return [dict(r) for r in rows]
+
+    async def delete_prefix(self, prefix: str) -> int:
+        """Delete all entries whose key starts with prefix ('' clears the store)."""
+        await self._ensure_table()
+        async with self.pool.acquire() as conn:
+            result = await conn.execute(
+                f"DELETE FROM {self.table} WHERE left(key, length($1)) = $1", prefix
+            )
+            return int(result.split()[-1])
 
 
 class PgDatabase:
@@ -394,17 +694,174 @@ class PgDatabase:
         db.properties.find({}).sort("created_at", -1).to_list(100)
     """
 
-    def __init__(self, pool):
+    def __init__(self, pool, connect_kwargs: dict = None):
         self.pool = pool
+        self._connect_kwargs = connect_kwargs or {}
         self._collections = {}
+        self._binaries = {}
+        self._change_callbacks = {}
+        self._listener_conn = None
+        self._lock_pool = None
+        self._lock_pool_init = asyncio.Lock()
+        self._closing = False
 
     def __getattr__(self, name: str):
         if name.startswith("_") or name in ("pool",):
             raise AttributeError(name)
         if name not in self._collections:
-            self._collections[name] = PgCollection(self.pool, name)
+            self._collections[name] = PgCollection(self.pool, name, database=self)
         return self._collections[name]
 
+    def binary(self, name: str) -> PgBinaryStore:
+        """Binary store backed by its own BYTEA table (see PgBinaryStore)."""
+        if name not in self._binaries:
+            self._binaries[name] = PgBinaryStore(self.pool, name)
+        return self._binaries[name]
+
+    def compress(self, table: str, fields, min_size: int = None) -> FieldCompressor:
+        """Store the given fields of a collection zstd-compressed in a side column.
+
+        Must be called before the collection is first used. Compressed fields
+        are returned as usual but cannot be used in queries.
+        """
+        for field in fields:
+            _validate_field_name(field)
+        collection = getattr(self, table)
+        kwargs = {"min_size": min_size} if min_size is not None else {}
+        collection.compressor = FieldCompressor(table, fields, **kwargs)
+        collection._table_created = False
+        return collection.compressor
+
+    async def load_compression_dictionaries(self):
+        """Register stored zstd dictionaries; the newest per collection is used for writes."""
+        store = self.binary("compression_dictionaries")
+        for entry in await store.list_prefix(""):
+            table = entry["key"].split("/", 1)[0]
+            collection = self._collections.get(table)
+            if collection is None or collection.compressor is None:
+                continue
+            stored = await store.get(entry["key"])
+            # Keys sort chronologically, so the last one loaded stays active
+            collection.compressor.add_dictionary(stored["data"])
+
+    async def train_compression_dictionary(self, table: str, samples: int = 1000,
+                                           dict_size: int = 64 * 1024) -> int:
+        """Train a dictionary from packed values of a collection, store and activate it."""
+        collection = getattr(self, table)
+        if collection.compressor is None:
+            raise ValueError(f"{table} has no compressed fields")
+        await collection._ensure_table()
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                f"SELECT packed FROM {table} WHERE packed IS NOT NULL ORDER BY random() LIMIT {int(samples)}"
+            )
+        # Samples in the same serialised form that pack() compresses
+        values = [json.dumps(collection.compressor.unpack(row["packed"]), default=str).encode() for row in rows]
+        if len(values) < 10:
+            raise ValueError(f"Not enough samples to train a dictionary for {table} ({len(values)})")
+        dictionary = train_dictionary(values, dict_size)
+        dict_id = collection.compressor.add_dictionary(dictionary)
+        key = f"{table}/{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{dict_id}"
+        await self.binary("compression_dictionaries").put(key, dictionary, "application/zstd-dictionary")
+        return dict_id
+
+    def on_change(self, table: str, callback, fields=None):
+        """Register a callback(table) invoked whenever a collection is written.
+
+        Callbacks run synchronously in the event loop and must be cheap
+        (e.g. invalidate a cache). They fire immediately for writes made by
+        this process and via LISTEN/NOTIFY for writes made by other workers.
+        With fields, updates that write none of them are skipped; inserts
+        and deletes always fire.
+        """
+        _validate_table_name(table)
+        watched = frozenset(fields) if fields is not None else None
+        self._change_callbacks.setdefault(table, []).append((callback, watched))
+
+    def _dispatch_change(self, table: str, fields=None):
+        for callback, watched in self._change_callbacks.get(table, []):
+            if watched is not None and fields is not None and watched.isdisjoint(fields):
+                continue
+            try:
+                callback(table)
+            except Exception as e:
+                logger.error(f"Change callback for {table} failed: {e}")
+
+    async def _publish_change(self, table: str, conn, fields=None):
+        """Notify local callbacks and other processes about a write to table."""
+        if table not in self._change_callbacks:
+            return
+        self._dispatch_change(table, fields)
+        payload = f"{table}:{_PROCESS_TOKEN}"
+        if fields is not None:
+            payload += ":" + ",".join(sorted(set(fields)))
+        # NOTIFY payloads are limited to 8000 bytes; without a field list everyone reloads
+        if len(payload) > 7900:
+            payload = f"{table}:{_PROCESS_TOKEN}"
+        await conn.execute("SELECT pg_notify($1, $2)", CHANGE_CHANNEL, payload)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        table, _, rest = payload.partition(":")
+        token, has_fields, field_list = rest.partition(":")
+        if token == _PROCESS_TOKEN:
+            return  # Already dispatched locally
+        self._dispatch_change(table, field_list.split(",") if has_fields else None)
+
+    async def start_change_listener(self):
+        """Open a dedicated connection that LISTENs for changes from other processes."""
+        if self._listener_conn is not None:
+            return
+        conn = await asyncpg.connect(**self._connect_kwargs)
+        await conn.add_listener(CHANGE_CHANNEL, self._on_notification)
+        conn.add_termination_listener(self._on_listener_terminated)
+        self._listener_conn = conn
+        logger.info(f"Listening for collection changes on '{CHANGE_CHANNEL}'")
+
+    def _on_listener_terminated(self, connection):
+        self._listener_conn = None
+        if self._closing:
+            return
+        # Notifications may have been missed - treat every watched table as changed
+        logger.warning("Change listener connection lost, invalidating caches and reconnecting")
+        for table in list(self._change_callbacks):
+            self._dispatch_change(table)
+        asyncio.get_running_loop().create_task(self._reconnect_listener())
+
+    async def _reconnect_listener(self):
+        delay = 1
+        while not self._closing and self._listener_conn is None:
+            try:
+                await self.start_change_listener()
+            except Exception as e:
+                logger.error(f"Change listener reconnect failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    async def _get_lock_pool(self):
+        if not self._connect_kwargs:
+            return self.pool
+        async with self._lock_pool_init:
+            if self._lock_pool is None:
+                self._lock_pool = await asyncpg.create_pool(**self._connect_kwargs, min_size=0, max_size=LOCK_POOL_SIZE)
+        return self._lock_pool
+
+    @asynccontextmanager
+    async def advisory_lock(self, name: str):
+        """Hold a PostgreSQL advisory lock on name across all workers and replicas.
+
+        The lock lives on a connection of a separate small pool, so the block
+        can use the collections without competing with lock waiters for
+        connections. Locks must not be nested.
+        """
+        pool = await self._get_lock_pool()
+        async with pool.acquire() as conn:
+            await conn.execute("SELECT pg_advisory_lock(hashtext($1))", name)
+            try:
+                yield
+            finally:
+                # Released with the session as well if this fails (pool reset)
+                await conn.execute("SELECT pg_advisory_unlock(hashtext($1))", name)
+
     async def command(self, cmd: str):
         """Execute a database command (supports 'ping' for health checks)."""
         if cmd == "ping":
@@ -414,6 +871,12 @@ class PgDatabase:
         raise ValueError(f"Unsupported command: {cmd}")
 
     async def close(self):
+        self._closing = True
+        if self._listener_conn is not None:
+            await self._listener_conn.close()
+            self._listener_conn = None
+        if self._lock_pool is not None:
+            await self._lock_pool.close()
         await self.pool.close()
 
     @classmethod
@@ -422,15 +885,14 @@ class PgDatabase:
         ssl_mode = os.environ.get("PGSSLMODE", "")
         ssl = "require" if ssl_mode == "require" else None
 
-        pool = await asyncpg.create_pool(
+        connect_kwargs = dict(
             host=os.environ.get("PGHOST", "localhost"),
             port=int(os.environ.get("PGPORT", "5432")),
             database=os.environ.get("PGDATABASE", "domusvita"),
             user=os.environ.get("PGUSER", "postgres"),
             password=os.environ.get("PGPASSWORD", ""),
             ssl=ssl,
-            min_size=2,
-            max_size=10,
         )
+        pool = await asyncpg.create_pool(**connect_kwargs, min_size=2, max_size=10)
         logger.info(f"PostgreSQL pool created: {os.environ.get('PGHOST')}:{os.environ.get('PGPORT')}/{os.environ.get('PGDATABASE')}")
-        return cls(pool)
+        return cls(pool, connect_kwargs)
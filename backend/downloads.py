@@ -0,0 +1,142 @@
+"""
+Downloads
+Streaming file responses with HTTP Range and conditional GET support.
+
+Document content is streamed from the blob store in chunks instead of being
+loaded into memory. Responses carry Content-Length, a strong ETag and
+Last-Modified; If-None-Match / If-Modified-Since answer 304 and single
+byte ranges answer 206, so large PDFs and scans can be resumed and repeat
+views cost no transfer.
+"""
+
+import re
+import unicodedata
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    """Content-Disposition header that survives non-ASCII names (RFC 6266)."""
+    # ASCII fallback for old clients: "Übersicht" -> "Ubersicht"
+    fallback = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode().replace('"', "") or "download"
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def _parse_range(header: str, size: int):
+    """(start, end) of a single byte range, None if absent/unsupported, False if unsatisfiable."""
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        # Missing, malformed or multi-range: serve the full content
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+
+async def stream_download(request: Request, *, size: int, reader, etag: str, content_type: str,
+                          filename: str, last_modified: datetime = None, disposition: str = "attachment",
+                          cache_control: str = "private, max-age=3600"):
+    """Build a (partial) streaming response.
+
+    reader(start, end) must return an async iterator over the inclusive byte
+    range. etag must be a quoted strong entity tag.
+    """
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+        "Content-Disposition": content_disposition(filename, disposition),
+    }
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+
+    # Conditional GET (If-None-Match takes precedence over If-Modified-Since)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif last_modified is not None and request.headers.get("if-modified-since"):
+        if _not_modified_since(request.headers["if-modified-since"], last_modified):
+            return Response(status_code=304, headers=headers)
+
+    byte_range = _parse_range(request.headers.get("range"), size)
+    # If-Range: only honour the range if the client's copy is still current
+    if_range = request.headers.get("if-range")
+    if byte_range and if_range and if_range.strip() != etag:
+        byte_range = None
+
+    if byte_range is False:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        status_code = 206
+    else:
+        start, end = 0, size - 1
+        status_code = 200
+    headers["Content-Length"] = str(end - start + 1)
+
+    body = reader(start, end) if size else _empty()
+    return StreamingResponse(body, status_code=status_code, media_type=content_type, headers=headers)
+
+
+async def _empty():
+    return
+    yield
+
+
+async def blob_download(request: Request, store, key: str, **kwargs):
+    """Stream a blob store entry; the content hash doubles as strong ETag."""
+    size = await store.size(key)
+    return await stream_download(
+        request, size=size, etag=f'"{key[:32]}"',
+        reader=lambda start, end: store.iter_range(key, start, end, CHUNK_SIZE),
+        **kwargs,
+    )
+
+
+async def bytes_download(request: Request, data: bytes, etag: str, **kwargs):
+    """Serve in-memory content (legacy base64 documents) with the same semantics."""
+    async def reader(start, end):
+        for offset in range(start, end + 1, CHUNK_SIZE):
+            yield data[offset:min(offset + CHUNK_SIZE, end + 1)]
+    return await stream_download(request, size=len(data), etag=etag, reader=reader, **kwargs)
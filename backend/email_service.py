@@ -1,13 +1,24 @@
-"""Microsoft Graph API Email Service for sending and receiving emails."""
+"""Microsoft Graph API Email Service for sending and receiving emails.
+
+All calls share one long-lived httpx client (connection pooling, HTTP/2 when
+h2 is installed), created by start() in the app lifespan and closed by
+close(). The access token is refreshed single-flight and proactively in the
+background, so requests rarely wait for login.microsoftonline.com.
+"""
 
 import os
 import time
 import base64
+import asyncio
 import logging
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from typing import AsyncIterator, Callable
 
 import httpx
 
+import metrics
+
 logger = logging.getLogger(__name__)
 
 TENANT_ID = os.environ.get("AZURE_AD_TENANT_ID", "")
@@ -15,51 +26,225 @@ CLIENT_ID = os.environ.get("AZURE_AD_CLIENT_ID", "")
 CLIENT_SECRET = os.environ.get("GRAPH_CLIENT_SECRET", "")
 MAIL_USER = os.environ.get("GRAPH_MAIL_USER", "wohngemeinschaften@domusvita.de")
 
-TOKEN_URL = f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token"
-GRAPH_BASE = "https://graph.microsoft.com/v1.0"
+# Overridable to run against a local stand-in (scripts/graph_stub.py)
+TOKEN_URL = os.environ.get("GRAPH_TOKEN_URL", f"https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token")
+GRAPH_BASE = os.environ.get("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+
+GRAPH_HTTP2 = os.environ.get("GRAPH_HTTP2", "true").lower() == "true"
+GRAPH_MAX_CONNECTIONS = int(os.environ.get("GRAPH_MAX_CONNECTIONS", "20"))
+# Messages per delta page and requests per $batch call (Graph maximum: 20)
+DELTA_PAGE_SIZE = int(os.environ.get("GRAPH_DELTA_PAGE_SIZE", "50"))
+BATCH_SIZE = 20
+# First delta sync (no stored delta link) only looks back this many days
+INITIAL_SYNC_DAYS = int(os.environ.get("GRAPH_INITIAL_SYNC_DAYS", "7"))
+MESSAGE_FIELDS = "id,subject,body,from,receivedDateTime,hasAttachments,isRead"
+# Attachments up to this total size go inline into one sendMail request (limit 4 MB incl. base64)
+INLINE_ATTACHMENT_LIMIT = int(os.environ.get("GRAPH_INLINE_ATTACHMENT_BYTES", str(3 * 1024 * 1024)))
+# Upload session chunks: multiple of 320 KiB, below 4 MB
+UPLOAD_CHUNK_SIZE = 10 * 320 * 1024
+# Background refresh starts this many seconds before the token expires
+TOKEN_REFRESH_MARGIN = int(os.environ.get("GRAPH_TOKEN_REFRESH_MARGIN", "300"))
 
 _token_cache: dict = {"access_token": "", "expires_at": 0}
+_token_lock = asyncio.Lock()
+_client: httpx.AsyncClient | None = None
+_refresh_task: asyncio.Task | None = None
+
+requests_total = metrics.counter("graph_requests_total", "Requests to Graph / Entra ID")
+errors_total = metrics.counter("graph_errors_total", "Graph requests that failed or returned an error status")
+throttled_total = metrics.counter("graph_throttled_total", "Graph requests answered with 429")
+token_refreshes = metrics.counter("graph_token_refreshes_total", "Access tokens acquired")
+_timers = {
+    op: metrics.timer(f"graph_{op}_seconds", f"Latency of Graph {op} requests")
+    for op in ("token", "send_mail", "delta", "batch", "subscription", "attachment")
+}
+
+
+def _credentials_configured() -> bool:
+    return all([TENANT_ID, CLIENT_ID, CLIENT_SECRET])
+
+
+def _create_client() -> httpx.AsyncClient:
+    http2 = GRAPH_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("h2 not installed, Graph client falls back to HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(30.0, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=GRAPH_MAX_CONNECTIONS,
+            max_keepalive_connections=GRAPH_MAX_CONNECTIONS,
+            keepalive_expiry=120,
+        ),
+    )
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    # Created lazily when used outside the app lifespan (scripts)
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+
+async def start():
+    """Open the shared client and start the background token refresh."""
+    global _refresh_task
+    _get_client()
+    if _credentials_configured() and _refresh_task is None:
+        _refresh_task = asyncio.create_task(_token_refresh_loop())
+
+
+async def close():
+    """Stop the token refresh and close pooled connections."""
+    global _client, _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _request(op: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request on the shared client, recording latency and errors."""
+    requests_total.inc()
+    start = time.perf_counter()
+    try:
+        resp = await _get_client().request(method, url, **kwargs)
+    except Exception:
+        errors_total.inc()
+        raise
+    finally:
+        _timers[op].observe(time.perf_counter() - start)
+    if resp.status_code == 429:
+        throttled_total.inc()
+    if resp.status_code >= 400:
+        errors_total.inc()
+    return resp
+
+
+def _token_valid() -> bool:
+    return bool(_token_cache["access_token"]) and time.time() < _token_cache["expires_at"] - 60
+
+
+async def _refresh_token():
+    """Acquire a new token (caller holds _token_lock)."""
+    if not _credentials_configured():
+        raise RuntimeError(
+            "Graph API credentials not configured (AZURE_AD_TENANT_ID, AZURE_AD_CLIENT_ID, GRAPH_CLIENT_SECRET)"
+        )
+
+    resp = await _request(
+        "token", "POST", TOKEN_URL,
+        data={
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "scope": "https://graph.microsoft.com/.default",
+            "grant_type": "client_credentials",
+        },
+    )
+    resp.raise_for_status()
+    data = resp.json()
+
+    _token_cache["access_token"] = data["access_token"]
+    _token_cache["expires_at"] = time.time() + data.get("expires_in", 3600)
+    token_refreshes.inc()
 
 
 async def _get_token() -> str:
     """Get an access token using client credentials flow. Cached for ~1h."""
-    if _token_cache["access_token"] and time.time() < _token_cache["expires_at"] - 60:
+    if _token_valid():
         return _token_cache["access_token"]
+    # Single flight: concurrent callers wait for one refresh
+    async with _token_lock:
+        if not _token_valid():
+            await _refresh_token()
+    return _token_cache["access_token"]
 
-    if not all([TENANT_ID, CLIENT_ID, CLIENT_SECRET]):
-        raise RuntimeError("Graph API credentials not configured (AZURE_AD_TENANT_ID, AZURE_AD_CLIENT_ID, GRAPH_CLIENT_SECRET)")
-
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            TOKEN_URL,
-            data={
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "scope": "https://graph.microsoft.com/.default",
-                "grant_type": "client_credentials",
-            },
-        )
-        resp.raise_for_status()
-        data = resp.json()
 
-    _token_cache["access_token"] = data["access_token"]
-    _token_cache["expires_at"] = time.time() + data.get("expires_in", 3600)
-    return _token_cache["access_token"]
+async def _token_refresh_loop():
+    """Renew the token TOKEN_REFRESH_MARGIN seconds before it expires."""
+    while True:
+        delay = _token_cache["expires_at"] - TOKEN_REFRESH_MARGIN - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            async with _token_lock:
+                await _refresh_token()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Graph token refresh failed: {e}")
+            await asyncio.sleep(30)
+
+
+@dataclass
+class Attachment:
+    """Outbound attachment whose content is streamed on demand.
+
+    stream(chunk_size) returns an async iterator over the content, so large
+    files are read piece by piece (e.g. from the blob store) instead of
+    being held in memory.
+    """
+    name: str
+    size: int
+    content_type: str
+    stream: Callable[[int], AsyncIterator[bytes]]
+
+    @classmethod
+    def from_bytes(cls, name: str, data: bytes, content_type: str = "application/octet-stream") -> "Attachment":
+        async def stream(chunk_size: int):
+            for start in range(0, len(data), chunk_size):
+                yield data[start:start + chunk_size]
+        return cls(name, len(data), content_type, stream)
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.stream(UPLOAD_CHUNK_SIZE)])
+
+    async def chunks(self, size: int):
+        """Content re-cut into pieces of exactly size bytes (the last one shorter)."""
+        buffer = bytearray()
+        async for data in self.stream(size):
+            buffer += data
+            while len(buffer) >= size:
+                yield bytes(buffer[:size])
+                del buffer[:size]
+        if buffer:
+            yield bytes(buffer)
+
+
+def _file_attachment(attachment: Attachment, content: bytes) -> dict:
+    return {
+        "@odata.type": "#microsoft.graph.fileAttachment",
+        "name": attachment.name,
+        "contentType": attachment.content_type,
+        "contentBytes": base64.b64encode(content).decode("utf-8"),
+    }
 
 
 async def send_email(
     to: str,
     subject: str,
     body: str,
-    attachments: list[tuple[str, bytes]] | None = None,
+    attachments: list | None = None,
 ) -> bool:
     """Send an email via Graph API.
 
+    Attachments totalling up to INLINE_ATTACHMENT_LIMIT are sent inline in
+    one sendMail request. Larger mails are built as a draft: small
+    attachments are added one by one, large ones through upload sessions in
+    UPLOAD_CHUNK_SIZE pieces, then the draft is sent.
+
     Args:
         to: Recipient email address.
         subject: Email subject.
         body: Plain-text email body.
-        attachments: Optional list of (filename, file_bytes) tuples.
+        attachments: Optional list of Attachment objects or (filename, file_bytes) tuples.
 
     Returns:
         True if sent successfully, False otherwise.
@@ -70,123 +255,287 @@ async def send_email(
         logger.error(f"Graph API token error: {e}")
         return False
 
-    graph_attachments = []
-    if attachments:
-        for filename, file_bytes in attachments:
-            graph_attachments.append({
-                "@odata.type": "#microsoft.graph.fileAttachment",
-                "name": filename,
-                "contentBytes": base64.b64encode(file_bytes).decode("utf-8"),
-            })
+    items = [a if isinstance(a, Attachment) else Attachment.from_bytes(*a) for a in attachments or []]
+    message = {
+        "subject": subject,
+        "body": {
+            "contentType": "Text",
+            "content": body,
+        },
+        "toRecipients": [{"emailAddress": {"address": to}}],
+    }
+    if sum(a.size for a in items) > INLINE_ATTACHMENT_LIMIT:
+        return await _send_as_draft(message, items)
+
+    try:
+        graph_attachments = [_file_attachment(a, await a.read()) for a in items]
+    except Exception as e:
+        logger.error(f"Reading attachments failed: {e}")
+        return False
 
     payload = {
-        "message": {
-            "subject": subject,
-            "body": {
-                "contentType": "Text",
-                "content": body,
-            },
-            "toRecipients": [{"emailAddress": {"address": to}}],
-            "attachments": graph_attachments,
-        },
+        "message": {**message, "attachments": graph_attachments},
         "saveToSentItems": "true",
     }
 
     url = f"{GRAPH_BASE}/users/{MAIL_USER}/sendMail"
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                url,
-                json=payload,
-                headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-                timeout=30.0,
-            )
-            if resp.status_code == 202:
-                logger.info(f"Email sent to {to}: {subject}")
-                return True
-            else:
-                logger.error(f"Graph sendMail failed ({resp.status_code}): {resp.text}")
-                return False
+        resp = await _request(
+            "send_mail", "POST", url,
+            json=payload,
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+            timeout=30.0,
+        )
+        if resp.status_code == 202:
+            logger.info(f"Email sent to {to}: {subject}")
+            return True
+        else:
+            logger.error(f"Graph sendMail failed ({resp.status_code}): {resp.text}")
+            return False
     except Exception as e:
         logger.error(f"Graph sendMail error: {e}")
         return False
 
 
-async def get_unread_emails(since: datetime | None = None) -> list[dict]:
-    """Fetch unread emails from the shared mailbox.
+async def _send_as_draft(message: dict, attachments: list[Attachment]) -> bool:
+    """Send a mail with large attachments: draft, attachments, send (draft is removed on failure)."""
+    messages_url = f"{GRAPH_BASE}/users/{MAIL_USER}/messages"
+    try:
+        resp = await _request(
+            "send_mail", "POST", messages_url,
+            json=message,
+            headers={"Authorization": f"Bearer {await _get_token()}", "Content-Type": "application/json"},
+        )
+        resp.raise_for_status()
+        draft_id = resp.json()["id"]
+    except Exception as e:
+        logger.error(f"Graph create draft error: {e}")
+        return False
 
-    Returns list of dicts with keys: id, subject, body, from_email, from_name, received_at, has_attachments.
-    """
     try:
-        token = await _get_token()
+        for attachment in attachments:
+            if attachment.size <= INLINE_ATTACHMENT_LIMIT:
+                resp = await _request(
+                    "attachment", "POST", f"{messages_url}/{draft_id}/attachments",
+                    json=_file_attachment(attachment, await attachment.read()),
+                    headers={"Authorization": f"Bearer {await _get_token()}", "Content-Type": "application/json"},
+                )
+                resp.raise_for_status()
+            else:
+                await _upload_attachment(f"{messages_url}/{draft_id}", attachment)
+        resp = await _request(
+            "send_mail", "POST", f"{messages_url}/{draft_id}/send",
+            headers={"Authorization": f"Bearer {await _get_token()}"},
+        )
+        resp.raise_for_status()
     except Exception as e:
-        logger.error(f"Graph API token error: {e}")
-        return []
-
-    filter_parts = ["isRead eq false"]
-    if since:
-        iso = since.strftime("%Y-%m-%dT%H:%M:%SZ")
-        filter_parts.append(f"receivedDateTime ge {iso}")
-
-    params = {
-        "$filter": " and ".join(filter_parts),
-        "$select": "id,subject,body,from,receivedDateTime,hasAttachments",
-        "$orderby": "receivedDateTime asc",
-        "$top": "50",
+        logger.error(f"Graph sendMail via draft failed: {e}")
+        try:
+            await _request(
+                "send_mail", "DELETE", f"{messages_url}/{draft_id}",
+                headers={"Authorization": f"Bearer {await _get_token()}"},
+            )
+        except Exception as cleanup_error:
+            logger.warning(f"Graph draft {draft_id} not deleted: {cleanup_error}")
+        return False
+
+    total = sum(a.size for a in attachments)
+    recipient = message["toRecipients"][0]["emailAddress"]["address"]
+    logger.info(f"Email sent to {recipient}: {message['subject']} ({len(attachments)} attachments, {total} bytes)")
+    return True
+
+
+async def _upload_attachment(message_url: str, attachment: Attachment):
+    """Stream one attachment into a draft through an upload session (up to 150 MB)."""
+    resp = await _request(
+        "attachment", "POST", f"{message_url}/attachments/createUploadSession",
+        json={"AttachmentItem": {
+            "attachmentType": "file",
+            "name": attachment.name,
+            "size": attachment.size,
+            "contentType": attachment.content_type,
+        }},
+        headers={"Authorization": f"Bearer {await _get_token()}", "Content-Type": "application/json"},
+    )
+    resp.raise_for_status()
+    upload_url = resp.json()["uploadUrl"]
+
+    offset = 0
+    async for chunk in attachment.chunks(UPLOAD_CHUNK_SIZE):
+        end = offset + len(chunk) - 1
+        # The upload URL is pre-authenticated; an Authorization header is rejected
+        resp = await _request(
+            "attachment", "PUT", upload_url,
+            content=chunk,
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Range": f"bytes {offset}-{end}/{attachment.size}",
+            },
+            timeout=120.0,
+        )
+        resp.raise_for_status()
+        offset = end + 1
+    if offset != attachment.size:
+        raise RuntimeError(f"Attachment {attachment.name}: read {offset} of {attachment.size} bytes")
+
+
+def _parse_message(msg: dict) -> dict:
+    from_info = msg.get("from", {}).get("emailAddress", {})
+    return {
+        "id": msg["id"],
+        "subject": msg.get("subject", ""),
+        "body": msg.get("body", {}).get("content", ""),
+        "from_email": from_info.get("address", ""),
+        "from_name": from_info.get("name", ""),
+        "received_at": msg.get("receivedDateTime", ""),
+        "has_attachments": msg.get("hasAttachments", False),
+        "is_read": msg.get("isRead", False),
     }
 
-    url = f"{GRAPH_BASE}/users/{MAIL_USER}/messages"
 
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                url,
-                params=params,
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=30.0,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-    except Exception as e:
-        logger.error(f"Graph getMessages error: {e}")
-        return []
-
-    results = []
-    for msg in data.get("value", []):
-        from_info = msg.get("from", {}).get("emailAddress", {})
-        results.append({
-            "id": msg["id"],
-            "subject": msg.get("subject", ""),
-            "body": msg.get("body", {}).get("content", ""),
-            "from_email": from_info.get("address", ""),
-            "from_name": from_info.get("name", ""),
-            "received_at": msg.get("receivedDateTime", ""),
-            "has_attachments": msg.get("hasAttachments", False),
-        })
-
-    return results
-
-
-async def mark_as_read(message_id: str) -> bool:
-    """Mark a message as read in the shared mailbox."""
-    try:
+class DeltaExpired(Exception):
+    """The stored delta link is no longer valid; start a new initial sync."""
+
+
+async def iter_inbox_delta(delta_link: str | None = None):
+    """Yield pages of new/changed inbox messages since delta_link.
+
+    Each page is {"messages": [...], "delta_link": str | None}; only the last
+    page carries the delta link for the next sync. Removed messages are
+    skipped. Without delta_link, the sync starts INITIAL_SYNC_DAYS back.
+    Raises DeltaExpired if Graph rejects the delta link.
+    """
+    token = await _get_token()
+    if delta_link:
+        url, params = delta_link, None
+    else:
+        since = datetime.fromtimestamp(time.time() - INITIAL_SYNC_DAYS * 86400, timezone.utc)
+        url = f"{GRAPH_BASE}/users/{MAIL_USER}/mailFolders/inbox/messages/delta"
+        params = {
+            "$select": MESSAGE_FIELDS,
+            "$filter": f"receivedDateTime ge {since.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        }
+
+    while url:
+        resp = await _request(
+            "delta", "GET", url,
+            params=params,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Prefer": f"odata.maxpagesize={DELTA_PAGE_SIZE}",
+            },
+            timeout=30.0,
+        )
+        # 410 Gone / SyncStateNotFound: the delta state expired on the server
+        if delta_link and (resp.status_code == 410 or "syncstate" in resp.text.lower()):
+            raise DeltaExpired(resp.text)
+        resp.raise_for_status()
+        data = resp.json()
+        # nextLink/deltaLink already carry all query parameters
+        url, params = data.get("@odata.nextLink"), None
+        yield {
+            "messages": [_parse_message(msg) for msg in data.get("value", []) if "@removed" not in msg],
+            "delta_link": data.get("@odata.deltaLink"),
+        }
+        # Token may have been renewed while a long sync was paging
         token = await _get_token()
-    except Exception as e:
-        logger.error(f"Graph API token error: {e}")
-        return False
 
-    url = f"{GRAPH_BASE}/users/{MAIL_USER}/messages/{message_id}"
 
+async def mark_many_as_read(message_ids: list[str]) -> set[str]:
+    """Mark messages as read via JSON $batch (BATCH_SIZE per call).
+
+    Returns the ids that were marked successfully.
+    """
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.patch(
-                url,
-                json={"isRead": True},
+        token = await _get_token()
+    except Exception as e:
+        logger.error(f"Graph API token error: {e}")
+        return set()
+
+    marked = set()
+    for start in range(0, len(message_ids), BATCH_SIZE):
+        chunk = message_ids[start:start + BATCH_SIZE]
+        payload = {
+            "requests": [
+                {
+                    "id": str(index),
+                    "method": "PATCH",
+                    "url": f"/users/{MAIL_USER}/messages/{message_id}",
+                    "body": {"isRead": True},
+                    "headers": {"Content-Type": "application/json"},
+                }
+                for index, message_id in enumerate(chunk)
+            ]
+        }
+        try:
+            resp = await _request(
+                "batch", "POST", f"{GRAPH_BASE}/$batch",
+                json=payload,
                 headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
-                timeout=15.0,
+                timeout=30.0,
             )
-            return resp.status_code == 200
-    except Exception as e:
-        logger.error(f"Graph markAsRead error: {e}")
+            resp.raise_for_status()
+            responses = resp.json().get("responses", [])
+        except Exception as e:
+            logger.error(f"Graph $batch markAsRead error: {e}")
+            continue
+        for item in responses:
+            if item.get("status") == 200:
+                marked.add(chunk[int(item["id"])])
+            else:
+                if item.get("status") == 429:
+                    throttled_total.inc()
+                logger.warning(f"Graph markAsRead failed in batch ({item.get('status')}): {chunk[int(item['id'])]}")
+    return marked
+
+
+async def create_inbox_subscription(notification_url: str, client_state: str, expires_at: datetime) -> dict:
+    """Subscribe to new messages in the shared inbox (change notifications).
+
+    Graph validates notification_url (also used for lifecycle events) before
+    answering. Returns the subscription; raises on failure.
+    """
+    token = await _get_token()
+    resp = await _request(
+        "subscription", "POST", f"{GRAPH_BASE}/subscriptions",
+        json={
+            "changeType": "created",
+            "notificationUrl": notification_url,
+            "lifecycleNotificationUrl": notification_url,
+            "resource": f"users/{MAIL_USER}/mailFolders('inbox')/messages",
+            "expirationDateTime": expires_at.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "clientState": client_state,
+        },
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        timeout=30.0,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def renew_subscription(subscription_id: str, expires_at: datetime) -> bool:
+    """Extend a subscription; False if Graph no longer knows it."""
+    token = await _get_token()
+    resp = await _request(
+        "subscription", "PATCH", f"{GRAPH_BASE}/subscriptions/{subscription_id}",
+        json={"expirationDateTime": expires_at.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")},
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        timeout=30.0,
+    )
+    if resp.status_code == 404:
         return False
+    resp.raise_for_status()
+    return True
+
+
+async def delete_subscription(subscription_id: str):
+    """Remove a subscription (missing ones are ignored)."""
+    token = await _get_token()
+    resp = await _request(
+        "subscription", "DELETE", f"{GRAPH_BASE}/subscriptions/{subscription_id}",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=15.0,
+    )
+    if resp.status_code not in (204, 404):
+        resp.raise_for_status()
@@ -0,0 +1,165 @@
+"""
+Graph Subscriptions
+Change notifications for the shared mailbox instead of fixed-interval polling.
+
+With GRAPH_NOTIFICATION_URL (public URL of POST /api/graph/notifications)
+and GRAPH_WEBHOOK_SECRET set, a subscription on new inbox messages is
+created at startup and renewed before it expires. Notifications carrying
+the secret as clientState wake the inbox sync within seconds. Lifecycle
+events (subscriptionRemoved, reauthorizationRequired, missed) trigger a
+renewal or an immediate sync.
+
+The delta poller stays as a safety net: every INBOX_FALLBACK_POLL_SECONDS
+while a subscription is active, every INBOX_POLL_SECONDS while there is
+none (not configured, creation failed or removed by Graph). The current
+subscription is shared by all API workers and replicas through
+mail_sync_state; creating and renewing it happens under an advisory lock,
+so only one process talks to Graph and the others pick up its result.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import email_service
+import metrics
+
+logger = logging.getLogger(__name__)
+
+GRAPH_NOTIFICATION_URL = os.environ.get("GRAPH_NOTIFICATION_URL", "")
+GRAPH_WEBHOOK_SECRET = os.environ.get("GRAPH_WEBHOOK_SECRET", "")
+# Graph allows at most 4230 minutes for message subscriptions
+SUBSCRIPTION_LIFETIME = timedelta(minutes=int(os.environ.get("GRAPH_SUBSCRIPTION_MINUTES", "2880")))
+RENEW_BEFORE = timedelta(hours=12)
+RETRY_SECONDS = 300
+# Notifications arrive in bursts (one per message); wait briefly to sync them together
+DEBOUNCE_SECONDS = 2
+
+notifications_total = metrics.counter("graph_notifications_total", "Accepted Graph change notifications")
+rejected_total = metrics.counter("graph_notifications_rejected_total", "Graph notifications with a wrong clientState")
+active_gauge = metrics.gauge("graph_subscription_active", "1 while an inbox subscription is active")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class InboxSubscription:
+    def __init__(self, db):
+        self.db = db
+        self.subscription = None
+        self._wakeup = asyncio.Event()
+        self._renew = asyncio.Event()
+        self._renew_requested_at = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(GRAPH_NOTIFICATION_URL and GRAPH_WEBHOOK_SECRET)
+
+    @property
+    def active(self) -> bool:
+        return (
+            self.subscription is not None
+            and datetime.fromisoformat(self.subscription["expires_at"]) > _now()
+        )
+
+    async def run(self):
+        """Keep the subscription alive (background task)."""
+        while True:
+            try:
+                delay = await self._maintain(force=self._renew.is_set())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Graph subscription maintenance failed: {e}")
+                delay = RETRY_SECONDS
+            self._renew.clear()
+            self._renew_requested_at = None
+            active_gauge.set(1 if self.active else 0)
+            try:
+                await asyncio.wait_for(self._renew.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _reusable(self, state, force: bool) -> bool:
+        """True if state is fresh and was not superseded by a renewal request."""
+        if not state or datetime.fromisoformat(state["expires_at"]) - _now() <= RENEW_BEFORE:
+            return False
+        # A forced renewal is satisfied by a renewal another worker made after the request
+        return not force or (
+            self._renew_requested_at is not None
+            and state.get("updated_at", "") > self._renew_requested_at.isoformat()
+        )
+
+    async def _maintain(self, force: bool = False) -> float:
+        """Reuse, renew or create the subscription; returns seconds until the next check."""
+        state = await self.db.mail_sync_state.find_one({"id": "subscription"})
+        if not self._reusable(state, force):
+            # One worker at a time; the others wait and reuse its subscription
+            async with self.db.advisory_lock("graph_subscription"):
+                state = await self.db.mail_sync_state.find_one({"id": "subscription"})
+                if not self._reusable(state, force):
+                    return await self._renew_or_create(state)
+        # Still fresh (possibly renewed by another worker)
+        self.subscription = state
+        remaining = datetime.fromisoformat(state["expires_at"]) - _now()
+        return (remaining - RENEW_BEFORE).total_seconds()
+
+    async def _renew_or_create(self, state) -> float:
+        expires_at = _now() + SUBSCRIPTION_LIFETIME
+        if state and datetime.fromisoformat(state["expires_at"]) > _now() \
+                and await email_service.renew_subscription(state["subscription_id"], expires_at):
+            subscription_id = state["subscription_id"]
+            logger.info(f"Graph subscription {subscription_id} renewed")
+        else:
+            created = await email_service.create_inbox_subscription(
+                GRAPH_NOTIFICATION_URL, GRAPH_WEBHOOK_SECRET, expires_at
+            )
+            subscription_id = created["id"]
+            logger.info(f"Graph subscription {subscription_id} created")
+            # Mail that arrived while there was no subscription
+            self._wakeup.set()
+
+        self.subscription = {
+            "id": "subscription",
+            "subscription_id": subscription_id,
+            "expires_at": expires_at.isoformat(),
+            "updated_at": _now().isoformat(),
+        }
+        await self.db.mail_sync_state.update_one(
+            {"id": "subscription"},
+            {"$set": self.subscription},
+            upsert=True,
+        )
+        return (SUBSCRIPTION_LIFETIME - RENEW_BEFORE).total_seconds()
+
+    def handle(self, payload: dict) -> bool:
+        """Process a notification POST; False if no entry carried the right clientState."""
+        accepted = 0
+        for notification in payload.get("value", []):
+            if not hmac.compare_digest(str(notification.get("clientState", "")), GRAPH_WEBHOOK_SECRET):
+                rejected_total.inc()
+                continue
+            accepted += 1
+            event = notification.get("lifecycleEvent")
+            if event in ("subscriptionRemoved", "reauthorizationRequired"):
+                if event == "subscriptionRemoved":
+                    self.subscription = None
+                self._renew_requested_at = self._renew_requested_at or _now()
+                self._renew.set()
+            # New message, or Graph dropped notifications ("missed"): sync now
+            self._wakeup.set()
+        notifications_total.inc(accepted)
+        return accepted > 0
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a notification up to timeout seconds; True if one arrived."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        await asyncio.sleep(DEBOUNCE_SECONDS)
+        self._wakeup.clear()
+        return True
@@ -0,0 +1,78 @@
+"""
+Image Processing
+Size variants for uploaded ticket photos.
+
+Every upload is decoded once and rendered into fixed-width variants in both
+WebP and JPEG, so the photo endpoint can serve the best format a client
+accepts without converting on the fly. Rendering runs in image_pool worker
+processes, never on the event loop.
+"""
+
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from worker_pool import WorkerPool
+
+# Variant name -> maximum edge length in px
+VARIANTS = {
+    "thumb": 200,
+    "medium": 800,
+    "full": 1920,
+}
+
+# Largest variant - JPEGs are decoded at reduced scale down to this size
+MAX_EDGE = max(VARIANTS.values())
+
+# Output format -> (PIL format, content type, save options)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 80, "optimize": True, "progressive": True}),
+}
+
+
+def render_variants(content) -> dict:
+    """Render all variants of an image given as bytes or file path.
+
+    Returns {variant: {"size": (width, height), fmt: (bytes, content_type), ...}}.
+    Raises on undecodable input.
+    """
+    img = Image.open(io.BytesIO(content) if isinstance(content, bytes) else content)
+    if img.format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full resolution
+        img.draft("RGB", (MAX_EDGE, MAX_EDGE))
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    result = {}
+    # Largest first, so each smaller variant is scaled down from the previous one
+    for variant, max_edge in sorted(VARIANTS.items(), key=lambda v: -v[1]):
+        img = img.copy()
+        # reducing_gap: cheap integer reduce() first, LANCZOS only for the last step
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        result[variant] = {"size": img.size}
+        for fmt, (pil_format, content_type, options) in FORMATS.items():
+            output = io.BytesIO()
+            img.save(output, format=pil_format, **options)
+            result[variant][fmt] = (output.getvalue(), content_type)
+    return result
+
+
+def blob_key(photo_id: str, variant: str, fmt: str) -> str:
+    """Key of a photo variant in the photo binary store."""
+    return f"{photo_id}/{variant}.{fmt}"
+
+
+def preferred_format(accept: str) -> str:
+    """Pick WebP if the client accepts it, JPEG otherwise."""
+    return "webp" if "image/webp" in (accept or "") else "jpeg"
+
+
+image_pool = WorkerPool(
+    "image",
+    max_workers=int(os.environ.get("IMAGE_WORKERS", "2")),
+    queue_size=int(os.environ.get("IMAGE_QUEUE_SIZE", "8")),
+    timeout=float(os.environ.get("IMAGE_TIMEOUT_SECONDS", "30")),
+)
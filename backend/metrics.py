@@ -0,0 +1,104 @@
+"""
+Metrics
+Minimal in-process metrics registry exposed in Prometheus text format.
+
+Counters, gauges and timers are created once at module level by the code
+that owns them and rendered by GET /api/metrics. Values are per worker
+process.
+"""
+
+import time
+from contextlib import contextmanager
+
+_registry = {}
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def samples(self):
+        yield self.name, self.value
+
+
+class Timer:
+    """Duration summary (count and sum in seconds)."""
+    kind = "summary"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self):
+        yield f"{self.name}_count", self.count
+        yield f"{self.name}_sum", round(self.sum, 6)
+
+
+def _register(metric):
+    # Re-registering returns the existing metric (module reloads in dev)
+    return _registry.setdefault(metric.name, metric)
+
+
+def counter(name: str, help_text: str) -> Counter:
+    return _register(Counter(name, help_text))
+
+
+def gauge(name: str, help_text: str) -> Gauge:
+    return _register(Gauge(name, help_text))
+
+
+def timer(name: str, help_text: str) -> Timer:
+    return _register(Timer(name, help_text))
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in _registry.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, value in metric.samples():
+            lines.append(f"{sample_name} {value}")
+    return "\n".join(lines) + "\n"
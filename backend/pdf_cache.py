@@ -0,0 +1,66 @@
+"""
+PDF Cache
+Size-bounded in-memory LRU cache for rendered PDFs and HTML previews.
+
+Entries are keyed by a content hash of the render inputs (see
+pdf_generator.render_key and section_key), so a key never has to be
+invalidated: changed inputs simply produce a different key, and stale
+entries age out once the cache exceeds its byte budget. The cache is per
+API worker process.
+"""
+
+import os
+from collections import OrderedDict
+
+import metrics
+
+PDF_CACHE_MB = int(os.environ.get("PDF_CACHE_MB", "64"))
+PDF_FRAGMENT_CACHE_MB = int(os.environ.get("PDF_FRAGMENT_CACHE_MB", "64"))
+PREVIEW_CACHE_MB = int(os.environ.get("PREVIEW_CACHE_MB", "16"))
+
+
+class PdfCache:
+    def __init__(self, name: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self.hits = metrics.counter(f"{name}_cache_hits_total", f"{name} cache hits")
+        self.misses = metrics.counter(f"{name}_cache_misses_total", f"{name} cache misses")
+        self.evictions = metrics.counter(f"{name}_cache_evictions_total", f"{name} cache entries evicted")
+        self.size_gauge = metrics.gauge(f"{name}_cache_bytes", f"Bytes held by the {name} cache")
+
+    def get(self, key: str):
+        data = self._entries.get(key)
+        if data is None:
+            self.misses.inc()
+            return None
+        self._entries.move_to_end(key)
+        self.hits.inc()
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key))
+        self._entries[key] = data
+        self._bytes += len(data)
+        # Evict least recently used entries until the budget fits
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions.inc()
+        self.size_gauge.set(self._bytes)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self.size_gauge.set(0)
+
+
+einzugspaket_cache = PdfCache("einzugspaket_pdf", PDF_CACHE_MB * 1024 * 1024)
+# Per-section PDF fragments (see EinzugspaketGenerator.section_key)
+fragment_cache = PdfCache("einzugspaket_fragment", PDF_FRAGMENT_CACHE_MB * 1024 * 1024)
+# Rendered HTML previews (UTF-8), see EinzugspaketGenerator.preview_key
+preview_cache = PdfCache("einzugspaket_preview", PREVIEW_CACHE_MB * 1024 * 1024)
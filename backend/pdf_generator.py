@@ -2,16 +2,39 @@
 Einzugspaket PDF Generator
 Generates personalized move-in document packages for Pflege-WG residents.
 Uses Jinja2 templates + WeasyPrint for HTML-to-PDF conversion.
+
+Each section is laid out as its own PDF fragment (without page footer) and
+the fragments are merged with pypdf; "Seite i von N" is stamped afterwards
+and the result is size-optimised (pdf_optimizer).
+Fragments are keyed by a hash of exactly the values their template uses,
+so callers can pass a fragment cache and only changed sections are laid
+out again.
+
+Templates are compiled once per generator (with a Jinja bytecode cache
+shared by all worker processes); the base layout's stylesheet is parsed
+once into a WeasyPrint CSS object and reused, together with one
+FontConfiguration, for every render.
 """
 
+import hashlib
+import io
+import json
 import logging
+import os
+import re
+import tempfile
 from datetime import date
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, meta
+
+from pdf_optimizer import PDF_IMAGE_DPI, PDF_JPEG_QUALITY, optimize_pdf
 
 logger = logging.getLogger(__name__)
 
 TEMPLATES_DIR = Path(__file__).parent / "templates" / "einzugspaket"
+TEMPLATE_CACHE_DIR = os.environ.get(
+    "PDF_TEMPLATE_CACHE_DIR", str(Path(tempfile.gettempdir()) / "domusvita-jinja")
+)
 
 # All available document sections in order
 DOCUMENT_SECTIONS = [
@@ -39,13 +62,93 @@ SECTION_LABELS = {
 }
 
 
+def _template_sources() -> dict:
+    return {path.name: path.read_text(encoding="utf-8") for path in sorted(TEMPLATES_DIR.glob("*.html"))}
+
+
+_TEMPLATE_SOURCES = _template_sources()
+
+# Changes whenever a template is edited, so cached PDFs of old templates are never reused
+TEMPLATE_VERSION = hashlib.sha256(
+    json.dumps(_TEMPLATE_SOURCES, sort_keys=True).encode()
+).hexdigest()[:16]
+
+# Klient fields the templates actually use (status changes etc. must not bust the cache)
+KLIENT_TEMPLATE_FIELDS = sorted(set(re.findall(r"klient\.(\w+)", "".join(_TEMPLATE_SOURCES.values()))))
+
+# Bookkeeping fields that never reach the PDF
+_VOLATILE_FIELDS = {"_id", "created_at", "updated_at"}
+
+
+def _stable(doc: dict) -> dict:
+    return {k: v for k, v in (doc or {}).items() if k not in _VOLATILE_FIELDS}
+
+
+# Context dicts whose used attributes are tracked per section
+_DICT_VARS = ("klient", "wg", "zimmer", "stammdaten")
+
+# Fragments are laid out without footer; page numbers are stamped after merging
+FRAGMENT_CSS = "@page { @bottom-center { content: none } }"
+
+
+def render_key(klient: dict, wg: dict, zimmer: dict, stammdaten: dict,
+               mietbeginn: str = None, sections: list = None) -> str:
+    """Content hash of everything generate() output depends on.
+
+    Takes the same arguments as EinzugspaketGenerator.generate. Includes
+    today's date (datum_heute is printed on the documents) and the
+    template version.
+    """
+    heute = date.today().strftime("%d.%m.%Y")
+    normalized = {
+        "template_version": TEMPLATE_VERSION,
+        "datum_heute": heute,
+        "mietbeginn": mietbeginn or heute,
+        "sections": [s for s in (DOCUMENT_SECTIONS if sections is None else sections) if s in DOCUMENT_SECTIONS],
+        "klient": {field: (klient or {}).get(field) for field in KLIENT_TEMPLATE_FIELDS},
+        "wg": _stable(wg),
+        "zimmer": _stable(zimmer),
+        "stammdaten": _stable(stammdaten),
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _bytecode_cache():
+    try:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled: {e}")
+        return None
+    return FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+
 class EinzugspaketGenerator:
     def __init__(self):
-        self.env = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)))
+        # Templates are read once; edits require a restart (as does TEMPLATE_VERSION)
+        self.env = Environment(
+            loader=FileSystemLoader(str(TEMPLATES_DIR)),
+            bytecode_cache=_bytecode_cache(),
+            auto_reload=False,
+        )
+        self._templates = {section: self.env.get_template(f"{section}.html") for section in DOCUMENT_SECTIONS}
+        self._dependencies = {section: self._section_dependencies(section) for section in DOCUMENT_SECTIONS}
+        self._page_number_overlays = {}
+
+        # Pre-split base layout: document head with and without its <style> block
+        base_html = self.env.get_template("base.html").render()
+        head_end = base_html.index("</head>")
+        style = re.search(r"<style>(.*?)</style>", base_html, re.S)
+        self._html_head = base_html[:head_end] + "</head>\n<body>\n"
+        self._pdf_head = base_html[:style.start()] + base_html[style.end():head_end] + "</head>\n<body>\n"
+        self._base_css_source = style.group(1)
+        # WeasyPrint state, created on first render
+        self._font_config = None
+        self._base_css = None
+        self._fragment_css = None
 
     def generate(self, klient: dict, wg: dict, zimmer: dict,
                  stammdaten: dict, mietbeginn: str = None,
-                 sections: list = None) -> bytes:
+                 sections: list = None, fragments: dict = None, stats: dict = None) -> bytes:
         """
         Generate a complete Einzugspaket PDF.
 
@@ -56,80 +159,194 @@ class EinzugspaketGenerator:
             stammdaten: WG-Stammdaten dict
             mietbeginn: Optional move-in date string (DD.MM.YYYY)
             sections: Optional list of section names to include (default: all)
+            fragments: Optional cache {section key: fragment PDF}; used for
+                lookups and filled with newly rendered fragments
+            stats: Optional dict filled with the optimisation statistics
+                (see pdf_optimizer.optimize_pdf)
 
         Returns:
             PDF bytes
         """
-        from weasyprint import HTML
-
         if sections is None:
             sections = DOCUMENT_SECTIONS
+        if fragments is None:
+            fragments = {}
 
-        # Calculate costs
-        kosten_config = self._get_kosten_config(stammdaten, zimmer)
-
-        # Build template context
-        context = {
-            "klient": klient,
-            "wg": wg,
-            "zimmer": zimmer,
-            "stammdaten": stammdaten,
-            "datum_heute": date.today().strftime("%d.%m.%Y"),
-            "mietbeginn": mietbeginn or date.today().strftime("%d.%m.%Y"),
-            **kosten_config,
-        }
+        context = self._build_context(klient, wg, zimmer, stammdaten, mietbeginn)
 
-        # Render each section and combine
-        html_parts = []
+        parts = []
+        rendered = 0
         for section in sections:
             if section not in DOCUMENT_SECTIONS:
                 logger.warning(f"Unknown section: {section}, skipping")
                 continue
-            try:
-                template = self.env.get_template(f"{section}.html")
-                html_parts.append(template.render(**context))
-            except Exception as e:
-                logger.error(f"Error rendering section {section}: {e}")
-                raise
-
-        # Combine all sections into one HTML document
-        combined_html = self._combine_sections(html_parts)
-
-        # Generate PDF
-        pdf_bytes = HTML(string=combined_html).write_pdf()
+            key = self.section_key(section, context)
+            if key not in fragments:
+                try:
+                    fragments[key] = self._render_fragment(section, context)
+                except Exception as e:
+                    logger.error(f"Error rendering section {section}: {e}")
+                    raise
+                rendered += 1
+            parts.append(fragments[key])
+
+        # Raises PdfTooLarge if the package exceeds the size budget
+        pdf_bytes, optimization = optimize_pdf(self._merge(parts))
+        if stats is not None:
+            stats.update(optimization)
         logger.info(
             f"Generated Einzugspaket PDF for {klient.get('vorname')} "
             f"{klient.get('nachname')} ({len(pdf_bytes)} bytes, "
-            f"{len(sections)} sections)"
+            f"{len(parts)} sections, {rendered} laid out)"
         )
         return pdf_bytes
 
-    def generate_preview_html(self, klient: dict, wg: dict, zimmer: dict,
-                              stammdaten: dict, mietbeginn: str = None,
-                              sections: list = None) -> str:
-        """Generate HTML preview (without PDF conversion)."""
-        if sections is None:
-            sections = DOCUMENT_SECTIONS
+    def section_keys(self, klient: dict, wg: dict, zimmer: dict,
+                     stammdaten: dict, mietbeginn: str = None,
+                     sections: list = None) -> list:
+        """Fragment cache keys generate() will look up for these arguments."""
+        context = self._build_context(klient, wg, zimmer, stammdaten, mietbeginn)
+        return [
+            self.section_key(section, context)
+            for section in (DOCUMENT_SECTIONS if sections is None else sections)
+            if section in DOCUMENT_SECTIONS
+        ]
+
+    def section_key(self, section: str, context: dict) -> str:
+        """Hash of a section's template and the context values it references."""
+        values = {}
+        for name, attrs in self._dependencies[section].items():
+            value = context.get(name)
+            if attrs is not None:
+                value = {attr: (value or {}).get(attr) for attr in attrs}
+            elif isinstance(value, dict):
+                value = _stable(value)
+            values[name] = value
+        normalized = {
+            "section": section,
+            "template": _TEMPLATE_SOURCES[f"{section}.html"],
+            "base": _TEMPLATE_SOURCES["base.html"],
+            "fragment_css": FRAGMENT_CSS,
+            "values": values,
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _section_dependencies(self, section: str) -> dict:
+        """{context name: used attributes, or None for the whole value} of a section template."""
+        source = _TEMPLATE_SOURCES[f"{section}.html"]
+        dependencies = {}
+        for name in meta.find_undeclared_variables(self.env.parse(source)):
+            attrs = set(re.findall(rf"\b{name}\.(\w+)", source)) if name in _DICT_VARS else set()
+            # Subscripts and dict methods can reach any key - depend on the whole dict then
+            opaque = not attrs or attrs & {"get", "items", "keys", "values"} or re.search(rf"\b{name}\s*\[", source)
+            dependencies[name] = None if opaque else sorted(attrs)
+        return dependencies
+
+    def _render_body(self, section: str, context: dict) -> str:
+        """Render only the content block of a section (no base document around it)."""
+        template = self._templates[section]
+        return "".join(template.blocks["content"](template.new_context(context)))
+
+    def _write_pdf(self, bodies: list, fragment: bool = False) -> bytes:
+        """Lay out section bodies with the shared stylesheet and font configuration."""
+        from weasyprint import CSS, HTML
+
+        if self._font_config is None:
+            from weasyprint.text.fonts import FontConfiguration
+            self._font_config = FontConfiguration()
+            self._base_css = CSS(string=self._base_css_source, font_config=self._font_config)
+            self._fragment_css = CSS(string=FRAGMENT_CSS, font_config=self._font_config)
+
+        document = self._pdf_head + "\n".join(bodies) + "\n</body>\n</html>"
+        stylesheets = [self._base_css, self._fragment_css] if fragment else [self._base_css]
+        return HTML(string=document).write_pdf(
+            stylesheets=stylesheets,
+            font_config=self._font_config,
+            # Subset fonts without hinting, embed images at the target resolution
+            full_fonts=False,
+            hinting=False,
+            optimize_images=True,
+            dpi=PDF_IMAGE_DPI,
+            jpeg_quality=PDF_JPEG_QUALITY,
+        )
+
+    def _render_fragment(self, section: str, context: dict) -> bytes:
+        """Lay out one section as a PDF without page footer."""
+        body = self._render_body(section, context)
+        # Every section starts with a page break; a fragment starts on a fresh page anyway
+        body = body.replace('<div class="page-break"></div>', "", 1)
+        return self._write_pdf([body], fragment=True)
+
+    def _merge(self, parts: list) -> bytes:
+        """Concatenate fragment PDFs and stamp "Seite i von N" on every page."""
+        from pypdf import PdfReader, PdfWriter
 
-        kosten_config = self._get_kosten_config(stammdaten, zimmer)
+        if not parts:
+            return self._write_pdf([])
 
-        context = {
+        writer = PdfWriter()
+        for part in parts:
+            writer.append(io.BytesIO(part))
+        overlay = PdfReader(io.BytesIO(self._page_number_overlay(len(writer.pages))))
+        for page, numbers in zip(writer.pages, overlay.pages):
+            page.merge_page(numbers)
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    def _page_number_overlay(self, page_count: int) -> bytes:
+        """Empty pages carrying only the base template's page footer."""
+        if page_count not in self._page_number_overlays:
+            pages = "<div></div>" + '<div class="page-break"></div>' * (page_count - 1)
+            self._page_number_overlays[page_count] = self._write_pdf([pages])
+        return self._page_number_overlays[page_count]
+
+    def _build_context(self, klient: dict, wg: dict, zimmer: dict,
+                       stammdaten: dict, mietbeginn: str = None) -> dict:
+        """Template context including calculated costs."""
+        return {
             "klient": klient,
             "wg": wg,
             "zimmer": zimmer,
             "stammdaten": stammdaten,
             "datum_heute": date.today().strftime("%d.%m.%Y"),
             "mietbeginn": mietbeginn or date.today().strftime("%d.%m.%Y"),
-            **kosten_config,
+            **self._get_kosten_config(stammdaten, zimmer),
         }
 
-        html_parts = []
-        for section in sections:
-            if section in DOCUMENT_SECTIONS:
-                template = self.env.get_template(f"{section}.html")
-                html_parts.append(template.render(**context))
+    def generate_preview_html(self, klient: dict, wg: dict, zimmer: dict,
+                              stammdaten: dict, mietbeginn: str = None,
+                              sections: list = None, fragment: bool = False) -> str:
+        """Generate HTML preview (without PDF conversion).
 
-        return self._combine_sections(html_parts)
+        Each section is wrapped in <div data-section="...">. With
+        fragment=True only these wrappers are returned (no document head),
+        so an editor can swap a single section in place.
+        """
+        if sections is None:
+            sections = DOCUMENT_SECTIONS
+
+        context = self._build_context(klient, wg, zimmer, stammdaten, mietbeginn)
+
+        bodies = [
+            f'<div data-section="{section}">\n{self._render_body(section, context)}\n</div>'
+            for section in sections if section in DOCUMENT_SECTIONS
+        ]
+        if fragment:
+            return "\n".join(bodies)
+        return self._combine_sections(bodies)
+
+    def preview_key(self, klient: dict, wg: dict, zimmer: dict,
+                    stammdaten: dict, mietbeginn: str = None,
+                    sections: list = None, fragment: bool = False) -> str:
+        """Content hash of generate_preview_html() output, usable as ETag.
+
+        Built from the section keys, so a section only changes its key when
+        its template or a value it references changes.
+        """
+        keys = self.section_keys(klient, wg, zimmer, stammdaten, mietbeginn, sections)
+        normalized = {"preview": "fragment" if fragment else "document", "sections": keys}
+        return hashlib.sha256(json.dumps(normalized).encode()).hexdigest()
 
     def _get_kosten_config(self, stammdaten: dict, zimmer: dict) -> dict:
         """Calculate cost values for templates."""
@@ -162,29 +379,6 @@ class EinzugspaketGenerator:
             "kaution": kaution,
         }
 
-    def _combine_sections(self, html_parts: list) -> str:
-        """Combine multiple rendered HTML sections into one document."""
-        # Use the base template CSS but combine all section bodies
-        base_template = self.env.get_template("base.html")
-        base_html = base_template.render()
-
-        # Extract body contents from each rendered section
-        bodies = []
-        for html in html_parts:
-            # Each section extends base.html, so extract between <body> tags
-            start = html.find("<body>")
-            end = html.find("</body>")
-            if start != -1 and end != -1:
-                bodies.append(html[start + 6:end])
-            else:
-                bodies.append(html)
-
-        # Insert all bodies into base
-        combined_body = "\n".join(bodies)
-        head_end = base_html.find("</head>")
-        return (
-            base_html[:head_end]
-            + "</head>\n<body>\n"
-            + combined_body
-            + "\n</body>\n</html>"
-        )
+    def _combine_sections(self, bodies: list) -> str:
+        """Combine rendered section bodies into one HTML document (with inline CSS)."""
+        return self._html_head + "\n".join(bodies) + "\n</body>\n</html>"
@@ -0,0 +1,412 @@
+"""
+PDF Jobs
+Einzugspaket rendering in a process pool with an asynchronous job API.
+
+WeasyPrint needs seconds of CPU for a full package, so rendering runs in
+pdf_pool worker processes instead of the event loop. Workers are replaced
+after PDF_WORKER_MAX_TASKS renders, so leaks cannot accumulate, and
+runaway renders are stopped by the pool timeout. PDF_WORKER_MEMORY_MB
+optionally caps a worker's address space (RLIMIT_AS). That limit counts
+virtual memory, not RSS, and pango/fontconfig map far more than they use,
+so it is off by default; set it well above the VmPeak measured for a full
+package in the production image.
+
+Jobs are stored in the pdf_jobs collection and their PDFs in the
+pdf_job_results binary table, so any API worker can answer status and
+download requests. Status changes wake long-polling clients via
+db.on_change. Finished jobs expire after JOB_TTL.
+
+Jobs and batches run as tasks of the API process that accepted them and
+refresh heartbeat_at while they run. If that process dies (restart,
+crash, scale-in), the heartbeat stops: after STALE_AFTER the job is marked
+fehler at the next startup, submit or status request, so waiting clients
+get an answer instead of polling until the TTL.
+
+Rendered PDFs are cached by a hash of their inputs (pdf_cache), so the
+usual generate -> save -> send sequence renders the package only once.
+Section fragments are cached as well and handed to the worker, which then
+only lays out the sections whose inputs changed.
+
+Batches render many packages (e.g. all residents of a WG after a
+Stammdaten change) with as many concurrent renders as the pool has
+workers, leaving queue room for interactive requests. Progress is kept
+in the einzugspaket_batches collection.
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from pdf_cache import einzugspaket_cache, fragment_cache
+from pdf_generator import EinzugspaketGenerator, render_key
+import pdf_optimizer
+from pdf_optimizer import PdfTooLarge
+from worker_pool import WorkerPool, WorkerPoolBusy
+
+logger = logging.getLogger(__name__)
+
+# Address space cap per worker (0 = none, see module docstring)
+PDF_WORKER_MEMORY_MB = int(os.environ.get("PDF_WORKER_MEMORY_MB", "0"))
+JOB_TTL = timedelta(hours=1)
+HEARTBEAT_SECONDS = 30
+# Jobs without a heartbeat for this long belong to a dead process
+STALE_AFTER = timedelta(minutes=2)
+BATCH_TTL = timedelta(days=1)
+# Retries of a batch item while interactive requests fill the pool queue
+BATCH_BUSY_RETRIES = 30
+# Upper bound for long-polling status requests
+MAX_WAIT_SECONDS = 30
+
+# Job status values
+WARTEND = "wartend"
+LAUFEND = "laufend"
+FERTIG = "fertig"
+FEHLER = "fehler"
+
+
+def _init_worker(memory_mb: int):
+    """Worker process setup: cap the address space if configured (Linux only)."""
+    if not memory_mb:
+        return
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        logging.getLogger(__name__).warning(f"Could not limit PDF worker memory: {e}")
+
+
+_generator = None
+
+
+def render_einzugspaket(params: dict, fragments: dict):
+    """Render an Einzugspaket PDF (runs in a pdf_pool worker process).
+
+    fragments holds cached section PDFs; returns (pdf_bytes, newly rendered
+    fragments, optimisation stats).
+    """
+    global _generator
+    if _generator is None:
+        # One generator per worker keeps the Jinja template cache warm
+        _generator = EinzugspaketGenerator()
+    available = dict(fragments)
+    stats = {}
+    pdf_bytes = _generator.generate(**params, fragments=available, stats=stats)
+    return pdf_bytes, {key: pdf for key, pdf in available.items() if key not in fragments}, stats
+
+
+pdf_pool = WorkerPool(
+    "pdf",
+    max_workers=int(os.environ.get("PDF_WORKERS", "2")),
+    queue_size=int(os.environ.get("PDF_QUEUE_SIZE", "8")),
+    timeout=float(os.environ.get("PDF_TIMEOUT_SECONDS", "120")),
+    initializer=_init_worker,
+    initargs=(PDF_WORKER_MEMORY_MB,),
+    max_tasks_per_child=int(os.environ.get("PDF_WORKER_MAX_TASKS", "20")),
+)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _is_stale(doc: dict) -> bool:
+    """Whether a job or batch is unfinished but its process stopped sending heartbeats."""
+    if doc["status"] not in (WARTEND, LAUFEND):
+        return False
+    beat = doc.get("heartbeat_at") or doc["created_at"]
+    return datetime.fromisoformat(beat) < _now() - STALE_AFTER
+
+
+class PdfJobService:
+    def __init__(self, db):
+        self.db = db
+        self._changed = asyncio.Event()
+        self._tasks = set()
+        self._rendering = {}
+        # Computes section keys in the API process (no rendering)
+        self._generator = EinzugspaketGenerator()
+        db.on_change("pdf_jobs", self._on_change)
+        db.on_change("einzugspaket_batches", self._on_change)
+
+    @property
+    def jobs(self):
+        return self.db.pdf_jobs
+
+    @property
+    def results(self):
+        return self.db.binary("pdf_job_results")
+
+    @property
+    def batches(self):
+        return self.db.einzugspaket_batches
+
+    def _on_change(self, table: str):
+        # Wake all waiters; each re-reads its job
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def render(self, params: dict) -> bytes:
+        """PDF for params from the cache or rendered in the pool (raises WorkerPoolBusy / TimeoutError)."""
+        key = render_key(**params)
+        cached = einzugspaket_cache.get(key)
+        if cached is not None:
+            return cached
+        # Identical concurrent requests (e.g. generate + save) share one render
+        pending = self._rendering.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = asyncio.ensure_future(self._render_sections(params))
+        self._rendering[key] = pending
+        try:
+            pdf_bytes = await asyncio.shield(pending)
+        finally:
+            self._rendering.pop(key, None)
+        einzugspaket_cache.put(key, pdf_bytes)
+        return pdf_bytes
+
+    async def _render_sections(self, params: dict) -> bytes:
+        """Render in the pool, reusing cached section fragments."""
+        fragments = {}
+        for section_key in self._generator.section_keys(**params):
+            fragment = fragment_cache.get(section_key)
+            if fragment is not None:
+                fragments[section_key] = fragment
+        try:
+            pdf_bytes, rendered, stats = await pdf_pool.run(render_einzugspaket, params, fragments)
+        except PdfTooLarge:
+            pdf_optimizer.over_budget.inc()
+            raise
+        for section_key, fragment in rendered.items():
+            fragment_cache.put(section_key, fragment)
+        pdf_optimizer.record(stats)
+        return pdf_bytes
+
+    async def submit(self, params: dict, **fields) -> dict:
+        """Queue a render job; fields (id, klient_id, filename, ...) are stored with it."""
+        await self.cleanup_expired()
+        # Fail fast instead of accepting a job the pool would reject
+        pdf_pool.check_capacity()
+        created = _now()
+        job = {
+            **fields,
+            "render_hash": render_key(**params),
+            "status": WARTEND,
+            "created_at": created.isoformat(),
+            "heartbeat_at": created.isoformat(),
+            "expires_at": (created + JOB_TTL).isoformat(),
+        }
+        await self.jobs.insert_one(job)
+        job.pop("_id", None)
+        task = asyncio.create_task(self._run(job["id"], params))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job_id: str, params: dict):
+        async with self._heartbeat(self.jobs, job_id):
+            await self._execute(job_id, params)
+
+    async def _execute(self, job_id: str, params: dict):
+        await self.jobs.update_one({"id": job_id}, {"$set": {"status": LAUFEND, "started_at": _now().isoformat()}})
+        try:
+            pdf_bytes = await self.render(params)
+        except WorkerPoolBusy:
+            await self._fail(job_id, "PDF-Erstellung ausgelastet, bitte erneut versuchen")
+            return
+        except PdfTooLarge as e:
+            await self._fail(job_id, f"Einzugspaket zu groß ({e.size // 1024} KB, max. {e.budget // 1024} KB)")
+            return
+        except asyncio.TimeoutError:
+            await self._fail(job_id, "Zeitüberschreitung bei der PDF-Erstellung")
+            return
+        except Exception as e:
+            logger.error(f"PDF job {job_id} failed: {e}")
+            await self._fail(job_id, "PDF konnte nicht erstellt werden")
+            return
+        etag = await self.results.put(job_id, pdf_bytes, "application/pdf")
+        await self.jobs.update_one({"id": job_id}, {"$set": {
+            "status": FERTIG,
+            "file_size": len(pdf_bytes),
+            "etag": etag,
+            "finished_at": _now().isoformat(),
+        }})
+
+    async def _fail(self, job_id: str, message: str):
+        await self.jobs.update_one({"id": job_id}, {"$set": {
+            "status": FEHLER, "fehler": message, "finished_at": _now().isoformat(),
+        }})
+
+    @asynccontextmanager
+    async def _heartbeat(self, collection, doc_id: str):
+        """Refresh heartbeat_at of a job or batch while the block runs."""
+        async def beat():
+            while True:
+                await asyncio.sleep(HEARTBEAT_SECONDS)
+                try:
+                    await collection.update_one({"id": doc_id}, {"$set": {"heartbeat_at": _now().isoformat()}})
+                except Exception as e:
+                    logger.warning(f"Heartbeat of {doc_id} failed: {e}")
+
+        task = asyncio.create_task(beat())
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    async def _abandon(self, collection, doc: dict) -> bool:
+        """Mark a stale job or batch as failed; False if it finished meanwhile."""
+        # Conditional on the state read, so a job that just finished or beat is left alone
+        query = {"id": doc["id"], "status": doc["status"]}
+        if doc.get("heartbeat_at"):
+            query["heartbeat_at"] = doc["heartbeat_at"]
+        result = await collection.update_one(
+            query,
+            {"$set": {
+                "status": FEHLER,
+                "fehler": "PDF-Erstellung abgebrochen (Server neu gestartet), bitte erneut versuchen",
+                "finished_at": _now().isoformat(),
+            }},
+        )
+        if result.matched_count:
+            logger.warning(f"PDF {collection.table} entry {doc['id']} abandoned by its process, marked as failed")
+        return result.matched_count == 1
+
+    async def recover_stale(self) -> int:
+        """Fail jobs and batches of dead processes; returns how many were marked."""
+        cutoff = (_now() - STALE_AFTER).isoformat()
+        marked = 0
+        for collection in (self.jobs, self.batches):
+            unfinished = await collection.find(
+                {"status": {"$in": [WARTEND, LAUFEND]}, "created_at": {"$lt": cutoff}},
+                {"id": 1, "status": 1, "created_at": 1, "heartbeat_at": 1},
+            ).to_list(None)
+            for doc in unfinished:
+                if _is_stale(doc) and await self._abandon(collection, doc):
+                    marked += 1
+        return marked
+
+    async def get(self, job_id: str):
+        return await self._get(self.jobs, job_id)
+
+    async def _get(self, collection, doc_id: str):
+        doc = await collection.find_one({"id": doc_id}, {"_id": 0})
+        if doc is not None and _is_stale(doc) and await self._abandon(collection, doc):
+            doc = await collection.find_one({"id": doc_id}, {"_id": 0})
+        return doc
+
+    async def wait(self, job_id: str, timeout: float):
+        """Job once it is finished or failed, or its current state after timeout."""
+        return await self._wait(self.jobs, job_id, timeout)
+
+    async def get_batch(self, batch_id: str):
+        return await self._get(self.batches, batch_id)
+
+    async def wait_batch(self, batch_id: str, timeout: float):
+        """Batch after its next progress step (or once finished / after timeout)."""
+        batch = await self.get_batch(batch_id)
+        if batch is None:
+            return None
+        seen = batch["done"] + batch["failed"]
+        return await self._wait(self.batches, batch_id, timeout, lambda b: b["done"] + b["failed"] != seen)
+
+    async def _wait(self, collection, doc_id: str, timeout: float, progressed=None):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            changed = self._changed
+            doc = await collection.find_one({"id": doc_id}, {"_id": 0})
+            if doc is not None and _is_stale(doc) and await self._abandon(collection, doc):
+                continue
+            if doc is None or doc["status"] in (FERTIG, FEHLER) or (progressed and progressed(doc)):
+                return doc
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return doc
+            try:
+                # Changes made by other processes arrive via LISTEN/NOTIFY; re-check every
+                # second anyway in case the notification connection is down
+                await asyncio.wait_for(changed.wait(), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def submit_batch(self, items: list, store, **fields) -> dict:
+        """Render and store many packages in the background.
+
+        items: [{"params": generator arguments, **info}]; info (klient_id,
+        name, ...) is copied into the item's result.
+        store(params, pdf_bytes, item) saves one package and returns a dict
+        that is merged into its result (e.g. the dokument_id).
+        """
+        await self.cleanup_expired()
+        created = _now()
+        batch = {
+            **fields,
+            "status": LAUFEND,
+            "total": len(items),
+            "done": 0,
+            "failed": 0,
+            "results": [],
+            "created_at": created.isoformat(),
+            "heartbeat_at": created.isoformat(),
+            "expires_at": (created + BATCH_TTL).isoformat(),
+        }
+        await self.batches.insert_one(batch)
+        batch.pop("_id", None)
+        task = asyncio.create_task(self._run_batch(batch["id"], items, store))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return batch
+
+    async def _run_batch(self, batch_id: str, items: list, store):
+        async with self._heartbeat(self.batches, batch_id):
+            await self._execute_batch(batch_id, items, store)
+
+    async def _execute_batch(self, batch_id: str, items: list, store):
+        # One render per worker; the pool queue stays free for interactive requests
+        slots = asyncio.Semaphore(pdf_pool.max_workers)
+        progress_lock = asyncio.Lock()
+        results = []
+        counts = {"done": 0, "failed": 0}
+
+        async def process(item):
+            result = {k: v for k, v in item.items() if k != "params"}
+            async with slots:
+                try:
+                    pdf_bytes = await self._render_when_free(item["params"])
+                    result.update(await store(item["params"], pdf_bytes, item))
+                    counts["done"] += 1
+                except Exception as e:
+                    logger.error(f"Batch {batch_id}: {result} failed: {e}")
+                    result["fehler"] = "PDF konnte nicht erstellt werden"
+                    counts["failed"] += 1
+            async with progress_lock:
+                results.append(result)
+                await self.batches.update_one({"id": batch_id}, {"$set": {**counts, "results": results}})
+
+        await asyncio.gather(*(process(item) for item in items))
+        await self.batches.update_one({"id": batch_id}, {"$set": {
+            "status": FERTIG, "finished_at": _now().isoformat(),
+        }})
+
+    async def _render_when_free(self, params: dict) -> bytes:
+        for _ in range(BATCH_BUSY_RETRIES):
+            try:
+                return await self.render(params)
+            except WorkerPoolBusy:
+                await asyncio.sleep(2)
+        return await self.render(params)
+
+    async def result(self, job_id: str):
+        """PDF bytes of a finished job, or None."""
+        stored = await self.results.get(job_id)
+        return stored["data"] if stored else None
+
+    async def cleanup_expired(self):
+        await self.recover_stale()
+        expired = await self.jobs.find({"expires_at": {"$lt": _now().isoformat()}}, {"id": 1}).to_list(1000)
+        for job in expired:
+            await self.results.delete_prefix(job["id"])
+            await self.jobs.delete_one({"id": job["id"]})
+        await self.batches.delete_many({"expires_at": {"$lt": _now().isoformat()}})
@@ -0,0 +1,115 @@
+"""
+PDF Optimizer
+Size reduction of rendered Einzugspaket PDFs before they are stored or mailed.
+
+WeasyPrint already subsets fonts and embeds images at PDF_IMAGE_DPI (see
+EinzugspaketGenerator._write_pdf). After the section fragments are merged,
+this stage:
+- downsamples and JPEG-recompresses embedded images larger than the page
+  needs at the target DPI,
+- compresses page content streams,
+- deduplicates identical objects (fonts, images, ICC profiles repeated by
+  every fragment) and drops unreferenced ones.
+
+If the result exceeds EINZUGSPAKET_MAX_BYTES, further passes with lower
+DPI and JPEG quality are tried before PdfTooLarge is raised.
+"""
+
+import io
+import logging
+import os
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PDF_IMAGE_DPI = int(os.environ.get("PDF_IMAGE_DPI", "150"))
+PDF_JPEG_QUALITY = int(os.environ.get("PDF_JPEG_QUALITY", "80"))
+EINZUGSPAKET_MAX_BYTES = int(os.environ.get("EINZUGSPAKET_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# Widest an image can be shown on an A4 page (inches)
+PAGE_WIDTH_INCHES = 8.27
+
+# (DPI, JPEG quality) per pass; later passes only run if the budget is exceeded
+PASSES = [
+    (PDF_IMAGE_DPI, PDF_JPEG_QUALITY),
+    (PDF_IMAGE_DPI * 2 // 3, 60),
+    (72, 45),
+]
+
+original_bytes = metrics.counter("einzugspaket_pdf_original_bytes_total", "Einzugspaket PDF bytes before optimisation")
+optimized_bytes = metrics.counter("einzugspaket_pdf_optimized_bytes_total", "Einzugspaket PDF bytes after optimisation")
+last_ratio = metrics.gauge("einzugspaket_pdf_last_size_ratio", "Optimised/original size of the last rendered package")
+over_budget = metrics.counter(
+    "einzugspaket_pdf_over_budget_total", "Packages rejected for exceeding EINZUGSPAKET_MAX_BYTES"
+)
+
+
+class PdfTooLarge(Exception):
+    def __init__(self, size: int, budget: int):
+        super().__init__(size, budget)
+        self.size = size
+        self.budget = budget
+
+    def __str__(self):
+        return f"PDF is {self.size} bytes, budget {self.budget}"
+
+
+def _optimize(pdf_bytes: bytes, dpi: int, quality: int) -> tuple:
+    """One optimisation pass; returns (bytes, number of downsampled images)."""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter(clone_from=PdfReader(io.BytesIO(pdf_bytes)))
+    max_pixels = int(PAGE_WIDTH_INCHES * dpi)
+    downsampled = 0
+    for page in writer.pages:
+        for image_file in page.images:
+            image = image_file.image
+            # Alpha/palette images would lose transparency as JPEG
+            if image.mode not in ("RGB", "L") or max(image.size) <= max_pixels:
+                continue
+            image.thumbnail((max_pixels, max_pixels))
+            image_file.replace(image, quality=quality)
+            downsampled += 1
+        page.compress_content_streams()
+    writer.compress_identical_objects()
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue(), downsampled
+
+
+def optimize_pdf(pdf_bytes: bytes, budget: int = EINZUGSPAKET_MAX_BYTES) -> tuple:
+    """Optimise a PDF to fit the byte budget; returns (bytes, stats).
+
+    Raises PdfTooLarge if even the most aggressive pass exceeds the budget.
+    """
+    for attempt, (dpi, quality) in enumerate(PASSES, start=1):
+        optimized, downsampled = _optimize(pdf_bytes, dpi, quality)
+        # Never return something bigger than the input
+        if len(optimized) > len(pdf_bytes):
+            optimized = pdf_bytes
+        if len(optimized) <= budget:
+            break
+    else:
+        raise PdfTooLarge(len(optimized), budget)
+
+    return optimized, {
+        "original_bytes": len(pdf_bytes),
+        "optimized_bytes": len(optimized),
+        "images_downsampled": downsampled,
+        "passes": attempt,
+        "dpi": dpi,
+    }
+
+
+def record(stats: dict):
+    """Export before/after sizes of one render (called in the API process)."""
+    original_bytes.inc(stats["original_bytes"])
+    optimized_bytes.inc(stats["optimized_bytes"])
+    if stats["original_bytes"]:
+        last_ratio.set(round(stats["optimized_bytes"] / stats["original_bytes"], 3))
+    logger.info(
+        f"Einzugspaket PDF {stats['original_bytes']} -> {stats['optimized_bytes']} bytes "
+        f"({stats['images_downsampled']} images downsampled, {stats['passes']} passes)"
+    )
@@ -0,0 +1,148 @@
+"""
+PDF Thumbnails
+Page previews for PDF documents in the blob store.
+
+Pages are rasterised with pdfium in thumbnail_pool worker processes and
+encoded as WebP and PNG. Thumbnails live in the "document_thumbnails"
+binary store under the document's blob key (the content hash), so a PDF
+referenced by several documents is rendered once and an entry never goes
+stale. New PDFs get their first-page thumbnail in the background right
+after they are stored; further pages (up to THUMBNAIL_MAX_PAGES) and
+documents stored earlier are rendered on first request.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+
+import metrics
+from worker_pool import WorkerPool, WorkerPoolBusy
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTH = int(os.environ.get("THUMBNAIL_WIDTH", "300"))
+THUMBNAIL_MAX_PAGES = int(os.environ.get("THUMBNAIL_MAX_PAGES", "20"))
+
+# Output format -> (PIL format, content type, save options)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "png": ("PNG", "image/png", {"optimize": True}),
+}
+
+rendered_pages = metrics.counter("document_thumbnail_pages_total", "PDF pages rendered as thumbnails")
+
+
+def render_thumbnails(content: bytes, page_limit: int) -> tuple:
+    """Rasterise the first page_limit pages of a PDF.
+
+    Returns (page count, [{fmt: (bytes, content_type)} per rendered page]).
+    Raises on undecodable input.
+    """
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(content)
+    try:
+        page_count = len(pdf)
+        pages = []
+        for index in range(min(page_count, page_limit)):
+            page = pdf[index]
+            image = page.render(scale=THUMBNAIL_WIDTH / page.get_width()).to_pil()
+            page.close()
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            outputs = {}
+            for fmt, (pil_format, content_type, options) in FORMATS.items():
+                output = io.BytesIO()
+                image.save(output, format=pil_format, **options)
+                outputs[fmt] = (output.getvalue(), content_type)
+            pages.append(outputs)
+        return page_count, pages
+    finally:
+        pdf.close()
+
+
+def preferred_format(accept: str) -> str:
+    """Pick WebP if the client accepts it, PNG otherwise."""
+    return "webp" if "image/webp" in (accept or "") else "png"
+
+
+thumbnail_pool = WorkerPool(
+    "thumbnail",
+    max_workers=int(os.environ.get("THUMBNAIL_WORKERS", "1")),
+    queue_size=int(os.environ.get("THUMBNAIL_QUEUE_SIZE", "8")),
+    timeout=float(os.environ.get("THUMBNAIL_TIMEOUT_SECONDS", "60")),
+)
+
+
+class ThumbnailService:
+    def __init__(self, db):
+        self.db = db
+        self._tasks = set()
+        self._rendering = {}
+
+    @property
+    def store(self):
+        return self.db.binary("document_thumbnails")
+
+    async def info(self, source: str):
+        """{"pages": page count, "rendered": thumbnails available} or None."""
+        entry = await self.store.get(f"{source}/info")
+        return json.loads(entry["data"]) if entry else None
+
+    async def ensure(self, source: str, load, page: int = 1) -> dict:
+        """Render thumbnails of source up to page unless already stored; returns info.
+
+        load is an async callable returning the PDF bytes. Beyond the first
+        page, all pages up to THUMBNAIL_MAX_PAGES are rendered at once.
+        Raises WorkerPoolBusy / TimeoutError, or the render error.
+        """
+        info = await self.info(source)
+        if info and (page <= info["rendered"] or info["rendered"] >= min(info["pages"], THUMBNAIL_MAX_PAGES)):
+            return info
+        page_limit = 1 if page <= 1 else THUMBNAIL_MAX_PAGES
+        # Concurrent requests for the same document share one render
+        key = (source, page_limit)
+        pending = self._rendering.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = asyncio.ensure_future(self._render(source, load, page_limit))
+        self._rendering[key] = pending
+        try:
+            return await asyncio.shield(pending)
+        finally:
+            self._rendering.pop(key, None)
+
+    async def _render(self, source: str, load, page_limit: int) -> dict:
+        page_count, pages = await thumbnail_pool.run(render_thumbnails, await load(), page_limit)
+        for number, outputs in enumerate(pages, start=1):
+            for fmt, (data, content_type) in outputs.items():
+                await self.store.put(f"{source}/{number}.{fmt}", data, content_type)
+        rendered_pages.inc(len(pages))
+        # Written last: readers only see info once all its pages exist
+        info = {"pages": page_count, "rendered": len(pages)}
+        await self.store.put(f"{source}/info", json.dumps(info).encode(), "application/json")
+        return info
+
+    async def get(self, source: str, page: int, fmt: str):
+        """Stored thumbnail (metadata plus 'data') or None."""
+        return await self.store.get(f"{source}/{page}.{fmt}")
+
+    def schedule(self, source: str, load):
+        """Render the first-page thumbnail in the background (errors are logged only)."""
+        task = asyncio.create_task(self._ensure_logged(source, load))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _ensure_logged(self, source: str, load):
+        try:
+            await self.ensure(source, load)
+        except WorkerPoolBusy:
+            # Rendered on first request instead
+            logger.info(f"Thumbnail pool busy, skipping background render of {source}")
+        except Exception as e:
+            logger.error(f"Thumbnail rendering failed for {source}: {e}")
+
+    async def delete(self, source: str):
+        await self.store.delete_prefix(f"{source}/")
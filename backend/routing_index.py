@@ -0,0 +1,165 @@
+"""
+Routing Index
+In-memory lookup of klienten by contact email, phone number and id prefix.
+
+Inbound emails and WhatsApp messages are matched to klienten by the
+[DV-xxxxxxxx] subject tag (first 8 characters of the klient id), the
+sender's email address or the sender's phone number. The index holds
+normalised keys (lowercased emails, E.164 phone numbers) for all klienten
+and reloads lazily after klienten are added or removed or their contact
+fields change, so routing a message is a dict hit instead of a table
+scan. Other updates (status, notes) leave it alone.
+
+Contact emails are stored normalised, so the table can also be asked
+directly with an indexed equality lookup (find_by_email).
+"""
+
+import asyncio
+import logging
+import os
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Country code for national numbers without one (0301234567 -> +49301234567)
+DEFAULT_COUNTRY_CODE = os.environ.get("ROUTING_DEFAULT_COUNTRY_CODE", "49")
+ID_PREFIX_LENGTH = 8
+# Fields the snapshot is built from; updates to other fields keep it valid
+ROUTING_FIELDS = ("id", "kontakt_email", "kontakt_telefon", "created_at")
+
+_PHONE_NOISE = re.compile(r"[\s\-()/.]")
+
+
+def normalize_email(email: str) -> Optional[str]:
+    email = (email or "").strip().lower()
+    return email or None
+
+
+def normalize_phone(phone: str) -> Optional[str]:
+    """E.164 form of a phone number ("+4930123456"), or None if it has no digits."""
+    phone = _PHONE_NOISE.sub("", (phone or "").replace("whatsapp:", ""))
+    if phone.startswith("+"):
+        digits = phone[1:]
+    elif phone.startswith("00"):
+        digits = phone[2:]
+    elif phone.startswith("0"):
+        digits = DEFAULT_COUNTRY_CODE + phone[1:]
+    else:
+        # Assume the number already starts with its country code
+        digits = phone
+    digits = "".join(c for c in digits if c.isdigit())
+    return f"+{digits}" if digits else None
+
+
+@dataclass(frozen=True)
+class RoutingSnapshot:
+    """Immutable lookup tables at one point in time."""
+    by_email: Mapping[str, str]
+    by_phone: Mapping[str, str]
+    by_id_prefix: Mapping[str, str]
+
+
+EMPTY_SNAPSHOT = RoutingSnapshot(MappingProxyType({}), MappingProxyType({}), MappingProxyType({}))
+
+
+class RoutingIndex:
+    def __init__(self, db):
+        self.db = db
+        self._snapshot = EMPTY_SNAPSHOT
+        self._dirty = True
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        db.on_change("klienten", self.invalidate, fields=ROUTING_FIELDS)
+
+    async def setup(self):
+        """Index kontakt_email and normalise addresses stored before writes normalised them."""
+        await self.db.klienten.create_index("kontakt_email")
+        klienten = await self.db.klienten.find({}, {"id": 1, "kontakt_email": 1}).to_list(None)
+        migrated = 0
+        for klient in klienten:
+            stored = klient.get("kontakt_email")
+            if stored and normalize_email(stored) != stored:
+                await self.db.klienten.update_one(
+                    {"id": klient["id"]}, {"$set": {"kontakt_email": normalize_email(stored)}}
+                )
+                migrated += 1
+        if migrated:
+            logger.info(f"Routing index: normalised {migrated} klient email addresses")
+
+    def invalidate(self, table: str = None):
+        """Mark the index stale; the next lookup reloads it."""
+        self._dirty = True
+        self._generation += 1
+
+    async def snapshot(self) -> RoutingSnapshot:
+        """Return the current snapshot, reloading it first if it is stale."""
+        if not self._dirty:
+            return self._snapshot
+        async with self._lock:
+            if self._dirty:
+                generation = self._generation
+                snapshot = await self._load()
+                self._snapshot = snapshot
+                # A change during loading keeps the index dirty
+                self._dirty = generation != self._generation
+        return self._snapshot
+
+    async def _load(self) -> RoutingSnapshot:
+        klienten = await self.db.klienten.find(
+            {}, {field: 1 for field in ROUTING_FIELDS}
+        ).sort("created_at", 1).to_list(None)
+
+        by_email, by_phone, by_id_prefix = {}, {}, {}
+        ambiguous = set()
+        for klient in klienten:
+            # Shared contacts (e.g. one relative for two klienten) route to the oldest klient
+            email = normalize_email(klient.get("kontakt_email"))
+            if email:
+                by_email.setdefault(email, klient["id"])
+            phone = normalize_phone(klient.get("kontakt_telefon"))
+            if phone:
+                by_phone.setdefault(phone, klient["id"])
+            prefix = klient["id"][:ID_PREFIX_LENGTH]
+            if prefix in by_id_prefix:
+                ambiguous.add(prefix)
+            by_id_prefix[prefix] = klient["id"]
+        # A tag matching several klienten must not be routed to a random one
+        for prefix in ambiguous:
+            del by_id_prefix[prefix]
+        if ambiguous:
+            logger.warning(f"Routing index: {len(ambiguous)} ambiguous id prefixes")
+
+        logger.info(f"Routing index loaded: {len(klienten)} klienten")
+        return RoutingSnapshot(
+            by_email=MappingProxyType(by_email),
+            by_phone=MappingProxyType(by_phone),
+            by_id_prefix=MappingProxyType(by_id_prefix),
+        )
+
+    async def by_email(self, email: str) -> Optional[str]:
+        """Klient id for a contact email address, or None."""
+        key = normalize_email(email)
+        return (await self.snapshot()).by_email.get(key) if key else None
+
+    async def find_by_email(self, email: str) -> Optional[str]:
+        """Like by_email, but asks the table (sees klienten the index has not loaded yet)."""
+        key = normalize_email(email)
+        if not key:
+            return None
+        # Addresses are stored normalised (see setup), so an indexed equality lookup suffices
+        klienten = await self.db.klienten.find(
+            {"kontakt_email": key}, {"id": 1, "created_at": 1}
+        ).sort("created_at", 1).to_list(1)
+        return klienten[0]["id"] if klienten else None
+
+    async def by_phone(self, phone: str) -> Optional[str]:
+        """Klient id for a contact phone number in any common notation, or None."""
+        key = normalize_phone(phone)
+        return (await self.snapshot()).by_phone.get(key) if key else None
+
+    async def by_id_prefix(self, prefix: str) -> Optional[str]:
+        """Klient id for the 8-character prefix of a [DV-...] tag, or None."""
+        return (await self.snapshot()).by_id_prefix.get((prefix or "").lower())
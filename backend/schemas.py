@@ -342,6 +342,7 @@ class TicketPhotoResponse(BaseModel):
     category: str
     photo_url: str
     thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
     description: Optional[str] = None
     uploaded_by: str
     uploaded_at: datetime
@@ -376,6 +377,15 @@ class WorkReportResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class PhotoUploadSessionCreate(BaseModel):
+    total_size: int = Field(..., gt=0)
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    category: str = "Während"
+    description: Optional[str] = None
+    handwerker_id: Optional[str] = None
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")  # Verified on completion
+
 class StatusUpdateCreate(BaseModel):
     ticket_id: str
     status: str
@@ -409,6 +419,7 @@ class HandwerkerTicketResponse(BaseModel):
     tenant_name: Optional[str] = None
     tenant_phone: Optional[str] = None
     photos: List[TicketPhotoResponse] = []
+    photo_count: int = 0
     status_updates: List[StatusUpdateResponse] = []
     work_report: Optional[WorkReportResponse] = None
     created_at: datetime
@@ -473,6 +484,21 @@ class PflegeWGBase(BaseModel):
     preisliste_url: Optional[str] = None
     beschreibung: Optional[str] = None
 
+class PflegeWGCreate(PflegeWGBase):
+    id: str = Field(pattern=r"^wg-[a-z0-9-]+$", max_length=100)
+    property_name: Optional[str] = Field(None, max_length=300)
+    property_address: Optional[str] = Field(None, max_length=300)
+
+class PflegeWGUpdate(BaseModel):
+    kurzname: Optional[str] = None
+    kapazitaet: Optional[int] = None
+    grundriss_url: Optional[str] = None
+    konzept_url: Optional[str] = None
+    preisliste_url: Optional[str] = None
+    beschreibung: Optional[str] = None
+    property_name: Optional[str] = None
+    property_address: Optional[str] = None
+
 class PflegeWGResponse(PflegeWGBase):
     id: str
     property_id: str
@@ -682,3 +708,10 @@ class EinzugspaketEmailRequest(BaseModel):
     betreff: str = "Einzugspaket - DomusVita Pflege-Wohngemeinschaft"
     nachricht: str = ""
     mietbeginn: Optional[str] = None
+
+
+class EinzugspaketBatchRequest(BaseModel):
+    wg_id: Optional[str] = None  # Alle aktuellen Bewohner der WG
+    klient_ids: Optional[List[str]] = None  # Oder eine Liste von Klienten (mit Zimmer)
+    mietbeginn: Optional[str] = None  # Standard: Einzugsdatum des Klienten
+    dokumente: Optional[List[str]] = None  # z.B. ["kosten", "mietvertrag"]
@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, BackgroundTasks, Query
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, BackgroundTasks, Query, Request
+from fastapi.responses import Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
@@ -17,12 +17,32 @@ import base64
 import io
 import asyncio
 import re
-from PIL import Image
-from pdf_generator import EinzugspaketGenerator, DOCUMENT_SECTIONS, SECTION_LABELS
+import hmac
+from pdf_generator import EinzugspaketGenerator, DOCUMENT_SECTIONS, SECTION_LABELS, render_key
+import asyncpg
 import email_service
 from ai_summary import generate_summary
-
-from auth import get_current_user, get_current_user_optional, DEV_MODE, AZURE_AD_TENANT_ID, AZURE_AD_CLIENT_ID
+from wg_occupancy import WGOccupancyService, kosten_pro_bewohner
+from wg_registry import WGRegistry
+from routing_index import RoutingIndex, normalize_email
+from graph_subscriptions import InboxSubscription
+from ticket_cards import TicketCardProjector, photo_refs
+from image_processing import VARIANTS, FORMATS, render_variants, blob_key, preferred_format, image_pool
+from worker_pool import WorkerPoolBusy
+from blob_store import create_blob_store, content_key, BlobNotFound
+from downloads import blob_download, bytes_download
+from uploads import receive_upload, RequestSizeLimitMiddleware, UPLOAD_LIMITS
+from upload_sessions import UploadSessionStore, expected_chunk_size, OFFEN as UPLOAD_OFFEN, ABGESCHLOSSEN as UPLOAD_ABGESCHLOSSEN
+from compression import COMPRESSED_FIELDS
+from pdf_cache import preview_cache
+from pdf_thumbnails import ThumbnailService, thumbnail_pool, preferred_format as thumbnail_format
+from pdf_optimizer import PdfTooLarge
+from pdf_jobs import PdfJobService, pdf_pool, MAX_WAIT_SECONDS, FERTIG as PDF_JOB_FERTIG, FEHLER as PDF_JOB_FEHLER
+import metrics
+
+from auth import (
+    get_current_user, get_current_user_optional, security, DEV_MODE, AZURE_AD_TENANT_ID, AZURE_AD_CLIENT_ID
+)
 
 from schemas import (
     PropertyCreate, PropertyUpdate, PropertyResponse,
@@ -37,13 +57,13 @@ from schemas import (
     TicketPhotoCreate, TicketPhotoResponse,
     WorkReportCreate, WorkReportResponse,
     StatusUpdateCreate, StatusUpdateResponse,
-    HandwerkerTicketResponse,
+    HandwerkerTicketResponse, PhotoUploadSessionCreate,
     # Klientenmanagement
-    PflegeWGResponse, ZimmerCreate, ZimmerUpdate, ZimmerResponse,
+    PflegeWGResponse, PflegeWGCreate, PflegeWGUpdate, ZimmerCreate, ZimmerUpdate, ZimmerResponse,
     KlientCreate, KlientUpdate, KlientResponse,
     KommunikationCreate, KommunikationResponse,
     AktivitaetResponse, PipelineStats, KlientenDashboard,
-    WGStammdatenUpdate, EinzugspaketRequest, EinzugspaketEmailRequest,
+    WGStammdatenUpdate, EinzugspaketRequest, EinzugspaketEmailRequest, EinzugspaketBatchRequest,
     AuszugRequest
 )
 
@@ -53,28 +73,69 @@ load_dotenv(ROOT_DIR / '.env')
 
 # Database (initialized in lifespan)
 db = None
+wg_registry = None
+routing_index = None
+inbox_subscription = None
+wg_occupancy = None
+ticket_cards = None
+blob_store = None
+upload_sessions = None
+pdf_jobs = None
+thumbnails = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global db
+    global db, wg_registry, routing_index, inbox_subscription, wg_occupancy, ticket_cards, blob_store, upload_sessions, pdf_jobs, thumbnails
     db = await PgDatabase.create()
     logger.info(f"Database connected: {db}")
+    for table, fields in COMPRESSED_FIELDS.items():
+        db.compress(table, fields)
+    await db.load_compression_dictionaries()
+    blob_store = create_blob_store(db)
+    upload_sessions = UploadSessionStore(db)
+    pdf_jobs = PdfJobService(db)
+    thumbnails = ThumbnailService(db)
+    wg_registry = WGRegistry(db)
+    routing_index = RoutingIndex(db)
+    inbox_subscription = InboxSubscription(db)
+    wg_occupancy = WGOccupancyService(db, wg_registry)
+    await db.start_change_listener()
+    await routing_index.setup()
+    await wg_registry.bootstrap()
+    ticket_cards = TicketCardProjector(db)
+    await ticket_cards.setup()
+    # Jobs of a previous process that died mid-render would otherwise stay "laufend"
+    await pdf_jobs.recover_stale()
+    # Exactly-once email processing relies on this key: refuse to start without it
+    await db.email_eingang.create_index("message_id", unique=True, required=True)
+    await db.klient_kommunikation.create_index("message_id")
+    await db.email_allgemein.create_index("message_id")
+    await email_service.start()
     # Start inbox polling background task
     poll_task = asyncio.create_task(poll_inbox_loop())
+    subscription_task = asyncio.create_task(inbox_subscription.run()) if inbox_subscription.enabled else None
     yield
     poll_task.cancel()
+    if subscription_task:
+        subscription_task.cancel()
+    image_pool.shutdown()
+    pdf_pool.shutdown()
+    thumbnail_pool.shutdown()
+    await email_service.close()
     await db.close()
 
 
 async def poll_inbox_loop():
-    """Poll the shared mailbox for new emails every 5 minutes."""
+    """Sync the shared mailbox on change notifications, or by polling as a fallback."""
     await asyncio.sleep(30)  # Wait 30s after startup before first poll
     while True:
         try:
             await process_incoming_emails()
         except Exception as e:
             logger.error(f"Inbox polling error: {e}")
-        await asyncio.sleep(300)  # 5 minutes
+        # Notifications cover new mail while subscribed; polling is only the safety net then
+        interval = INBOX_FALLBACK_POLL_SECONDS if inbox_subscription.active else INBOX_POLL_SECONDS
+        await inbox_subscription.wait(interval)
 
 
 async def generate_and_store_summary(komm_id: str, text: str):
@@ -90,48 +151,181 @@ async def generate_and_store_summary(komm_id: str, text: str):
         logger.error(f"Summary generation failed for {komm_id}: {e}")
 
 
+INBOX_POLL_SECONDS = int(os.environ.get("INBOX_POLL_SECONDS", "300"))
+INBOX_FALLBACK_POLL_SECONDS = int(os.environ.get("INBOX_FALLBACK_POLL_SECONDS", "1800"))
+# Emails routed in parallel during one sync
+INBOX_CONCURRENCY = int(os.environ.get("INBOX_CONCURRENCY", "8"))
+DV_TAG_PATTERN = re.compile(r"\[DV-([a-f0-9]{8})\]")
+INQUIRY_KEYWORDS = ["anfrage", "interesse", "pflege-wg", "platz", "wohngemeinschaft", "einzug"]
+# A claim older than this belongs to a crashed worker and may be taken over
+EMAIL_CLAIM_TIMEOUT = timedelta(minutes=10)
+# Failed attempts before an email is given up and no longer holds back the delta link
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "5"))
+
+
 async def process_incoming_emails():
-    """Process unread emails from the shared mailbox and route them to clients."""
-    emails = await email_service.get_unread_emails()
-    if not emails:
-        return
+    """Sync the shared mailbox via Graph delta query and route new emails to clients."""
+    state = await db.mail_sync_state.find_one({"id": "inbox"})
+    delta_link = state.get("delta_link") if state else None
+    try:
+        await sync_inbox(delta_link)
+    except email_service.DeltaExpired:
+        logger.warning("Inbox delta link expired, starting a new initial sync")
+        await sync_inbox(None)
+
+
+async def sync_inbox(delta_link: Optional[str]):
+    """Page through all inbox changes since delta_link and process unread emails.
 
-    dv_tag_pattern = re.compile(r"\[DV-([a-f0-9]{8})\]")
+    The new delta link is only stored once every email is settled, so
+    failed ones (and ones another worker is still on) are picked up again
+    by the next sync; the email_eingang ledger makes that repeat harmless.
+    An email failing EMAIL_MAX_ATTEMPTS times is given up: it stays unread
+    in the mailbox and no longer holds back the link.
+    """
+    semaphore = asyncio.Semaphore(INBOX_CONCURRENCY)
 
-    for email in emails:
-        subject = email.get("subject", "")
-        body_text = email.get("body", "")
-        from_email = email.get("from_email", "")
-        from_name = email.get("from_name", "")
-        message_id = email.get("id")
+    async def process(email: dict) -> str:
+        async with semaphore:
+            try:
+                return await process_incoming_email(email)
+            except Exception as e:
+                logger.error(f"Processing email {email['id']} failed: {e}")
+                return await fail_incoming_email(email["id"], e)
+
+    processed, failed, deferred, given_up = 0, 0, 0, 0
+    async for page in email_service.iter_inbox_delta(delta_link):
+        # Delta also reports changes to read mails (e.g. our own mark-as-read)
+        unread = [email for email in page["messages"] if not email["is_read"]]
+        results = await asyncio.gather(*(process(email) for email in unread))
+        done = []
+        for email, status in zip(unread, results):
+            if status == "verarbeitet":
+                done.append(email["id"])
+            elif status == "fehlgeschlagen":
+                failed += 1
+            elif status == "aufgegeben":
+                given_up += 1
+            else:
+                deferred += 1
+        if done:
+            await email_service.mark_many_as_read(done)
+        processed += len(done)
+
+        if page["delta_link"] and not failed and not deferred:
+            await db.mail_sync_state.update_one(
+                {"id": "inbox"},
+                {"$set": {"delta_link": page["delta_link"], "synced_at": to_iso(now())}},
+                upsert=True,
+            )
+    if processed or failed or given_up:
+        logger.info(f"Inbox sync: {processed} emails processed, {failed} failed, {given_up} given up")
+
+
+async def claim_incoming_email(message_id: str) -> str:
+    """Claim a Graph message in the email_eingang ledger (unique message_id).
 
-        klient = None
-        komm_id = generate_id()
+    Returns "claimed" to process it now, "verarbeitet" or "aufgegeben" if
+    it is settled, or "in_bearbeitung" if another worker is processing it
+    right now.
+    """
+    claimed_at = to_iso(now())
+    try:
+        await db.email_eingang.insert_one({
+            "id": generate_id(),
+            "message_id": message_id,
+            "status": "in_bearbeitung",
+            "claimed_at": claimed_at,
+            "versuche": 0,
+        })
+        return "claimed"
+    except asyncpg.UniqueViolationError:
+        pass
+    entry = await db.email_eingang.find_one({"message_id": message_id})
+    if entry["status"] in ("verarbeitet", "aufgegeben"):
+        return entry["status"]
+    if entry["status"] == "in_bearbeitung" and from_iso(entry["claimed_at"]) > now() - EMAIL_CLAIM_TIMEOUT:
+        return "in_bearbeitung"
+    # Failed attempt or stale claim of a crashed worker: take over unless someone else just did
+    result = await db.email_eingang.update_one(
+        {"message_id": message_id, "claimed_at": entry["claimed_at"]},
+        {"$set": {"status": "in_bearbeitung", "claimed_at": claimed_at}}
+    )
+    return "claimed" if result.matched_count else "in_bearbeitung"
 
-        # Route 1: Subject contains [DV-{id}] tag → reply to existing client
-        tag_match = dv_tag_pattern.search(subject)
-        if tag_match:
-            short_id = tag_match.group(1)
-            klient = await db.klienten.find_one({"id": {"$regex": f"^{short_id}"}})
 
-        # Route 2: Sender email matches a client's contact email
-        if not klient and from_email:
-            klient = await db.klienten.find_one({"kontakt_email": from_email})
+async def fail_incoming_email(message_id: str, error: Exception) -> str:
+    """Record a failed attempt in the ledger; returns the new status.
 
-        # Route 3: Keywords suggest a new inquiry
-        if not klient:
-            inquiry_keywords = ["anfrage", "interesse", "pflege-wg", "platz", "wohngemeinschaft", "einzug"]
-            subject_lower = subject.lower()
-            is_inquiry = any(kw in subject_lower for kw in inquiry_keywords)
+    "fehlgeschlagen" releases the claim for the next sync, "aufgegeben"
+    after EMAIL_MAX_ATTEMPTS attempts settles the email for good.
+    """
+    try:
+        entry = await db.email_eingang.find_one({"message_id": message_id}, {"versuche": 1})
+        if not entry:
+            # Failed before it was claimed (e.g. database unavailable)
+            return "fehlgeschlagen"
+        attempts = int(entry.get("versuche") or 0) + 1
+        status = "aufgegeben" if attempts >= EMAIL_MAX_ATTEMPTS else "fehlgeschlagen"
+        await db.email_eingang.update_one(
+            {"message_id": message_id},
+            {"$set": {"status": status, "versuche": attempts, "fehler": str(error)[:500], "fehler_am": to_iso(now())}}
+        )
+    except Exception as e:
+        logger.error(f"Recording the failure of email {message_id} failed: {e}")
+        return "fehlgeschlagen"
+    if status == "aufgegeben":
+        logger.error(f"Email {message_id} given up after {attempts} failed attempts, left unread in the mailbox")
+    return status
+
+
+async def process_incoming_email(email: dict) -> str:
+    """Route one incoming email to a client (or the general inbox), at most once.
+
+    Returns the ledger status: "verarbeitet" once the email is processed
+    (now or earlier), "aufgegeben" if it was given up, "in_bearbeitung" if
+    another worker holds the claim. Every row written carries the Graph
+    message_id, so a run taking over a crashed claim skips what is done.
+    """
+    message_id = email["id"]
+    claimed = await claim_incoming_email(message_id)
+    if claimed != "claimed":
+        return claimed
+
+    subject = email.get("subject", "")
+    body_text = email.get("body", "")
+    from_email = email.get("from_email", "")
+    from_name = email.get("from_name", "")
+
+    klient_id = None
+    komm_id = generate_id()
 
-            if is_inquiry:
+    # Route 1: Subject contains [DV-{id}] tag → reply to existing client
+    tag_match = DV_TAG_PATTERN.search(subject)
+    if tag_match:
+        klient_id = await routing_index.by_id_prefix(tag_match.group(1))
+
+    # Route 2: Sender email matches a client's contact email
+    if not klient_id and from_email:
+        klient_id = await routing_index.by_email(from_email)
+
+    # Route 3: Keywords suggest a new inquiry
+    if not klient_id and any(kw in subject.lower() for kw in INQUIRY_KEYWORDS):
+        # Emails are processed concurrently, by several workers and replicas:
+        # serialise creation per sender so two mails from the same sender
+        # don't create two klienten. The routing index may not have seen a
+        # klient created a moment ago - ask the table.
+        async with db.advisory_lock(f"inquiry:{normalize_email(from_email) or ''}"):
+            if from_email:
+                klient_id = await routing_index.find_by_email(from_email)
+            if not klient_id:
                 # Create new client from email
                 new_klient_id = generate_id()
                 klient_data = {
                     "id": new_klient_id,
                     "vorname": from_name.split()[0] if from_name else "Unbekannt",
                     "nachname": " ".join(from_name.split()[1:]) if from_name and len(from_name.split()) > 1 else from_email.split("@")[0],
-                    "kontakt_email": from_email,
+                    "kontakt_email": normalize_email(from_email) or from_email,
                     "kontakt_name": from_name or from_email,
                     "status": "neu",
                     "anfrage_quelle": "email",
@@ -143,48 +337,62 @@ async def process_incoming_emails():
                     "updated_at": to_iso(now()),
                 }
                 await db.klienten.insert_one(klient_data)
-                klient = klient_data
+                klient_id = new_klient_id
                 logger.info(f"New klient created from email: {from_email} → {new_klient_id}")
 
-        if klient:
-            # Save as incoming email communication
-            komm = {
-                "id": komm_id,
-                "klient_id": klient["id"],
-                "typ": "email_ein",
-                "betreff": subject,
-                "inhalt": body_text,
-                "anhaenge": [],
-                "erstellt_am": to_iso(now()),
-                "erstellt_von_name": from_name or from_email,
-            }
-            await db.klient_kommunikation.insert_one(komm)
-
-            await db.klient_aktivitaeten.insert_one({
-                "id": generate_id(),
-                "klient_id": klient["id"],
-                "benutzer_name": from_name or from_email,
-                "aktion": f"E-Mail erhalten von {from_email}",
-                "timestamp": to_iso(now()),
-            })
-
-            # Generate AI summary in background
-            asyncio.create_task(generate_and_store_summary(komm_id, body_text))
-        else:
-            # Route 4: Unmatched → save to general email collection
-            await db.email_allgemein.insert_one({
-                "id": generate_id(),
-                "von_email": from_email,
-                "von_name": from_name,
-                "betreff": subject,
-                "inhalt": body_text,
-                "status": "unzugeordnet",
-                "erstellt_am": to_iso(now()),
-            })
-            logger.info(f"Unmatched email from {from_email}: {subject}")
-
-        # Mark as read in mailbox
-        await email_service.mark_as_read(message_id)
+    if klient_id:
+        if await db.klient_kommunikation.find_one({"message_id": message_id}, {"id": 1}):
+            await finish_incoming_email(message_id, klient_id=klient_id)
+            return "verarbeitet"
+
+        # Save as incoming email communication
+        komm = {
+            "id": komm_id,
+            "klient_id": klient_id,
+            "message_id": message_id,
+            "typ": "email_ein",
+            "betreff": subject,
+            "inhalt": body_text,
+            "anhaenge": [],
+            "erstellt_am": to_iso(now()),
+            "erstellt_von_name": from_name or from_email,
+        }
+        await db.klient_kommunikation.insert_one(komm)
+
+        await db.klient_aktivitaeten.insert_one({
+            "id": generate_id(),
+            "klient_id": klient_id,
+            "benutzer_name": from_name or from_email,
+            "aktion": f"E-Mail erhalten von {from_email}",
+            "timestamp": to_iso(now()),
+        })
+
+        # Generate AI summary in background
+        asyncio.create_task(generate_and_store_summary(komm_id, body_text))
+    elif not await db.email_allgemein.find_one({"message_id": message_id}, {"id": 1}):
+        # Route 4: Unmatched → save to general email collection
+        await db.email_allgemein.insert_one({
+            "id": generate_id(),
+            "message_id": message_id,
+            "von_email": from_email,
+            "von_name": from_name,
+            "betreff": subject,
+            "inhalt": body_text,
+            "status": "unzugeordnet",
+            "erstellt_am": to_iso(now()),
+        })
+        logger.info(f"Unmatched email from {from_email}: {subject}")
+
+    await finish_incoming_email(message_id, klient_id=klient_id)
+    return "verarbeitet"
+
+
+async def finish_incoming_email(message_id: str, klient_id: Optional[str]):
+    """Mark a claimed email as processed in the ledger."""
+    await db.email_eingang.update_one(
+        {"message_id": message_id},
+        {"$set": {"status": "verarbeitet", "klient_id": klient_id, "verarbeitet_am": to_iso(now())}}
+    )
 
 # App setup
 app = FastAPI(
@@ -252,6 +460,21 @@ async def health_check():
         logger.error(f"Health check failed: {e}")
         return {"status": "unhealthy", "database": str(e)}
 
+# Prometheus cannot sign in with Entra ID: it sends this token as bearer instead
+METRICS_SCRAPE_TOKEN = os.environ.get("METRICS_SCRAPE_TOKEN", "")
+
+async def require_metrics_access(request: Request):
+    """Allow a scrape with METRICS_SCRAPE_TOKEN, otherwise require a signed-in user."""
+    auth_header = request.headers.get("authorization", "")
+    if METRICS_SCRAPE_TOKEN and hmac.compare_digest(auth_header, f"Bearer {METRICS_SCRAPE_TOKEN}"):
+        return
+    await get_current_user(await security(request))
+
+@api_router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    """Process metrics in Prometheus text format (per worker)"""
+    return metrics.render()
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.get("/auth/config")
@@ -397,6 +620,7 @@ async def update_property(property_id: str, data: PropertyUpdate, current_user:
     update_data["updated_at"] = to_iso(now())
     result = await db.properties.update_one({"id": property_id}, {"$set": update_data})
     if result.matched_count == 0: raise HTTPException(404, "Immobilie nicht gefunden")
+    await ticket_cards.refresh_property(property_id)
     return await get_property(property_id)
 
 @api_router.delete("/properties/{property_id}")
@@ -406,7 +630,8 @@ async def delete_property(property_id: str, current_user: Dict = Depends(get_cur
     await db.units.delete_many({"property_id": property_id})
     await db.contracts.delete_many({"property_id": property_id})
     await db.maintenance_tickets.delete_many({"property_id": property_id})
-    await db.documents.delete_many({"property_id": property_id})
+    await delete_with_blobs("documents", {"property_id": property_id})
+    await ticket_cards.refresh_property(property_id)
     return {"message": "Immobilie gelöscht", "id": property_id}
 
 # ==================== UNITS ROUTES ====================
@@ -419,6 +644,7 @@ async def create_unit(data: UnitCreate, current_user: Dict = Depends(get_current
     doc = {"id": generate_id(), **data.model_dump(), "created_at": to_iso(now())}
     await db.units.insert_one(doc)
     await db.properties.update_one({"id": data.property_id}, {"$inc": {"units_count": 1}})
+    await ticket_cards.refresh_property(data.property_id)
     
     doc["created_at"] = from_iso(doc["created_at"])
     if doc.get("tenant_id"):
@@ -439,9 +665,11 @@ async def get_units(property_id: Optional[str] = None, current_user: Dict = Depe
 
 @api_router.put("/units/{unit_id}")
 async def update_unit(unit_id: str, is_vacant: bool, tenant_id: Optional[str] = None, current_user: Dict = Depends(get_current_user)):
+    unit = await db.units.find_one({"id": unit_id})
+    if not unit: raise HTTPException(404, "Einheit nicht gefunden")
     update = {"is_vacant": is_vacant, "tenant_id": tenant_id}
-    result = await db.units.update_one({"id": unit_id}, {"$set": update})
-    if result.matched_count == 0: raise HTTPException(404, "Einheit nicht gefunden")
+    await db.units.update_one({"id": unit_id}, {"$set": update})
+    await ticket_cards.refresh_property(unit["property_id"])
     return {"message": "Einheit aktualisiert"}
 
 @api_router.delete("/units/{unit_id}")
@@ -450,6 +678,7 @@ async def delete_unit(unit_id: str, current_user: Dict = Depends(get_current_use
     if not unit: raise HTTPException(404, "Einheit nicht gefunden")
     await db.units.delete_one({"id": unit_id})
     await db.properties.update_one({"id": unit["property_id"]}, {"$inc": {"units_count": -1}})
+    await ticket_cards.refresh_property(unit["property_id"])
     return {"message": "Einheit gelöscht"}
 
 # ==================== CONTACTS ROUTES ====================
@@ -497,12 +726,14 @@ async def update_contact(contact_id: str, data: ContactUpdate, current_user: Dic
     update_data["updated_at"] = to_iso(now())
     result = await db.contacts.update_one({"id": contact_id}, {"$set": update_data})
     if result.matched_count == 0: raise HTTPException(404, "Kontakt nicht gefunden")
+    await ticket_cards.refresh_contact(contact_id)
     return await get_contact(contact_id)
 
 @api_router.delete("/contacts/{contact_id}")
 async def delete_contact(contact_id: str, current_user: Dict = Depends(get_current_user)):
     result = await db.contacts.delete_one({"id": contact_id})
     if result.deleted_count == 0: raise HTTPException(404, "Kontakt nicht gefunden")
+    await ticket_cards.refresh_contact(contact_id)
     return {"message": "Kontakt gelöscht", "id": contact_id}
 
 # ==================== CONTRACTS ROUTES ====================
@@ -637,6 +868,7 @@ async def create_maintenance_ticket(data: MaintenanceTicketCreate, current_user:
         "updated_at": to_iso(now())
     }
     await db.maintenance_tickets.insert_one(doc)
+    await ticket_cards.refresh(doc["id"])
     
     doc["scheduled_date"] = from_iso(doc["scheduled_date"])
     doc["created_at"] = from_iso(doc["created_at"])
@@ -724,6 +956,7 @@ async def update_maintenance_ticket(ticket_id: str, data: MaintenanceTicketUpdat
     
     result = await db.maintenance_tickets.update_one({"id": ticket_id}, {"$set": update_data})
     if result.matched_count == 0: raise HTTPException(404, "Ticket nicht gefunden")
+    await ticket_cards.refresh(ticket_id)
     return await get_maintenance_ticket(ticket_id)
 
 @api_router.put("/maintenance/{ticket_id}/status")
@@ -733,12 +966,14 @@ async def update_ticket_status(ticket_id: str, status: str, current_user: Dict =
         update["completed_date"] = to_iso(now())
     result = await db.maintenance_tickets.update_one({"id": ticket_id}, {"$set": update})
     if result.matched_count == 0: raise HTTPException(404, "Ticket nicht gefunden")
+    await ticket_cards.refresh(ticket_id)
     return {"message": "Status aktualisiert", "status": status}
 
 @api_router.delete("/maintenance/{ticket_id}")
 async def delete_maintenance_ticket(ticket_id: str, current_user: Dict = Depends(get_current_user)):
     result = await db.maintenance_tickets.delete_one({"id": ticket_id})
     if result.deleted_count == 0: raise HTTPException(404, "Ticket nicht gefunden")
+    await ticket_cards.refresh(ticket_id)
     return {"message": "Ticket gelöscht", "id": ticket_id}
 
 # ==================== DOCUMENTS ROUTES ====================
@@ -785,11 +1020,85 @@ async def get_document(document_id: str, current_user: Dict = Depends(get_curren
 
 @api_router.delete("/documents/{document_id}")
 async def delete_document(document_id: str, current_user: Dict = Depends(get_current_user)):
-    result = await db.documents.delete_one({"id": document_id})
-    if result.deleted_count == 0: raise HTTPException(404, "Dokument nicht gefunden")
+    deleted = await delete_with_blobs("documents", {"id": document_id})
+    if deleted == 0: raise HTTPException(404, "Dokument nicht gefunden")
     return {"message": "Dokument gelöscht", "id": document_id}
 
-# Azure Blob Storage Upload (if configured)
+# Collections whose documents reference blob store keys (blob_key)
+BLOB_REFERENCES = ("documents", "klient_dokumente")
+
+def blob_lock(key: str) -> str:
+    """Advisory lock name serialising writes and releases of one blob."""
+    return f"blob:{key}"
+
+async def insert_blob_document(collection: str, doc: dict, put):
+    """Store a document's content (await put()) and insert the document referencing it.
+
+    Runs under the blob's advisory lock, so release_blob cannot delete the
+    content between storing it and inserting the reference.
+    """
+    async with db.advisory_lock(blob_lock(doc["blob_key"])):
+        await put()
+        await getattr(db, collection).insert_one(doc)
+
+async def release_blob(key: str):
+    """Delete a blob once no document references it any more (blobs are shared by content)."""
+    async with db.advisory_lock(blob_lock(key)):
+        for collection in BLOB_REFERENCES:
+            if await getattr(db, collection).count_documents({"blob_key": key}):
+                return
+        await blob_store.delete(key)
+    await thumbnails.delete(key)
+
+async def delete_with_blobs(collection: str, query: dict) -> int:
+    """delete_many on a document collection, releasing the referenced blobs."""
+    docs = await getattr(db, collection).find(query, {"id": 1, "blob_key": 1}).to_list(10000)
+    result = await getattr(db, collection).delete_many(query)
+    for key in {d["blob_key"] for d in docs if d.get("blob_key")}:
+        await release_blob(key)
+    # Legacy documents keep their thumbnails under the document id
+    for doc in docs:
+        if not doc.get("blob_key") and doc.get("id"):
+            await thumbnails.delete(doc["id"])
+    return result.deleted_count
+
+async def read_document_content(doc: dict) -> bytes:
+    """File content of a document from the blob store (or legacy base64 file_data)."""
+    if doc.get("blob_key"):
+        return await blob_store.get(doc["blob_key"])
+    if doc.get("file_data"):
+        return base64.b64decode(doc["file_data"])
+    raise BlobNotFound(doc.get("id"))
+
+async def klient_dokument_attachment(doc: dict) -> email_service.Attachment:
+    """Mail attachment for a klient document, streamed from the blob store (raises BlobNotFound)."""
+    name = doc.get("name", "dokument")
+    content_type = doc.get("file_type") or "application/octet-stream"
+    if doc.get("blob_key"):
+        key = doc["blob_key"]
+        size = await blob_store.size(key)
+        if size:
+            return email_service.Attachment(
+                name, size, content_type,
+                lambda chunk_size: blob_store.iter_range(key, 0, size - 1, chunk_size),
+            )
+        return email_service.Attachment.from_bytes(name, b"", content_type)
+    # Legacy document with base64 content in the row
+    legacy = await db.klient_dokumente.find_one({"id": doc["id"]}, {"id": 1, "file_data": 1})
+    return email_service.Attachment.from_bytes(name, await read_document_content(legacy or doc), content_type)
+
+def is_pdf_document(doc: dict) -> bool:
+    return doc.get("file_type") == "application/pdf" or (doc.get("name") or "").lower().endswith(".pdf")
+
+def thumbnail_source(doc: dict) -> str:
+    """Thumbnail store prefix: the content hash, or the id for legacy base64 documents."""
+    return doc.get("blob_key") or doc["id"]
+
+def schedule_thumbnail(doc: dict):
+    """Render the first-page thumbnail of a newly stored PDF in the background."""
+    if doc.get("blob_key") and is_pdf_document(doc):
+        thumbnails.schedule(doc["blob_key"], lambda: blob_store.get(doc["blob_key"]))
+
 @api_router.post("/documents/upload")
 async def upload_document(
     property_id: str,
@@ -800,30 +1109,45 @@ async def upload_document(
     prop = await db.properties.find_one({"id": property_id})
     if not prop: raise HTTPException(404, "Immobilie nicht gefunden")
     
-    # For now, return mock URL (Azure Blob would be integrated here)
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    # Mock URL - in production this would be Azure Blob Storage URL
-    mock_url = f"https://domusvitastorage.blob.core.windows.net/documents/{property_id}/{file.filename}"
-    
-    doc = {
-        "id": generate_id(),
-        "property_id": property_id,
-        "name": file.filename,
-        "category": category,
-        "file_url": mock_url,
-        "file_size": file_size,
-        "file_type": file.content_type,
-        "uploaded_by": "system",
-        "created_at": to_iso(now())
-    }
-    await db.documents.insert_one(doc)
+    with await receive_upload(file, "document") as upload:
+        doc_id = generate_id()
+        doc = {
+            "id": doc_id,
+            "property_id": property_id,
+            "name": file.filename,
+            "category": category,
+            "file_url": f"/api/documents/{doc_id}/download",
+            "blob_key": upload.sha256,
+            "file_size": upload.size,
+            "file_type": file.content_type,
+            "uploaded_by": "system",
+            "created_at": to_iso(now())
+        }
+        await insert_blob_document(
+            "documents", doc,
+            lambda: blob_store.put_file(upload.file, upload.sha256, upload.content_type),
+        )
     
     doc["created_at"] = from_iso(doc["created_at"])
     doc["property_name"] = prop.get("name")
     return doc
 
+@api_router.get("/documents/{document_id}/download")
+async def download_document(document_id: str, request: Request, current_user: Dict = Depends(get_current_user)):
+    """Download an uploaded property document (streamed, Range/conditional GET)"""
+    doc = await db.documents.find_one({"id": document_id})
+    if not doc or not doc.get("blob_key"):
+        raise HTTPException(404, "Dokument nicht gefunden")
+    try:
+        return await blob_download(
+            request, blob_store, doc["blob_key"],
+            content_type=doc.get("file_type") or "application/octet-stream",
+            filename=doc["name"],
+            last_modified=from_iso(doc.get("created_at")),
+        )
+    except BlobNotFound:
+        raise HTTPException(404, "Dateiinhalt nicht gefunden")
+
 # ==================== AI ASSISTANT ====================
 
 @api_router.post("/ai/query", response_model=AIQueryResponse)
@@ -878,6 +1202,9 @@ async def verify_handwerker_token(token: str):
 
     return {"valid": True, "handwerker_id": session["handwerker_id"], "name": session["name"]}
 
+# Thumbnails per ticket in the Handwerker ticket list
+PHOTO_PREVIEW_LIMIT = 3
+
 @api_router.get("/handwerker/tickets/{handwerker_id}", response_model=List[HandwerkerTicketResponse])
 async def get_handwerker_tickets(handwerker_id: str, status: Optional[str] = None):
     """Get all tickets assigned to a specific handwerker"""
@@ -885,119 +1212,39 @@ async def get_handwerker_tickets(handwerker_id: str, status: Optional[str] = Non
     if status:
         query["status"] = status
     
-    tickets = await db.maintenance_tickets.find(query, {"_id": 0}).to_list(100)
-    results = []
-    
-    for ticket in tickets:
-        # Get property info
-        prop = await db.properties.find_one({"id": ticket.get("property_id")}, {"_id": 0})
-        
-        # Get photos for this ticket
-        photos = await db.ticket_photos.find({"ticket_id": ticket["id"]}, {"_id": 0}).to_list(100)
-        for photo in photos:
-            photo["uploaded_at"] = from_iso(photo.get("uploaded_at"))
-        
-        # Get status updates
-        status_updates = await db.status_updates.find({"ticket_id": ticket["id"]}, {"_id": 0}).sort("timestamp", -1).to_list(50)
-        for update in status_updates:
-            update["timestamp"] = from_iso(update.get("timestamp"))
-        
-        # Get work report
-        work_report = await db.work_reports.find_one({"ticket_id": ticket["id"]}, {"_id": 0})
-        if work_report:
-            work_report["created_at"] = from_iso(work_report.get("created_at"))
-            work_report["total_cost"] = (work_report.get("material_cost", 0) or 0) + (work_report.get("labor_cost", 0) or 0)
-        
-        # Get tenant info if available
-        tenant_name = None
-        tenant_phone = None
-        if prop:
-            # Find tenant for this property
-            unit = await db.units.find_one({"property_id": prop["id"], "is_vacant": False})
-            if unit and unit.get("tenant_id"):
-                tenant = await db.contacts.find_one({"id": unit["tenant_id"]})
-                if tenant:
-                    tenant_name = tenant.get("name")
-                    tenant_phone = tenant.get("phone")
-        
-        results.append({
-            "id": ticket["id"],
-            "property_id": ticket.get("property_id"),
-            "property_name": prop.get("name") if prop else "Unbekannt",
-            "property_address": f"{prop.get('address', '')}, {prop.get('postal_code', '')} {prop.get('city', '')}" if prop else "",
-            "property_city": prop.get("city", "") if prop else "",
-            "title": ticket.get("title"),
-            "description": ticket.get("description"),
-            "status": ticket.get("status", "Offen"),
-            "priority": ticket.get("priority", "Normal"),
-            "category": ticket.get("category"),
-            "scheduled_date": from_iso(ticket.get("scheduled_date")),
-            "tenant_name": tenant_name,
-            "tenant_phone": tenant_phone,
-            "photos": photos,
-            "status_updates": status_updates,
-            "work_report": work_report,
-            "created_at": from_iso(ticket.get("created_at"))
-        })
-    
-    return results
+    # Cards are kept up to date by the write endpoints and change notifications (see ticket_cards.py)
+    cards = await db.handwerker_ticket_cards.find(query, {"_id": 0}).to_list(100)
+    for card in cards:
+        # List view only shows a few thumbnails; photo_count has the total
+        card["photos"] = card.get("photos", [])[:PHOTO_PREVIEW_LIMIT]
+    return cards
 
 @api_router.get("/handwerker/ticket/{ticket_id}", response_model=HandwerkerTicketResponse)
 async def get_handwerker_ticket_detail(ticket_id: str):
     """Get detailed ticket information for handwerker view"""
-    ticket = await db.maintenance_tickets.find_one({"id": ticket_id}, {"_id": 0})
-    if not ticket:
+    card = await db.handwerker_ticket_cards.find_one({"id": ticket_id}, {"_id": 0})
+    if not card:
+        # Ticket written outside the API - build its card on demand
+        card = await ticket_cards.refresh(ticket_id)
+    if not card:
         raise HTTPException(404, "Ticket nicht gefunden")
-    
-    # Get property info
-    prop = await db.properties.find_one({"id": ticket.get("property_id")}, {"_id": 0})
-    
-    # Get photos
-    photos = await db.ticket_photos.find({"ticket_id": ticket_id}, {"_id": 0}).to_list(100)
-    for photo in photos:
-        photo["uploaded_at"] = from_iso(photo.get("uploaded_at"))
-    
-    # Get status updates
-    status_updates = await db.status_updates.find({"ticket_id": ticket_id}, {"_id": 0}).sort("timestamp", -1).to_list(50)
-    for update in status_updates:
-        update["timestamp"] = from_iso(update.get("timestamp"))
-    
-    # Get work report
-    work_report = await db.work_reports.find_one({"ticket_id": ticket_id}, {"_id": 0})
-    if work_report:
-        work_report["created_at"] = from_iso(work_report.get("created_at"))
-        work_report["total_cost"] = (work_report.get("material_cost", 0) or 0) + (work_report.get("labor_cost", 0) or 0)
-    
-    # Get tenant info
-    tenant_name = None
-    tenant_phone = None
-    if prop:
-        unit = await db.units.find_one({"property_id": prop["id"], "is_vacant": False})
-        if unit and unit.get("tenant_id"):
-            tenant = await db.contacts.find_one({"id": unit["tenant_id"]})
-            if tenant:
-                tenant_name = tenant.get("name")
-                tenant_phone = tenant.get("phone")
-    
-    return {
-        "id": ticket["id"],
-        "property_id": ticket.get("property_id"),
-        "property_name": prop.get("name") if prop else "Unbekannt",
-        "property_address": f"{prop.get('address', '')}, {prop.get('postal_code', '')} {prop.get('city', '')}" if prop else "",
-        "property_city": prop.get("city", "") if prop else "",
-        "title": ticket.get("title"),
-        "description": ticket.get("description"),
-        "status": ticket.get("status", "Offen"),
-        "priority": ticket.get("priority", "Normal"),
-        "category": ticket.get("category"),
-        "scheduled_date": from_iso(ticket.get("scheduled_date")),
-        "tenant_name": tenant_name,
-        "tenant_phone": tenant_phone,
-        "photos": photos,
-        "status_updates": status_updates,
-        "work_report": work_report,
-        "created_at": from_iso(ticket.get("created_at"))
-    }
+    return card
+
+async def store_photo_variants(photo_id: str, content) -> dict:
+    """Render all size/format variants of a photo (bytes or file path) into the photo store.
+    
+    Returns {variant: {"width": .., "height": ..}} for the photo document.
+    """
+    rendered = await image_pool.run(render_variants, content)
+    store = db.binary("photo_blobs")
+    variants = {}
+    for variant, outputs in rendered.items():
+        width, height = outputs["size"]
+        variants[variant] = {"width": width, "height": height}
+        for fmt in FORMATS:
+            data, content_type = outputs[fmt]
+            await store.put(blob_key(photo_id, variant, fmt), data, content_type)
+    return variants
 
 @api_router.post("/handwerker/ticket/{ticket_id}/photo", response_model=TicketPhotoResponse)
 async def upload_ticket_photo(
@@ -1013,74 +1260,187 @@ async def upload_ticket_photo(
     if not ticket:
         raise HTTPException(404, "Ticket nicht gefunden")
     
-    # Read and compress image
-    content = await file.read()
+    # The worker process reads the upload from a temp file, not from a pickled copy
+    with await receive_upload(file, "photo", to_disk=True) as upload:
+        return await save_ticket_photo(ticket_id, upload.path, category, description, handwerker_id)
+
+async def save_ticket_photo(ticket_id: str, path: str, category: str, description: Optional[str], handwerker_id: Optional[str]) -> dict:
+    """Process an uploaded image file and create its ticket_photos record"""
+    photo_id = generate_id()
     
+    # Image bytes live in the photo_blobs table, the document only holds metadata
     try:
-        # Compress image for mobile optimization
-        img = Image.open(io.BytesIO(content))
-        
-        # Convert to RGB if necessary
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-        
-        # Resize if too large (max 1920px width)
-        max_width = 1920
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_size = (max_width, int(img.height * ratio))
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-        
-        # Save compressed
-        output = io.BytesIO()
-        img.save(output, format='JPEG', quality=80, optimize=True)
-        compressed_content = output.getvalue()
-        
-        # Create thumbnail
-        thumb_size = (200, 200)
-        img.thumbnail(thumb_size, Image.Resampling.LANCZOS)
-        thumb_output = io.BytesIO()
-        img.save(thumb_output, format='JPEG', quality=70)
-        thumb_content = thumb_output.getvalue()
-        
+        variants = await store_photo_variants(photo_id, path)
+    except WorkerPoolBusy:
+        raise HTTPException(503, "Bildverarbeitung ausgelastet, bitte erneut versuchen", headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"Image processing error: {e}")
-        compressed_content = content
-        thumb_content = content
-    
-    # Generate unique filename
-    photo_id = generate_id()
-    filename = f"{ticket_id}/{photo_id}.jpg"
-    thumb_filename = f"{ticket_id}/{photo_id}_thumb.jpg"
-    
-    # For now, store as base64 in MongoDB (in production use Azure Blob Storage)
-    photo_url = f"data:image/jpeg;base64,{base64.b64encode(compressed_content).decode()}"
-    thumbnail_url = f"data:image/jpeg;base64,{base64.b64encode(thumb_content).decode()}"
+        raise HTTPException(400, "Bild konnte nicht verarbeitet werden")
     
     # Save photo record
     photo_doc = {
         "id": photo_id,
         "ticket_id": ticket_id,
         "category": category,
-        "photo_url": photo_url,
-        "thumbnail_url": thumbnail_url,
+        "variants": variants,
         "description": description,
         "uploaded_by": handwerker_id or "system",
         "uploaded_at": to_iso(now())
     }
     await db.ticket_photos.insert_one(photo_doc)
+    await ticket_cards.refresh(ticket_id)
     
     photo_doc["uploaded_at"] = from_iso(photo_doc["uploaded_at"])
-    return photo_doc
+    return photo_refs(photo_doc)
+
+# Resumable photo uploads (see upload_sessions.py)
+
+@api_router.post("/handwerker/ticket/{ticket_id}/photo-uploads")
+async def create_photo_upload(ticket_id: str, data: PhotoUploadSessionCreate):
+    """Start a resumable photo upload; returns upload_id and chunk_size"""
+    ticket = await db.maintenance_tickets.find_one({"id": ticket_id}, {"id": 1})
+    if not ticket:
+        raise HTTPException(404, "Ticket nicht gefunden")
+    if data.total_size > UPLOAD_LIMITS["photo"]:
+        raise HTTPException(413, f"Datei zu groß (max. {UPLOAD_LIMITS['photo'] // (1024 * 1024)} MB)")
+    
+    session = await upload_sessions.create(
+        id=generate_id(), ticket_id=ticket_id, **data.model_dump()
+    )
+    return await upload_sessions.progress(session)
+
+@api_router.put("/handwerker/photo-uploads/{upload_id}/chunks/{index}")
+async def put_photo_upload_chunk(upload_id: str, index: int, request: Request):
+    """Upload chunk number index (raw request body); repeating a chunk is harmless"""
+    session = await upload_sessions.get(upload_id)
+    if not session:
+        raise HTTPException(404, "Upload nicht gefunden oder abgelaufen")
+    if session["status"] != UPLOAD_OFFEN:
+        raise HTTPException(409, "Upload ist bereits abgeschlossen")
+    if not 0 <= index < session["total_chunks"]:
+        raise HTTPException(400, f"Ungültige Chunk-Nummer {index}")
+    
+    expected = expected_chunk_size(session, index)
+    data = bytearray()
+    async for part in request.stream():
+        data.extend(part)
+        if len(data) > expected:
+            raise HTTPException(413, f"Chunk {index} zu groß (erwartet {expected} Bytes)")
+    if len(data) != expected:
+        raise HTTPException(400, f"Chunk {index} unvollständig ({len(data)} von {expected} Bytes)")
+    
+    await upload_sessions.put_chunk(session, index, bytes(data))
+    return {"upload_id": upload_id, "index": index, "size": len(data)}
+
+@api_router.get("/handwerker/photo-uploads/{upload_id}")
+async def get_photo_upload(upload_id: str):
+    """Upload progress: received/missing chunks and resumable offset"""
+    session = await upload_sessions.get(upload_id)
+    if not session:
+        raise HTTPException(404, "Upload nicht gefunden oder abgelaufen")
+    return await upload_sessions.progress(session)
+
+@api_router.post("/handwerker/photo-uploads/{upload_id}/complete", response_model=TicketPhotoResponse)
+async def complete_photo_upload(upload_id: str):
+    """Assemble all chunks and process them like a regular photo upload"""
+    session = await upload_sessions.get(upload_id)
+    if not session:
+        raise HTTPException(404, "Upload nicht gefunden oder abgelaufen")
+    
+    # Completing twice (e.g. retry after a lost response) returns the same photo
+    if session["status"] == UPLOAD_ABGESCHLOSSEN:
+        photo = await db.ticket_photos.find_one({"id": session["photo_id"]}, {"_id": 0, "photo_url": 0, "thumbnail_url": 0})
+        if not photo:
+            raise HTTPException(404, "Foto nicht gefunden")
+        photo["uploaded_at"] = from_iso(photo.get("uploaded_at"))
+        return photo_refs(photo)
+    
+    progress = await upload_sessions.progress(session)
+    if progress["missing_chunks"]:
+        raise HTTPException(409, f"Fehlende Chunks: {progress['missing_chunks']}")
+    if not await upload_sessions.claim(session):
+        raise HTTPException(409, "Upload wird bereits verarbeitet")
+    
+    path = None
+    try:
+        path = await upload_sessions.assemble(session)
+        photo = await save_ticket_photo(
+            session["ticket_id"], path, session["category"], session.get("description"), session.get("handwerker_id")
+        )
+    except ValueError as e:
+        await upload_sessions.release(session)
+        raise HTTPException(400, f"Upload fehlerhaft: {e}")
+    except BaseException:
+        await upload_sessions.release(session)
+        raise
+    finally:
+        if path:
+            os.unlink(path)
+    
+    await upload_sessions.finish(session, photo["id"])
+    return photo
+
+@api_router.delete("/handwerker/photo-uploads/{upload_id}")
+async def cancel_photo_upload(upload_id: str):
+    """Abort an upload and drop its chunks"""
+    session = await upload_sessions.get(upload_id)
+    if not session:
+        raise HTTPException(404, "Upload nicht gefunden oder abgelaufen")
+    await upload_sessions.discard(session)
+    return {"message": "Upload abgebrochen"}
 
 @api_router.delete("/handwerker/photo/{photo_id}")
 async def delete_ticket_photo(photo_id: str):
     """Delete a ticket photo"""
-    result = await db.ticket_photos.delete_one({"id": photo_id})
-    if result.deleted_count == 0:
+    photo = await db.ticket_photos.find_one({"id": photo_id}, {"ticket_id": 1})
+    if not photo:
         raise HTTPException(404, "Foto nicht gefunden")
+    await db.ticket_photos.delete_one({"id": photo_id})
+    await db.binary("photo_blobs").delete_prefix(f"{photo_id}/")
+    await ticket_cards.refresh(photo["ticket_id"])
     return {"message": "Foto gelöscht"}
 
+@api_router.get("/photos/{photo_id}/{variant}")
+async def get_photo(photo_id: str, variant: str, request: Request):
+    """Serve a ticket photo variant (thumb, medium, full) as WebP or JPEG"""
+    if variant not in VARIANTS:
+        raise HTTPException(404, "Fotovariante nicht gefunden")
+    
+    fmt = preferred_format(request.headers.get("accept"))
+    key = blob_key(photo_id, variant, fmt)
+    store = db.binary("photo_blobs")
+    
+    meta = await store.head(key)
+    if not meta:
+        # Photo uploaded before the photo store existed - convert it once
+        legacy = await db.ticket_photos.find_one({"id": photo_id}, {"photo_url": 1})
+        if not legacy or not (legacy.get("photo_url") or "").startswith("data:"):
+            raise HTTPException(404, "Foto nicht gefunden")
+        content = base64.b64decode(legacy["photo_url"].partition(",")[2])
+        try:
+            variants = await store_photo_variants(photo_id, content)
+        except WorkerPoolBusy:
+            raise HTTPException(503, "Bildverarbeitung ausgelastet, bitte erneut versuchen", headers={"Retry-After": "5"})
+        await db.ticket_photos.update_one(
+            {"id": photo_id},
+            {"$set": {"variants": variants, "photo_url": None, "thumbnail_url": None}}
+        )
+        meta = await store.head(key)
+    
+    # Variants are immutable: the content hash is a strong ETag and clients may cache forever.
+    # Photos show tenants' homes, so only the browser may keep them, never shared caches.
+    etag = f'"{meta["etag"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Vary": "Accept",
+    }
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    blob = await store.get(key)
+    return Response(content=blob["data"], media_type=blob["content_type"], headers=headers)
+
 @api_router.post("/handwerker/ticket/{ticket_id}/status", response_model=StatusUpdateResponse)
 async def update_ticket_status_handwerker(
     ticket_id: str,
@@ -1127,6 +1487,7 @@ async def update_ticket_status_handwerker(
         "updated_by": ticket.get("assigned_to_id", "system")
     }
     await db.status_updates.insert_one(status_update)
+    await ticket_cards.refresh(ticket_id)
     
     # TODO: Send notification to property manager/tenant
     # This would integrate with email/SMS service
@@ -1180,6 +1541,7 @@ async def create_work_report(ticket_id: str, data: WorkReportCreate):
         {"id": ticket_id},
         {"$set": {"cost": total_cost, "updated_at": to_iso(now())}}
     )
+    await ticket_cards.refresh(ticket_id)
     
     report_doc["created_at"] = from_iso(report_doc["created_at"])
     return report_doc
@@ -1207,20 +1569,13 @@ async def get_handwerker_status_options():
 
 pdf_generator = EinzugspaketGenerator()
 
-@api_router.get("/einzugspaket/sections")
-async def get_einzugspaket_sections(current_user: Dict = Depends(get_current_user)):
-    """Get available document sections for Einzugspaket"""
-    return [{"key": k, "label": SECTION_LABELS.get(k, k)} for k in DOCUMENT_SECTIONS]
-
-@api_router.post("/einzugspaket/generate")
-async def generate_einzugspaket(data: EinzugspaketRequest, current_user: Dict = Depends(get_current_user)):
-    """Generate Einzugspaket PDF for a client"""
-    # Load data
+async def load_einzugspaket_params(data, sections: list = None) -> dict:
+    """Generator arguments for an Einzugspaket request (404 if anything is missing)."""
     klient = await db.klienten.find_one({"id": data.klient_id})
     if not klient:
         raise HTTPException(status_code=404, detail="Klient nicht gefunden")
 
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == data.wg_id), None)
+    wg = await wg_registry.get(data.wg_id)
     if not wg:
         raise HTTPException(status_code=404, detail="WG nicht gefunden")
 
@@ -1228,141 +1583,289 @@ async def generate_einzugspaket(data: EinzugspaketRequest, current_user: Dict =
     if not zimmer:
         raise HTTPException(status_code=404, detail="Zimmer nicht gefunden")
 
-    stammdaten = await db.wg_stammdaten.find_one({"wg_id": data.wg_id}, {"_id": 0})
-    if not stammdaten:
-        stammdaten = WG_STAMMDATEN_DEFAULTS.get(data.wg_id, {})
-
-    # Generate PDF
-    pdf_bytes = pdf_generator.generate(
-        klient=klient,
-        wg=wg,
-        zimmer=zimmer,
-        stammdaten=stammdaten,
-        mietbeginn=data.mietbeginn,
-        sections=data.dokumente,
-    )
+    stammdaten = await wg_registry.stammdaten(data.wg_id)
+    return {
+        "klient": klient, "wg": wg, "zimmer": zimmer, "stammdaten": stammdaten,
+        "mietbeginn": data.mietbeginn, "sections": sections,
+    }
 
-    filename = f"Einzugspaket_{klient.get('nachname')}_{klient.get('vorname')}_{wg.get('kurzname')}.pdf"
+def einzugspaket_filename(params: dict) -> str:
+    klient, wg = params["klient"], params["wg"]
+    return f"Einzugspaket_{klient.get('nachname')}_{klient.get('vorname')}_{wg.get('kurzname')}.pdf"
+
+async def render_einzugspaket_pdf(params: dict) -> bytes:
+    """Cached or freshly rendered PDF (503 if the worker pool is busy, 504 on timeout)."""
+    try:
+        return await pdf_jobs.render(params)
+    except WorkerPoolBusy:
+        raise HTTPException(503, "PDF-Erstellung ausgelastet, bitte erneut versuchen", headers={"Retry-After": "10"})
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "Zeitüberschreitung bei der PDF-Erstellung")
+    except PdfTooLarge as e:
+        raise HTTPException(413, f"Einzugspaket zu groß ({e.size // 1024} KB, max. {e.budget // 1024} KB)")
+
+def pdf_job_status(job: dict) -> dict:
+    status = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job.get("filename"),
+        "created_at": job.get("created_at"),
+        "finished_at": job.get("finished_at"),
+    }
+    if job["status"] == PDF_JOB_FERTIG:
+        status["file_size"] = job.get("file_size")
+        status["download_url"] = f"/api/einzugspaket/jobs/{job['id']}/download"
+    if job["status"] == PDF_JOB_FEHLER:
+        status["fehler"] = job.get("fehler")
+    return status
+
+async def submit_einzugspaket_job(data: EinzugspaketRequest, current_user: Dict) -> dict:
+    params = await load_einzugspaket_params(data, sections=data.dokumente)
+    try:
+        job = await pdf_jobs.submit(
+            params,
+            id=generate_id(),
+            klient_id=data.klient_id,
+            filename=einzugspaket_filename(params),
+            erstellt_von_name=current_user.get("name", "System"),
+        )
+    except WorkerPoolBusy:
+        raise HTTPException(503, "PDF-Erstellung ausgelastet, bitte erneut versuchen", headers={"Retry-After": "10"})
 
     # Log activity
     await db.klient_aktivitaeten.insert_one({
         "id": generate_id(),
         "klient_id": data.klient_id,
         "benutzer_name": current_user.get("name", "System"),
-        "aktion": f"Einzugspaket generiert ({wg.get('kurzname')}, Zimmer {zimmer.get('nummer')})",
+        "aktion": f"Einzugspaket generiert ({params['wg'].get('kurzname')}, Zimmer {params['zimmer'].get('nummer')})",
         "timestamp": to_iso(now())
     })
-
-    return StreamingResponse(
-        io.BytesIO(pdf_bytes),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
-
-@api_router.post("/einzugspaket/preview")
-async def preview_einzugspaket(data: EinzugspaketRequest, current_user: Dict = Depends(get_current_user)):
-    """Generate HTML preview of Einzugspaket"""
-    klient = await db.klienten.find_one({"id": data.klient_id})
-    if not klient:
-        raise HTTPException(status_code=404, detail="Klient nicht gefunden")
-
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == data.wg_id), None)
-    if not wg:
-        raise HTTPException(status_code=404, detail="WG nicht gefunden")
-
-    zimmer = await db.wg_zimmer.find_one({"id": data.zimmer_id})
-    if not zimmer:
-        raise HTTPException(status_code=404, detail="Zimmer nicht gefunden")
-
-    stammdaten = await db.wg_stammdaten.find_one({"wg_id": data.wg_id}, {"_id": 0})
-    if not stammdaten:
-        stammdaten = WG_STAMMDATEN_DEFAULTS.get(data.wg_id, {})
-
-    html = pdf_generator.generate_preview_html(
-        klient=klient,
-        wg=wg,
-        zimmer=zimmer,
-        stammdaten=stammdaten,
-        mietbeginn=data.mietbeginn,
-        sections=data.dokumente,
+    return job
+
+async def pdf_job_download(request: Request, job: dict):
+    if job["status"] == PDF_JOB_FEHLER:
+        raise HTTPException(status_code=500, detail=job.get("fehler") or "PDF konnte nicht erstellt werden")
+    if job["status"] != PDF_JOB_FERTIG:
+        raise HTTPException(status_code=409, detail="PDF wird noch erstellt")
+    pdf_bytes = await pdf_jobs.result(job["id"])
+    if pdf_bytes is None:
+        raise HTTPException(status_code=404, detail="PDF nicht mehr verfügbar")
+    return await bytes_download(
+        request, pdf_bytes, etag=f'"{job["etag"]}"',
+        content_type="application/pdf", filename=job["filename"],
     )
-    return HTMLResponse(content=html)
-
-@api_router.post("/einzugspaket/save")
-async def save_einzugspaket(data: EinzugspaketRequest, current_user: Dict = Depends(get_current_user)):
-    """Generate Einzugspaket PDF and save it as klient_dokument"""
-    klient = await db.klienten.find_one({"id": data.klient_id})
-    if not klient:
-        raise HTTPException(status_code=404, detail="Klient nicht gefunden")
-
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == data.wg_id), None)
-    if not wg:
-        raise HTTPException(status_code=404, detail="WG nicht gefunden")
 
-    zimmer = await db.wg_zimmer.find_one({"id": data.zimmer_id})
-    if not zimmer:
-        raise HTTPException(status_code=404, detail="Zimmer nicht gefunden")
+@api_router.get("/einzugspaket/sections")
+async def get_einzugspaket_sections(current_user: Dict = Depends(get_current_user)):
+    """Get available document sections for Einzugspaket"""
+    return [{"key": k, "label": SECTION_LABELS.get(k, k)} for k in DOCUMENT_SECTIONS]
 
-    stammdaten = await db.wg_stammdaten.find_one({"wg_id": data.wg_id}, {"_id": 0})
-    if not stammdaten:
-        stammdaten = WG_STAMMDATEN_DEFAULTS.get(data.wg_id, {})
+@api_router.post("/einzugspaket/jobs", status_code=202)
+async def create_einzugspaket_job(data: EinzugspaketRequest, current_user: Dict = Depends(get_current_user)):
+    """Start rendering an Einzugspaket PDF in the background"""
+    job = await submit_einzugspaket_job(data, current_user)
+    return pdf_job_status(job)
 
-    pdf_bytes = pdf_generator.generate(
-        klient=klient, wg=wg, zimmer=zimmer,
-        stammdaten=stammdaten, mietbeginn=data.mietbeginn,
-        sections=data.dokumente,
-    )
+@api_router.get("/einzugspaket/jobs/{job_id}")
+async def get_einzugspaket_job(
+    job_id: str,
+    wait: int = Query(0, ge=0, le=MAX_WAIT_SECONDS),
+    current_user: Dict = Depends(get_current_user)
+):
+    """Job status; with wait > 0 the request blocks until the job is done (long polling)"""
+    job = await pdf_jobs.wait(job_id, wait) if wait else await pdf_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Auftrag nicht gefunden")
+    return pdf_job_status(job)
+
+@api_router.get("/einzugspaket/jobs/{job_id}/download")
+async def download_einzugspaket_job(job_id: str, request: Request, current_user: Dict = Depends(get_current_user)):
+    """Download the PDF of a finished job"""
+    job = await pdf_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Auftrag nicht gefunden")
+    return await pdf_job_download(request, job)
 
-    filename = f"Einzugspaket_{klient.get('nachname')}_{klient.get('vorname')}_{wg.get('kurzname')}.pdf"
+@api_router.post("/einzugspaket/generate")
+async def generate_einzugspaket(data: EinzugspaketRequest, request: Request, current_user: Dict = Depends(get_current_user)):
+    """Generate Einzugspaket PDF for a client (waits for the render job)"""
+    job = await submit_einzugspaket_job(data, current_user)
+    job = await pdf_jobs.wait(job["id"], pdf_pool.timeout + 5)
+    if job is None or job["status"] not in (PDF_JOB_FERTIG, PDF_JOB_FEHLER):
+        raise HTTPException(status_code=504, detail="Zeitüberschreitung bei der PDF-Erstellung")
+    return await pdf_job_download(request, job)
 
+@api_router.post("/einzugspaket/preview")
+async def preview_einzugspaket(
+    data: EinzugspaketRequest,
+    request: Request,
+    section: Optional[str] = Query(None, description="Nur diesen Abschnitt als HTML-Fragment liefern"),
+    current_user: Dict = Depends(get_current_user)
+):
+    """Generate HTML preview of Einzugspaket (cached, ETag / If-None-Match)"""
+    if section is not None and section not in DOCUMENT_SECTIONS:
+        raise HTTPException(status_code=400, detail=f"Unbekannter Abschnitt: {section}")
+    params = await load_einzugspaket_params(data, sections=[section] if section else data.dokumente)
+    fragment = section is not None
+
+    key = pdf_generator.preview_key(**params, fragment=fragment)
+    etag = f'"{key}"'
+    # Depends on today's date and live data: revalidate every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    html = preview_cache.get(key)
+    if html is None:
+        html = pdf_generator.generate_preview_html(**params, fragment=fragment).encode()
+        preview_cache.put(key, html)
+    return Response(content=html, media_type="text/html; charset=utf-8", headers=headers)
+
+async def store_einzugspaket(params: dict, pdf_bytes: bytes, current_user: Dict) -> dict:
+    """Save a rendered Einzugspaket as klient_dokument and log the activity."""
+    klient_id, wg, zimmer = params["klient"]["id"], params["wg"], params["zimmer"]
     dok = {
         "id": generate_id(),
-        "klient_id": data.klient_id,
-        "name": filename,
+        "klient_id": klient_id,
+        "name": einzugspaket_filename(params),
         "kategorie": "einzugspaket",
-        "file_data": base64.b64encode(pdf_bytes).decode(),
+        "render_hash": render_key(**params),
+        "blob_key": content_key(pdf_bytes),
         "file_size": len(pdf_bytes),
         "file_type": "application/pdf",
         "status": "hochgeladen",
         "erstellt_am": to_iso(now()),
     }
-    await db.klient_dokumente.insert_one(dok)
+    await insert_blob_document("klient_dokumente", dok, lambda: blob_store.put(pdf_bytes, "application/pdf"))
+    schedule_thumbnail(dok)
 
     await db.klient_aktivitaeten.insert_one({
         "id": generate_id(),
-        "klient_id": data.klient_id,
+        "klient_id": klient_id,
         "benutzer_name": current_user.get("name", "System"),
         "aktion": f"Einzugspaket gespeichert ({wg.get('kurzname')}, Zimmer {zimmer.get('nummer')})",
         "timestamp": to_iso(now())
     })
+    return dok
 
-    return {"message": "Einzugspaket gespeichert", "dokument_id": dok["id"], "filename": filename}
-
-@api_router.post("/einzugspaket/send-email")
-async def send_einzugspaket_email(data: EinzugspaketEmailRequest, current_user: Dict = Depends(get_current_user)):
-    """Generate Einzugspaket PDF and send via email"""
-    klient = await db.klienten.find_one({"id": data.klient_id})
-    if not klient:
-        raise HTTPException(status_code=404, detail="Klient nicht gefunden")
+@api_router.post("/einzugspaket/save")
+async def save_einzugspaket(data: EinzugspaketRequest, current_user: Dict = Depends(get_current_user)):
+    """Generate Einzugspaket PDF and save it as klient_dokument"""
+    params = await load_einzugspaket_params(data, sections=data.dokumente)
+    pdf_bytes = await render_einzugspaket_pdf(params)
+    dok = await store_einzugspaket(params, pdf_bytes, current_user)
+    return {"message": "Einzugspaket gespeichert", "dokument_id": dok["id"], "filename": dok["name"]}
+
+# Upper bound for one batch (a WG has at most ~12 residents)
+EINZUGSPAKET_BATCH_LIMIT = 200
+
+async def einzugspaket_batch_items(data: EinzugspaketBatchRequest) -> tuple:
+    """Generator arguments per klient of a batch request, plus skipped klienten."""
+    if data.klient_ids:
+        klienten = await db.klienten.find({"id": {"$in": data.klient_ids}}).to_list(EINZUGSPAKET_BATCH_LIMIT + 1)
+    elif data.wg_id:
+        zimmer_list = await db.wg_zimmer.find(
+            {"pflege_wg_id": data.wg_id}, {"aktueller_bewohner_id": 1}
+        ).to_list(500)
+        bewohner_ids = [z["aktueller_bewohner_id"] for z in zimmer_list if z.get("aktueller_bewohner_id")]
+        klienten = await db.klienten.find({"id": {"$in": bewohner_ids}}).to_list(EINZUGSPAKET_BATCH_LIMIT + 1)
+    else:
+        raise HTTPException(status_code=400, detail="wg_id oder klient_ids erforderlich")
+    if len(klienten) > EINZUGSPAKET_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Maximal {EINZUGSPAKET_BATCH_LIMIT} Klienten pro Auftrag")
+
+    zimmer_ids = [k["zimmer_id"] for k in klienten if k.get("zimmer_id")]
+    zimmer_by_id = {z["id"]: z for z in await db.wg_zimmer.find({"id": {"$in": zimmer_ids}}).to_list(len(zimmer_ids) + 1)}
+    wgs, stammdaten = {}, {}
+    items, skipped = [], []
+    for klient in klienten:
+        name = f"{klient.get('vorname', '')} {klient.get('nachname', '')}".strip()
+        zimmer = zimmer_by_id.get(klient.get("zimmer_id"))
+        if not zimmer:
+            skipped.append({"klient_id": klient["id"], "name": name, "grund": "Kein Zimmer zugewiesen"})
+            continue
+        wg_id = zimmer.get("pflege_wg_id")
+        if wg_id not in wgs:
+            wgs[wg_id] = await wg_registry.get(wg_id)
+            stammdaten[wg_id] = await wg_registry.stammdaten(wg_id)
+        if not wgs[wg_id]:
+            skipped.append({"klient_id": klient["id"], "name": name, "grund": "WG nicht gefunden"})
+            continue
+        einzug = from_iso(klient.get("einzugsdatum")) if klient.get("einzugsdatum") else None
+        items.append({
+            "klient_id": klient["id"],
+            "name": name,
+            "params": {
+                "klient": klient, "wg": wgs[wg_id], "zimmer": zimmer, "stammdaten": stammdaten[wg_id],
+                "mietbeginn": data.mietbeginn or (einzug.strftime("%d.%m.%Y") if einzug else None),
+                "sections": data.dokumente,
+            },
+        })
+    return items, skipped
 
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == data.wg_id), None)
-    if not wg:
-        raise HTTPException(status_code=404, detail="WG nicht gefunden")
+def einzugspaket_batch_status(batch: dict) -> dict:
+    return {
+        "batch_id": batch["id"],
+        "status": batch["status"],
+        "total": batch["total"],
+        "done": batch["done"],
+        "failed": batch["failed"],
+        "skipped": batch.get("skipped", []),
+        "results": batch.get("results", []),
+        "created_at": batch.get("created_at"),
+        "finished_at": batch.get("finished_at"),
+    }
 
-    zimmer = await db.wg_zimmer.find_one({"id": data.zimmer_id})
-    if not zimmer:
-        raise HTTPException(status_code=404, detail="Zimmer nicht gefunden")
+@api_router.post("/einzugspaket/batch", status_code=202)
+async def create_einzugspaket_batch(data: EinzugspaketBatchRequest, current_user: Dict = Depends(get_current_user)):
+    """Render and save Einzugspakete for all residents of a WG or a list of klienten"""
+    items, skipped = await einzugspaket_batch_items(data)
+
+    async def store(params, pdf_bytes, item):
+        dok = await store_einzugspaket(params, pdf_bytes, current_user)
+        return {"dokument_id": dok["id"], "filename": dok["name"]}
+
+    batch = await pdf_jobs.submit_batch(
+        items, store,
+        id=generate_id(),
+        wg_id=data.wg_id,
+        skipped=skipped,
+        erstellt_von_name=current_user.get("name", "System"),
+    )
+    return einzugspaket_batch_status(batch)
 
-    stammdaten = await db.wg_stammdaten.find_one({"wg_id": data.wg_id}, {"_id": 0})
-    if not stammdaten:
-        stammdaten = WG_STAMMDATEN_DEFAULTS.get(data.wg_id, {})
+@api_router.get("/einzugspaket/batches/{batch_id}")
+async def get_einzugspaket_batch(
+    batch_id: str,
+    wait: int = Query(0, ge=0, le=MAX_WAIT_SECONDS),
+    current_user: Dict = Depends(get_current_user)
+):
+    """Batch progress; with wait > 0 the request blocks until the batch is done"""
+    batch = await pdf_jobs.wait_batch(batch_id, wait) if wait else await pdf_jobs.get_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Auftrag nicht gefunden")
+    return einzugspaket_batch_status(batch)
 
-    pdf_bytes = pdf_generator.generate(
-        klient=klient, wg=wg, zimmer=zimmer,
-        stammdaten=stammdaten, mietbeginn=data.mietbeginn,
+@api_router.post("/einzugspaket/send-email")
+async def send_einzugspaket_email(data: EinzugspaketEmailRequest, current_user: Dict = Depends(get_current_user)):
+    """Generate Einzugspaket PDF and send via email"""
+    params = await load_einzugspaket_params(data)
+    klient, wg, stammdaten = params["klient"], params["wg"], params["stammdaten"]
+    filename = einzugspaket_filename(params)
+
+    # Reuse a saved package with identical content, otherwise render (or hit the PDF cache)
+    pdf_bytes = None
+    saved = await db.klient_dokumente.find_one(
+        {"klient_id": data.klient_id, "kategorie": "einzugspaket", "render_hash": render_key(**params)},
+        {"file_data": 0}
     )
-
-    filename = f"Einzugspaket_{klient.get('nachname')}_{klient.get('vorname')}_{wg.get('kurzname')}.pdf"
+    if saved:
+        try:
+            pdf_bytes = await read_document_content(saved)
+        except BlobNotFound:
+            logger.warning(f"Saved Einzugspaket {saved['id']} has no content, rendering again")
+    if pdf_bytes is None:
+        pdf_bytes = await render_einzugspaket_pdf(params)
 
     body = data.nachricht or (
         f"Sehr geehrte Damen und Herren,\n\n"
@@ -1520,6 +2023,7 @@ async def seed_database():
         {"id": generate_id(), "property_id": properties[3]["id"], "name": "Versicherungspolice_2024.pdf", "category": "Vertrag", "file_url": "https://example.com/docs/versicherung_kupferkessel.pdf", "file_size": 380000, "file_type": "application/pdf", "created_at": to_iso(now())}
     ]
     await db.documents.insert_many(documents)
+    await ticket_cards.rebuild_all()
     
     return {
         "message": "Datenbank erfolgreich befüllt mit echten DomusVita-Immobiliendaten",
@@ -1545,6 +2049,8 @@ async def seed_database_reset():
     await db.ticket_photos.delete_many({})
     await db.status_updates.delete_many({})
     await db.work_reports.delete_many({})
+    await db.handwerker_ticket_cards.delete_many({})
+    await db.binary("photo_blobs").delete_prefix("")
     
     # Re-seed with real data
     return await seed_database()
@@ -1552,55 +2058,6 @@ async def seed_database_reset():
 
 # ==================== KLIENTENMANAGEMENT ENDPOINTS ====================
 
-# Pflege-WG Liste mit Grundrissen - AKTUALISIERT mit echten Daten
-PFLEGE_WGS_DATA = [
-    {
-        "id": "wg-sterndamm",
-        "kurzname": "Sterndamm",
-        "property_name": "WG Sterndamm",
-        "property_address": "Sterndamm 13, 12487 Berlin",
-        "kapazitaet": 10,
-        "grundriss_url": "https://customer-assets.emergentagent.com/job_domushome/artifacts/gv8gcuns_Grundriss%20Sterndamm.png",
-        "beschreibung": "Ambulant betreute Wohngemeinschaft mit 10 Zimmern"
-    },
-    {
-        "id": "wg-kupferkessel",
-        "kurzname": "Kupferkessel",
-        "property_name": "WG Kupferkessel",
-        "property_address": "Baumschulenstraße 64, 1. OG, 12437 Berlin",
-        "kapazitaet": 8,
-        "grundriss_url": None,
-        "beschreibung": "Ambulant betreute Wohngemeinschaft mit 8 Zimmern (inkl. 1 Doppelzimmer)"
-    },
-    {
-        "id": "wg-kupferkessel-klein",
-        "kurzname": "Kupferkesselchen",
-        "property_name": "WG Kupferkesselchen",
-        "property_address": "Baumschulenstraße 64, EG rechts, 12437 Berlin",
-        "kapazitaet": 3,
-        "grundriss_url": "https://customer-assets.emergentagent.com/job_domushome/artifacts/suv923c5_KUPFERKESSEL%20KLEIN%20GRUNDRISS.png",
-        "beschreibung": "Kleinere Wohngemeinschaft mit 4 Zimmern"
-    },
-    {
-        "id": "wg-drachenwiese",
-        "kurzname": "Drachenwiese",
-        "property_name": "WG Drachenwiese",
-        "property_address": "Rudower Straße 228, 12557 Berlin",
-        "kapazitaet": 12,
-        "grundriss_url": "https://customer-assets.emergentagent.com/job_domushome/artifacts/afidfcuk_Grundriss%20WG%20Drachenwiese%20Gro%C3%9F.png",
-        "beschreibung": "Große ambulant betreute Wohngemeinschaft mit 12 Zimmern"
-    },
-    {
-        "id": "wg-drachenblick",
-        "kurzname": "Drachenblick",
-        "property_name": "WG Drachenblick",
-        "property_address": "Rudower Straße 226, 12557 Berlin",
-        "kapazitaet": 4,
-        "grundriss_url": "https://customer-assets.emergentagent.com/job_domushome/artifacts/fti3j6nz_Grundriss%20Drachenblick.png",
-        "beschreibung": "Ambulant betreute Wohngemeinschaft mit 4 Zimmern"
-    }
-]
-
 # Anonymisierte Test-Bewohnerdaten fuer DEV_MODE Seed (DSGVO-konform)
 ECHTE_BEWOHNER_DATA = {
     "wg-sterndamm": [
@@ -1654,26 +2111,45 @@ ECHTE_BEWOHNER_DATA = {
 @api_router.get("/pflege-wgs")
 async def get_pflege_wgs(current_user: Dict = Depends(get_current_user)):
     """Get all Pflege-Wohngemeinschaften with room statistics"""
-    wgs = []
-    for wg_data in PFLEGE_WGS_DATA:
-        wg = wg_data.copy()
-        # Get room stats from database
-        zimmer = await db.wg_zimmer.find({"pflege_wg_id": wg["id"]}).to_list(100)
-        wg["freie_zimmer"] = len([z for z in zimmer if z.get("status") == "frei"])
-        wg["belegte_zimmer"] = len([z for z in zimmer if z.get("status") == "belegt"])
-        wg["reservierte_zimmer"] = len([z for z in zimmer if z.get("status") == "reserviert"])
-        wg["gesamt_zimmer"] = len(zimmer)
-        wgs.append(wg)
+    wgs = await wg_registry.all()
+    belegung = await wg_occupancy.get_many([w["id"] for w in wgs])
+    for wg in wgs:
+        stats = belegung[wg["id"]]
+        wg["freie_zimmer"] = stats["freie_zimmer"]
+        wg["belegte_zimmer"] = stats["belegte_zimmer"]
+        wg["reservierte_zimmer"] = stats["reservierte_zimmer"]
+        wg["gesamt_zimmer"] = stats["gesamt_zimmer"]
     return wgs
 
+@api_router.post("/pflege-wgs")
+async def create_pflege_wg(data: PflegeWGCreate, current_user: Dict = Depends(get_current_user)):
+    """Create a new Pflege-WG (available to all endpoints without restart)"""
+    if await wg_registry.get(data.id):
+        raise HTTPException(status_code=400, detail="WG existiert bereits")
+
+    wg = data.model_dump()
+    wg["position"] = len(await wg_registry.all())
+    wg["created_at"] = to_iso(now())
+    await db.pflege_wgs.insert_one(wg)
+    return wg
+
+@api_router.put("/pflege-wgs/{wg_id}")
+async def update_pflege_wg(wg_id: str, data: PflegeWGUpdate, current_user: Dict = Depends(get_current_user)):
+    """Update Pflege-WG metadata"""
+    update_data = {k: v for k, v in data.model_dump().items() if v is not None}
+    update_data["updated_at"] = to_iso(now())
+    result = await db.pflege_wgs.update_one({"id": wg_id}, {"$set": update_data})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="WG nicht gefunden")
+    return await wg_registry.get(wg_id)
+
 @api_router.get("/pflege-wgs/{wg_id}")
 async def get_pflege_wg(wg_id: str, current_user: Dict = Depends(get_current_user)):
     """Get single Pflege-WG with rooms"""
-    wg_data = next((w for w in PFLEGE_WGS_DATA if w["id"] == wg_id), None)
-    if not wg_data:
+    wg = await wg_registry.get(wg_id)
+    if not wg:
         raise HTTPException(status_code=404, detail="WG nicht gefunden")
     
-    wg = wg_data.copy()
     zimmer = await db.wg_zimmer.find({"pflege_wg_id": wg_id}).to_list(100)
     
     # Enhance rooms with resident info
@@ -1836,7 +2312,7 @@ async def get_klienten(status: Optional[str] = None, wg_id: Optional[str] = None
             zimmer = await db.wg_zimmer.find_one({"id": k["zimmer_id"]})
             if zimmer:
                 k["zimmer_nummer"] = zimmer.get("nummer")
-                wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == zimmer.get("pflege_wg_id")), None)
+                wg = await wg_registry.get(zimmer.get("pflege_wg_id"))
                 if wg:
                     k["wg_name"] = wg.get("kurzname")
     
@@ -1868,7 +2344,7 @@ async def get_klient(klient_id: str, current_user: Dict = Depends(get_current_us
     klient["aktivitaeten"] = aktivitaeten
     
     # Get documents
-    dokumente = await db.klient_dokumente.find({"klient_id": klient_id}).to_list(50)
+    dokumente = await db.klient_dokumente.find({"klient_id": klient_id}, {"file_data": 0}).to_list(50)
     for d in dokumente:
         if "_id" in d:
             del d["_id"]
@@ -1888,6 +2364,8 @@ async def get_klient(klient_id: str, current_user: Dict = Depends(get_current_us
 async def create_klient(klient: KlientCreate, current_user: Dict = Depends(get_current_user)):
     """Create a new client"""
     klient_dict = klient.model_dump()
+    if klient_dict.get("kontakt_email"):
+        klient_dict["kontakt_email"] = normalize_email(klient_dict["kontakt_email"])
     klient_dict["id"] = generate_id()
     klient_dict["status"] = "neu"
     klient_dict["anfrage_am"] = to_iso(now())
@@ -1916,6 +2394,9 @@ async def update_klient(klient_id: str, klient: KlientUpdate, current_user: Dict
         raise HTTPException(status_code=404, detail="Klient nicht gefunden")
     
     update_data = {k: v for k, v in klient.model_dump().items() if v is not None}
+    if update_data.get("kontakt_email"):
+        # Stored normalised: the routing lookups compare it exactly
+        update_data["kontakt_email"] = normalize_email(update_data["kontakt_email"])
     update_data["updated_at"] = to_iso(now())
     
     # Log status change
@@ -1937,7 +2418,9 @@ async def update_klient(klient_id: str, klient: KlientUpdate, current_user: Dict
                 {"$set": {"status": "belegt", "aktueller_bewohner_id": klient_id}}
             )
     
-    await db.klienten.update_one({"id": klient_id}, {"$set": update_data})
+    # Only write what changed: contact fields resent by the form would reload the routing index
+    changed = {k: v for k, v in update_data.items() if existing.get(k) != v}
+    await db.klienten.update_one({"id": klient_id}, {"$set": changed})
     
     updated = await db.klienten.find_one({"id": klient_id})
     if updated and "_id" in updated:
@@ -1958,7 +2441,7 @@ async def delete_klient(klient_id: str, current_user: Dict = Depends(get_current
     await db.klienten.delete_one({"id": klient_id})
     await db.klient_kommunikation.delete_many({"klient_id": klient_id})
     await db.klient_aktivitaeten.delete_many({"klient_id": klient_id})
-    await db.klient_dokumente.delete_many({"klient_id": klient_id})
+    await delete_with_blobs("klient_dokumente", {"klient_id": klient_id})
     
     return {"message": "Klient gelöscht"}
 
@@ -2093,7 +2576,7 @@ async def assign_klient_to_zimmer(klient_id: str, zimmer_id: str, current_user:
     )
     
     # Log activity
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == zimmer.get("pflege_wg_id")), None)
+    wg = await wg_registry.get(zimmer.get("pflege_wg_id")) or {}
     await db.klient_aktivitaeten.insert_one({
         "id": generate_id(),
         "klient_id": klient_id,
@@ -2173,25 +2656,24 @@ async def upload_klient_dokument(
     if not klient:
         raise HTTPException(status_code=404, detail="Klient nicht gefunden")
     
-    content = await file.read()
-    file_size = len(content)
-    
-    # Store as base64 in MongoDB (in production use Azure Blob Storage)
-    file_b64 = base64.b64encode(content).decode()
-    
-    doc = {
-        "id": generate_id(),
-        "klient_id": klient_id,
-        "name": file.filename,
-        "kategorie": kategorie,
-        "beschreibung": beschreibung,
-        "file_type": file.content_type,
-        "file_size": file_size,
-        "file_data": file_b64,
-        "status": "hochgeladen",
-        "erstellt_am": to_iso(now())
-    }
-    await db.klient_dokumente.insert_one(doc)
+    with await receive_upload(file, "dokument") as upload:
+        doc = {
+            "id": generate_id(),
+            "klient_id": klient_id,
+            "name": file.filename,
+            "kategorie": kategorie,
+            "beschreibung": beschreibung,
+            "file_type": file.content_type,
+            "file_size": upload.size,
+            "blob_key": upload.sha256,
+            "status": "hochgeladen",
+            "erstellt_am": to_iso(now())
+        }
+        await insert_blob_document(
+            "klient_dokumente", doc,
+            lambda: blob_store.put_file(upload.file, upload.sha256, upload.content_type),
+        )
+    schedule_thumbnail(doc)
     
     # Auto-log activity
     await db.klient_aktivitaeten.insert_one({
@@ -2203,8 +2685,6 @@ async def upload_klient_dokument(
         "timestamp": to_iso(now())
     })
     
-    # Return without file_data (too large for response)
-    doc.pop("file_data", None)
     doc.pop("_id", None)
     return doc
 
@@ -2215,28 +2695,93 @@ async def get_klient_dokumente(klient_id: str, current_user: Dict = Depends(get_
         {"klient_id": klient_id}, 
         {"file_data": 0, "_id": 0}
     ).sort("erstellt_am", -1).to_list(100)
+    for doc in docs:
+        if is_pdf_document(doc):
+            doc["thumbnail_url"] = f"/api/klienten/{klient_id}/dokumente/{doc['id']}/thumbnail"
     return docs
 
 @api_router.get("/klienten/{klient_id}/dokumente/{dok_id}/download")
-async def download_klient_dokument(klient_id: str, dok_id: str, current_user: Dict = Depends(get_current_user)):
-    """Download a client document"""
-    from fastapi.responses import Response
-    doc = await db.klient_dokumente.find_one({"id": dok_id, "klient_id": klient_id})
+async def download_klient_dokument(klient_id: str, dok_id: str, request: Request, current_user: Dict = Depends(get_current_user)):
+    """Download a client document (streamed, Range/conditional GET)"""
+    doc = await db.klient_dokumente.find_one({"id": dok_id, "klient_id": klient_id}, {"file_data": 0})
     if not doc:
         raise HTTPException(status_code=404, detail="Dokument nicht gefunden")
     
-    file_content = base64.b64decode(doc["file_data"])
-    return Response(
-        content=file_content,
-        media_type=doc.get("file_type", "application/octet-stream"),
-        headers={"Content-Disposition": f"attachment; filename={doc['name']}"}
+    meta = dict(
+        content_type=doc.get("file_type") or "application/octet-stream",
+        filename=doc["name"],
+        last_modified=from_iso(doc.get("erstellt_am")),
     )
+    try:
+        if doc.get("blob_key"):
+            return await blob_download(request, blob_store, doc["blob_key"], **meta)
+        # Legacy document with base64 content in the row
+        legacy = await db.klient_dokumente.find_one({"id": dok_id}, {"file_data": 1})
+        if not legacy or not legacy.get("file_data"):
+            raise BlobNotFound(dok_id)
+        return await bytes_download(request, base64.b64decode(legacy["file_data"]), etag=f'"{dok_id}"', **meta)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Dateiinhalt nicht gefunden")
+
+@api_router.get("/klienten/{klient_id}/dokumente/{dok_id}/thumbnail")
+async def get_klient_dokument_thumbnail(
+    klient_id: str,
+    dok_id: str,
+    request: Request,
+    page: int = Query(1, ge=1),
+    current_user: Dict = Depends(get_current_user)
+):
+    """Page thumbnail of a PDF document as WebP or PNG (rendered on first request)"""
+    doc = await db.klient_dokumente.find_one({"id": dok_id, "klient_id": klient_id}, {"file_data": 0})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Dokument nicht gefunden")
+    if not is_pdf_document(doc):
+        raise HTTPException(status_code=404, detail="Keine Vorschau für diesen Dateityp")
+
+    async def load() -> bytes:
+        if doc.get("blob_key"):
+            return await read_document_content(doc)
+        # Legacy document with base64 content in the row
+        return await read_document_content(await db.klient_dokumente.find_one({"id": dok_id}, {"id": 1, "file_data": 1}))
+
+    source = thumbnail_source(doc)
+    try:
+        info = await thumbnails.ensure(source, load, page)
+    except WorkerPoolBusy:
+        raise HTTPException(503, "Vorschau-Erstellung ausgelastet, bitte erneut versuchen", headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "Zeitüberschreitung bei der Vorschau-Erstellung")
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Dateiinhalt nicht gefunden")
+    except Exception as e:
+        logger.error(f"Thumbnail rendering failed for {dok_id}: {e}")
+        raise HTTPException(status_code=422, detail="Vorschau konnte nicht erstellt werden")
+    if page > info["rendered"]:
+        raise HTTPException(status_code=404, detail="Seite nicht gefunden")
+
+    fmt = thumbnail_format(request.headers.get("accept"))
+    meta = await thumbnails.store.head(f"{source}/{page}.{fmt}")
+    if not meta:
+        raise HTTPException(status_code=404, detail="Seite nicht gefunden")
+    # Keyed by content hash: a thumbnail never changes
+    etag = f'"{meta["etag"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Vary": "Accept",
+        "X-Page-Count": str(info["pages"]),
+    }
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    thumbnail = await thumbnails.get(source, page, fmt)
+    return Response(content=thumbnail["data"], media_type=thumbnail["content_type"], headers=headers)
 
 @api_router.delete("/klienten/{klient_id}/dokumente/{dok_id}")
 async def delete_klient_dokument(klient_id: str, dok_id: str, current_user: Dict = Depends(get_current_user)):
     """Delete a client document"""
-    result = await db.klient_dokumente.delete_one({"id": dok_id, "klient_id": klient_id})
-    if result.deleted_count == 0:
+    deleted = await delete_with_blobs("klient_dokumente", {"id": dok_id, "klient_id": klient_id})
+    if deleted == 0:
         raise HTTPException(status_code=404, detail="Dokument nicht gefunden")
     return {"message": "Dokument gelöscht"}
 
@@ -2257,17 +2802,24 @@ async def send_klient_email(klient_id: str, data: dict, current_user: Dict = Dep
     inhalt = data.get("inhalt", "")
     dokument_ids = data.get("dokument_ids", [])
 
-    # Collect attached documents
+    # Collect attached documents; ones without file content are reported, not listed as sent
     anhaenge_namen = []
+    fehlende_anhaenge = []
+    angehaengte_ids = []
     graph_attachments = []
     if dokument_ids:
         for dok_id in dokument_ids:
-            dok = await db.klient_dokumente.find_one({"id": dok_id})
+            dok = await db.klient_dokumente.find_one({"id": dok_id}, {"file_data": 0})
             if dok:
+                try:
+                    # Streamed while sending; large files go through Graph upload sessions
+                    graph_attachments.append(await klient_dokument_attachment(dok))
+                except BlobNotFound:
+                    logger.warning(f"Dokument {dok_id} has no file content, sending without it")
+                    fehlende_anhaenge.append(dok.get("name", "dokument"))
+                    continue
                 anhaenge_namen.append(dok.get("name", "dokument"))
-                if dok.get("file_data"):
-                    file_content = base64.b64decode(dok["file_data"])
-                    graph_attachments.append((dok.get("name", "dokument"), file_content))
+                angehaengte_ids.append(dok_id)
 
     # Send via Graph API with client reference tag
     subject_tag = f"[DV-{klient_id[:8]}] {betreff}"
@@ -2285,8 +2837,11 @@ async def send_klient_email(klient_id: str, data: dict, current_user: Dict = Dep
         "klient_id": klient_id,
         "typ": "email_aus",
         "betreff": betreff,
-        "inhalt": inhalt + (f"\n\nAnhänge: {', '.join(anhaenge_namen)}" if anhaenge_namen else ""),
+        "inhalt": inhalt
+            + (f"\n\nAnhänge: {', '.join(anhaenge_namen)}" if anhaenge_namen else "")
+            + (f"\n\nNicht angehängt (Datei fehlt): {', '.join(fehlende_anhaenge)}" if fehlende_anhaenge else ""),
         "anhaenge": anhaenge_namen,
+        "fehlende_anhaenge": fehlende_anhaenge,
         "empfaenger": empfaenger,
         "erstellt_am": to_iso(now()),
         "erstellt_von_name": current_user.get("name", "System")
@@ -2295,7 +2850,7 @@ async def send_klient_email(klient_id: str, data: dict, current_user: Dict = Dep
     asyncio.create_task(generate_and_store_summary(komm_id, inhalt))
 
     # Update document status
-    for dok_id in dokument_ids:
+    for dok_id in angehaengte_ids:
         await db.klient_dokumente.update_one(
             {"id": dok_id},
             {"$set": {"status": "gesendet", "gesendet_an": empfaenger, "gesendet_am": to_iso(now())}}
@@ -2306,7 +2861,9 @@ async def send_klient_email(klient_id: str, data: dict, current_user: Dict = Dep
         "id": generate_id(),
         "klient_id": klient_id,
         "benutzer_name": current_user.get("name", "System"),
-        "aktion": f"E-Mail gesendet an {empfaenger}" + (f" mit {len(anhaenge_namen)} Anhängen" if anhaenge_namen else ""),
+        "aktion": f"E-Mail gesendet an {empfaenger}"
+            + (f" mit {len(anhaenge_namen)} Anhängen" if anhaenge_namen else "")
+            + (f" ({len(fehlende_anhaenge)} Anhänge fehlten)" if fehlende_anhaenge else ""),
         "timestamp": to_iso(now())
     })
 
@@ -2314,6 +2871,7 @@ async def send_klient_email(klient_id: str, data: dict, current_user: Dict = Dep
     return {
         "message": "E-Mail gesendet" if email_sent else "E-Mail konnte nicht gesendet werden. Eintrag gespeichert.",
         "email_sent": email_sent,
+        "fehlende_anhaenge": fehlende_anhaenge,
         "kommunikation": komm
     }
 
@@ -2322,27 +2880,15 @@ async def send_klient_email(klient_id: str, data: dict, current_user: Dict = Dep
 @api_router.get("/pflege-wgs/{wg_id}/kosten")
 async def get_wg_kosten(wg_id: str, current_user: Dict = Depends(get_current_user)):
     """Get cost overview for a WG"""
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == wg_id), None)
+    wg = await wg_registry.get(wg_id)
     if not wg:
         raise HTTPException(status_code=404, detail="WG nicht gefunden")
     
-    zimmer = await db.wg_zimmer.find({"pflege_wg_id": wg_id}, {"_id": 0}).to_list(100)
-    belegte = [z for z in zimmer if z.get("status") == "belegt"]
-    freie = [z for z in zimmer if z.get("status") == "frei"]
-    
-    # Base costs per room type (configurable defaults)
-    kosten_config = await db.wg_kosten.find_one({"wg_id": wg_id}, {"_id": 0})
-    if not kosten_config:
-        kosten_config = {
-            "miete_pro_zimmer": 650.0,
-            "nebenkosten_pro_zimmer": 180.0,
-            "betreuungspauschale": 420.0,
-            "verpflegung": 280.0,
-            "investitionskosten": 120.0,
-        }
+    stats = await wg_occupancy.get(wg_id)
+    kosten_config = stats["kosten_config"]
     
-    belegte_count = len(belegte)
-    kapazitaet = wg.get("kapazitaet", len(zimmer))
+    belegte_count = stats["belegte_zimmer"]
+    kapazitaet = wg.get("kapazitaet", stats["gesamt_zimmer"])
     
     gesamt_miete = kosten_config["miete_pro_zimmer"] * belegte_count
     gesamt_nebenkosten = kosten_config["nebenkosten_pro_zimmer"] * belegte_count
@@ -2350,17 +2896,11 @@ async def get_wg_kosten(wg_id: str, current_user: Dict = Depends(get_current_use
     gesamt_verpflegung = kosten_config["verpflegung"] * belegte_count
     gesamt_investition = kosten_config["investitionskosten"] * belegte_count
     
-    kosten_pro_bewohner = (
-        kosten_config["miete_pro_zimmer"] +
-        kosten_config["nebenkosten_pro_zimmer"] +
-        kosten_config["betreuungspauschale"] +
-        kosten_config["verpflegung"] +
-        kosten_config["investitionskosten"]
-    )
+    pro_bewohner = kosten_pro_bewohner(kosten_config)
     
-    gesamt_monatlich = kosten_pro_bewohner * belegte_count
-    max_monatlich = kosten_pro_bewohner * kapazitaet
-    entgangene_einnahmen = kosten_pro_bewohner * len(freie)
+    gesamt_monatlich = pro_bewohner * belegte_count
+    max_monatlich = pro_bewohner * kapazitaet
+    entgangene_einnahmen = pro_bewohner * stats["freie_zimmer"]
     
     return {
         "wg_id": wg_id,
@@ -2375,7 +2915,7 @@ async def get_wg_kosten(wg_id: str, current_user: Dict = Depends(get_current_use
             "verpflegung": {"pro_zimmer": kosten_config["verpflegung"], "gesamt": gesamt_verpflegung},
             "investitionskosten": {"pro_zimmer": kosten_config["investitionskosten"], "gesamt": gesamt_investition},
         },
-        "kosten_pro_bewohner": kosten_pro_bewohner,
+        "kosten_pro_bewohner": pro_bewohner,
         "gesamt_monatlich": gesamt_monatlich,
         "max_monatlich": max_monatlich,
         "entgangene_einnahmen": entgangene_einnahmen,
@@ -2385,7 +2925,7 @@ async def get_wg_kosten(wg_id: str, current_user: Dict = Depends(get_current_use
 @api_router.put("/pflege-wgs/{wg_id}/kosten")
 async def update_wg_kosten(wg_id: str, data: dict, current_user: Dict = Depends(get_current_user)):
     """Update cost configuration for a WG"""
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == wg_id), None)
+    wg = await wg_registry.get(wg_id)
     if not wg:
         raise HTTPException(status_code=404, detail="WG nicht gefunden")
     
@@ -2408,32 +2948,18 @@ async def get_gesamt_kosten(current_user: Dict = Depends(get_current_user)):
     gesamt_bewohner = 0
     gesamt_kapazitaet = 0
     
-    for wg in PFLEGE_WGS_DATA:
-        zimmer = await db.wg_zimmer.find({"pflege_wg_id": wg["id"]}, {"_id": 0}).to_list(100)
-        belegte = len([z for z in zimmer if z.get("status") == "belegt"])
-        freie = len([z for z in zimmer if z.get("status") == "frei"])
-        kapazitaet = wg.get("kapazitaet", len(zimmer))
-        
-        kosten_config = await db.wg_kosten.find_one({"wg_id": wg["id"]}, {"_id": 0})
-        if not kosten_config:
-            kosten_config = {
-                "miete_pro_zimmer": 650.0,
-                "nebenkosten_pro_zimmer": 180.0,
-                "betreuungspauschale": 420.0,
-                "verpflegung": 280.0,
-                "investitionskosten": 120.0,
-            }
+    wgs = await wg_registry.all()
+    belegung = await wg_occupancy.get_many([w["id"] for w in wgs])
+    for wg in wgs:
+        stats = belegung[wg["id"]]
+        belegte = stats["belegte_zimmer"]
+        freie = stats["freie_zimmer"]
+        kapazitaet = wg.get("kapazitaet", stats["gesamt_zimmer"])
         
-        kosten_pro_bewohner = sum([
-            kosten_config["miete_pro_zimmer"],
-            kosten_config["nebenkosten_pro_zimmer"],
-            kosten_config["betreuungspauschale"],
-            kosten_config["verpflegung"],
-            kosten_config["investitionskosten"]
-        ])
+        pro_bewohner = kosten_pro_bewohner(stats["kosten_config"])
         
-        monatlich = kosten_pro_bewohner * belegte
-        entgangen = kosten_pro_bewohner * freie
+        monatlich = pro_bewohner * belegte
+        entgangen = pro_bewohner * freie
         
         ergebnisse.append({
             "wg_id": wg["id"],
@@ -2463,133 +2989,22 @@ async def get_gesamt_kosten(current_user: Dict = Depends(get_current_user)):
 
 # ==================== WG-STAMMDATEN ====================
 
-# Default-Stammdaten fuer alle 5 WGs (aus Original-PDFs extrahiert)
-WG_STAMMDATEN_DEFAULTS = {
-    "wg-sterndamm": {
-        "vermieter_name": "DomusVita gGmbH",
-        "vermieter_strasse": "Sterndamm 13",
-        "vermieter_plz_ort": "12487 Berlin",
-        "vermieter_iban": "DE18 1005 0000 0190 6561 40",
-        "vermieter_bank": "Berliner Sparkasse",
-        "vermieter_bic": "BELADEBEXXX",
-        "wg_adresse_strasse": "Sterndamm 13",
-        "wg_adresse_plz_ort": "12487 Berlin",
-        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
-        "haushaltsbuch_bank": "Berliner Sparkasse",
-        "lebensmittelpauschale": 290.0,
-        "wg_beitrag": 30.0,
-        "wg_zuschlag": 224.0,
-        "entlastungsbetrag": 131.0,
-        "pflegedienst_name": "DomusVita gGmbH",
-    },
-    "wg-kupferkessel": {
-        "vermieter_name": "300&VIER GmbH",
-        "vermieter_strasse": "Baumschulenstraße 64",
-        "vermieter_plz_ort": "12437 Berlin",
-        "vermieter_iban": "DE18 1005 0000 0190 6561 40",
-        "vermieter_bank": "Berliner Sparkasse",
-        "vermieter_bic": "BELADEBEXXX",
-        "wg_adresse_strasse": "Baumschulenstraße 64, 1. OG",
-        "wg_adresse_plz_ort": "12437 Berlin",
-        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
-        "haushaltsbuch_bank": "Berliner Sparkasse",
-        "lebensmittelpauschale": 290.0,
-        "wg_beitrag": 30.0,
-        "wg_zuschlag": 224.0,
-        "entlastungsbetrag": 131.0,
-        "pflegedienst_name": "DomusVita gGmbH",
-        "hauptmieter": "DomusVita gGmbH",
-        "nettokaltmiete_pro_qm": 13.00,
-        "kalte_betriebskosten_pro_qm": 1.50,
-        "kooperationsgebuehr_monat": 800.0,
-    },
-    "wg-kupferkessel-klein": {
-        "vermieter_name": "300&VIER GmbH",
-        "vermieter_strasse": "Baumschulenstraße 64",
-        "vermieter_plz_ort": "12437 Berlin",
-        "vermieter_iban": "DE18 1005 0000 0190 6561 40",
-        "vermieter_bank": "Berliner Sparkasse",
-        "vermieter_bic": "BELADEBEXXX",
-        "wg_adresse_strasse": "Baumschulenstraße 64, EG rechts",
-        "wg_adresse_plz_ort": "12437 Berlin",
-        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
-        "haushaltsbuch_bank": "Berliner Sparkasse",
-        "lebensmittelpauschale": 290.0,
-        "wg_beitrag": 30.0,
-        "wg_zuschlag": 224.0,
-        "entlastungsbetrag": 131.0,
-        "pflegedienst_name": "DomusVita gGmbH",
-        "hauptmieter": "DomusVita gGmbH",
-        "nettokaltmiete_pro_qm": 13.25,
-        "kalte_betriebskosten_pro_qm": 1.50,
-        "kooperationsgebuehr_monat": 500.0,
-    },
-    "wg-drachenwiese": {
-        "vermieter_name": "Hilfe in Not GmbH",
-        "vermieter_strasse": "Rudower Straße 228",
-        "vermieter_plz_ort": "12557 Berlin",
-        "vermieter_iban": "DE53 1005 0000 0190 9988 90",
-        "vermieter_bank": "Berliner Sparkasse",
-        "vermieter_bic": "BELADEBEXXX",
-        "wg_adresse_strasse": "Rudower Straße 228",
-        "wg_adresse_plz_ort": "12557 Berlin",
-        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
-        "haushaltsbuch_bank": "Berliner Sparkasse",
-        "lebensmittelpauschale": 290.0,
-        "wg_beitrag": 30.0,
-        "wg_zuschlag": 224.0,
-        "entlastungsbetrag": 131.0,
-        "pflegedienst_name": "DomusVita gGmbH",
-        "mietvertragstyp": "Bruttomiete (Untermietvertrag)",
-        "nebenkosten_reparaturpauschale": 30.0,
-        "nebenkosten_sondermuell": 20.0,
-        "nebenkosten_strom": 45.0,
-        "nebenkosten_heizkosten": 50.0,
-        "kaution": "zwei_grundmieten",
-    },
-    "wg-drachenblick": {
-        "vermieter_name": "5D Living GmbH",
-        "vermieter_strasse": "Rudower Straße 226",
-        "vermieter_plz_ort": "12557 Berlin",
-        "vermieter_iban": "DE18 1005 0000 0190 6561 40",
-        "vermieter_bank": "Berliner Sparkasse",
-        "vermieter_bic": "BELADEBEXXX",
-        "wg_adresse_strasse": "Rudower Straße 226",
-        "wg_adresse_plz_ort": "12557 Berlin",
-        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
-        "haushaltsbuch_bank": "Berliner Sparkasse",
-        "lebensmittelpauschale": 290.0,
-        "wg_beitrag": 30.0,
-        "wg_zuschlag": 224.0,
-        "entlastungsbetrag": 131.0,
-        "pflegedienst_name": "DomusVita gGmbH",
-        "mietvertragstyp": "Bruttomiete (Untermietvertrag)",
-        "nebenkosten_reparaturpauschale": 30.0,
-        "nebenkosten_sondermuell": 20.0,
-        "nebenkosten_strom": 50.0,
-        "nebenkosten_heizkosten": 45.0,
-        "kaution": "zwei_grundmieten",
-    },
-}
-
 @api_router.get("/pflege-wgs/{wg_id}/stammdaten")
 async def get_wg_stammdaten(wg_id: str, current_user: Dict = Depends(get_current_user)):
     """Get Stammdaten for a WG (returns defaults if not yet configured)"""
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == wg_id), None)
+    wg = await wg_registry.get(wg_id)
     if not wg:
         raise HTTPException(status_code=404, detail="WG nicht gefunden")
 
-    stammdaten = await db.wg_stammdaten.find_one({"wg_id": wg_id}, {"_id": 0})
-    if not stammdaten:
-        stammdaten = WG_STAMMDATEN_DEFAULTS.get(wg_id, {})
-        stammdaten["wg_id"] = wg_id
+    stammdaten = await wg_registry.stammdaten(wg_id)
+    stammdaten["wg_id"] = wg_id
 
     return stammdaten
 
 @api_router.put("/pflege-wgs/{wg_id}/stammdaten")
 async def update_wg_stammdaten(wg_id: str, data: WGStammdatenUpdate, current_user: Dict = Depends(get_current_user)):
     """Update Stammdaten for a WG (upsert)"""
-    wg = next((w for w in PFLEGE_WGS_DATA if w["id"] == wg_id), None)
+    wg = await wg_registry.get(wg_id)
     if not wg:
         raise HTTPException(status_code=404, detail="WG nicht gefunden")
 
@@ -2604,6 +3019,26 @@ async def update_wg_stammdaten(wg_id: str, data: WGStammdatenUpdate, current_use
     )
     return {"message": "Stammdaten aktualisiert", "data": stammdaten_dict}
 
+# ==================== GRAPH CHANGE NOTIFICATIONS ====================
+
+@api_router.post("/graph/notifications")
+async def graph_notifications(request: Request, validation_token: Optional[str] = Query(None, alias="validationToken")):
+    """Webhook for Microsoft Graph change and lifecycle notifications.
+    No user auth: Graph calls it directly, notifications are authenticated by clientState."""
+    if validation_token is not None:
+        # Subscription handshake: echo the token as text/plain
+        return PlainTextResponse(validation_token)
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Ungültige Benachrichtigung")
+    if not inbox_subscription.enabled or not inbox_subscription.handle(payload):
+        raise HTTPException(status_code=403, detail="Ungültige Benachrichtigung")
+    # Answer quickly; the inbox sync runs in poll_inbox_loop
+    return Response(status_code=202)
+
 # ==================== WHATSAPP BUSINESS ====================
 
 @api_router.post("/whatsapp/webhook")
@@ -2619,14 +3054,14 @@ async def whatsapp_webhook(data: dict, current_user: Dict = Depends(get_current_
     if not from_number or not body:
         return {"status": "ignored"}
     
-    # Find klient by contact phone
-    klient = await db.klienten.find_one({"kontakt_telefon": {"$regex": from_number.replace("+", "")}})
+    # Find klient by contact phone (any notation, normalised to E.164)
+    klient_id = await routing_index.by_phone(from_number)
     
-    if klient:
+    if klient_id:
         # Auto-save as communication entry
         komm = {
             "id": generate_id(),
-            "klient_id": klient["id"],
+            "klient_id": klient_id,
             "typ": "whatsapp_ein",
             "betreff": None,
             "inhalt": body,
@@ -2640,13 +3075,13 @@ async def whatsapp_webhook(data: dict, current_user: Dict = Depends(get_current_
         # Auto-log activity
         await db.klient_aktivitaeten.insert_one({
             "id": generate_id(),
-            "klient_id": klient["id"],
+            "klient_id": klient_id,
             "benutzer_name": from_number,
             "aktion": f"WhatsApp erhalten von {from_number}",
             "timestamp": to_iso(now())
         })
         
-        logger.info(f"WhatsApp from {from_number} saved for klient {klient['id']}")
+        logger.info(f"WhatsApp from {from_number} saved for klient {klient_id}")
     else:
         # Save as unmatched message
         await db.whatsapp_nachrichten.insert_one({
@@ -2948,7 +3383,7 @@ async def reset_klienten_data():
     await db.klienten.delete_many({})
     await db.klient_kommunikation.delete_many({})
     await db.klient_aktivitaeten.delete_many({})
-    await db.klient_dokumente.delete_many({})
+    await delete_with_blobs("klient_dokumente", {})
     await db.besichtigungen.delete_many({})
     
     return await seed_klienten_data()
@@ -2956,6 +3391,9 @@ async def reset_klienten_data():
 # Include router
 app.include_router(api_router)
 
+# Cap request bodies by Content-Length and by the bytes actually received
+app.add_middleware(RequestSizeLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,11 @@
+"""
+Shared test setup: makes the backend modules importable for the unit tests.
+
+The API tests (test_domusvita_api.py, test_klientenmanagement*.py) run
+against a deployed instance via REACT_APP_BACKEND_URL; the unit tests
+import the modules directly and need no database or network.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,268 @@
+"""
+In-memory stand-in for database.PgDatabase used by the unit tests.
+
+Implements the subset of the collection, binary store, change notification
+and advisory lock API the services use, with the same query semantics as
+_build_where (comparison operators compare the text form of a field, and a
+missing field never matches an operator). Unique indexes raise
+asyncpg.UniqueViolationError like the real table.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int):
+        self.matched_count = matched_count
+        self.deleted_count = matched_count
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for key, value in (query or {}).items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in value):
+                return False
+            continue
+        if isinstance(value, dict):
+            if key not in doc or doc[key] is None:
+                return False
+            field = _text(doc[key])
+            for op, op_value in value.items():
+                if op == "$options":
+                    continue
+                ok = {
+                    "$gte": lambda: field >= str(op_value),
+                    "$lte": lambda: field <= str(op_value),
+                    "$gt": lambda: field > str(op_value),
+                    "$lt": lambda: field < str(op_value),
+                    "$ne": lambda: field != str(op_value),
+                    "$in": lambda: field in [str(v) for v in op_value],
+                    "$regex": lambda: (
+                        op_value.lower() in field.lower() if "i" in value.get("$options", "") else op_value in field
+                    ),
+                }[op]()
+                if not ok:
+                    return False
+        elif doc.get(key) != value or key not in doc:
+            return False
+    return True
+
+
+def _project(doc: dict, projection: dict) -> dict:
+    doc = copy.deepcopy(doc)
+    fields = {k: v for k, v in (projection or {}).items() if k != "_id"}
+    values = set(fields.values())
+    if values == {0}:
+        return {k: v for k, v in doc.items() if k not in fields}
+    if values == {1}:
+        return {k: doc.get(k) for k in fields}
+    return doc
+
+
+class MemoryCursor:
+    def __init__(self, collection, query, projection):
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self._sort = None
+        self._skip = 0
+
+    def sort(self, field: str, direction: int):
+        self._sort = (field, direction)
+        return self
+
+    def skip(self, offset: int):
+        self._skip = max(0, int(offset))
+        return self
+
+    async def to_list(self, limit) -> list:
+        docs = [d for d in self.collection.docs if _matches(d, self.query)]
+        if self._sort:
+            field, direction = self._sort
+            docs.sort(key=lambda d: (d.get(field) is None, d.get(field)), reverse=direction == -1)
+        docs = docs[self._skip:]
+        if limit is not None:
+            docs = docs[:limit]
+        return [_project(d, self.projection) for d in docs]
+
+
+class MemoryCollection:
+    def __init__(self, database, name: str):
+        self.database = database
+        self.table = name
+        self.docs = []
+        self.indexes = set()
+        self.unique = set()
+        self.fail_unique_index = False
+
+    def _check_unique(self, doc: dict, ignore=None):
+        for field in self.unique:
+            if doc.get(field) is None:
+                continue
+            for other in self.docs:
+                if other is not ignore and other.get(field) == doc[field]:
+                    raise asyncpg.UniqueViolationError(f"duplicate key value violates unique constraint on {field}")
+
+    async def create_index(self, field: str, unique: bool = False, required: bool = False):
+        self.indexes.add(field)
+        if unique:
+            if self.fail_unique_index:
+                # Like PgCollection: existing duplicates make creation fail, logged unless required
+                if required:
+                    raise RuntimeError(f"Index creation for {self.table}.{field} failed")
+                return
+            self.unique.add(field)
+
+    async def find_one(self, query=None, projection=None):
+        for doc in self.docs:
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    def find(self, query=None, projection=None):
+        return MemoryCursor(self, query, projection)
+
+    async def insert_one(self, doc):
+        stored = copy.deepcopy(doc)
+        self._check_unique(stored)
+        self.docs.append(stored)
+        self.database._changed(self.table)
+
+    async def insert_many(self, docs):
+        for doc in docs:
+            await self.insert_one(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs:
+            if _matches(doc, query):
+                updated = {**doc, **copy.deepcopy(update.get("$set", {}))}
+                for field, amount in update.get("$inc", {}).items():
+                    updated[field] = int(updated.get(field) or 0) + int(amount)
+                self._check_unique(updated, ignore=doc)
+                doc.clear()
+                doc.update(updated)
+                self.database._changed(self.table, [*update.get("$set", {}), *update.get("$inc", {})])
+                return UpdateResult(1)
+        if upsert:
+            doc = {**query, **update.get("$set", {})}
+            for field, amount in update.get("$inc", {}).items():
+                doc[field] = doc.get(field, 0) + int(amount)
+            await self.insert_one(doc)
+            return UpdateResult(1)
+        return UpdateResult(0)
+
+    async def delete_one(self, query):
+        for doc in self.docs:
+            if _matches(doc, query):
+                self.docs.remove(doc)
+                self.database._changed(self.table)
+                return UpdateResult(1)
+        return UpdateResult(0)
+
+    async def delete_many(self, query=None):
+        before = len(self.docs)
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+        if len(self.docs) != before:
+            self.database._changed(self.table)
+        return UpdateResult(before - len(self.docs))
+
+    async def count_documents(self, query=None):
+        return sum(1 for d in self.docs if _matches(d, query))
+
+    async def group_count(self, fields: list, query=None) -> list:
+        counts = {}
+        for doc in self.docs:
+            if _matches(doc, query):
+                key = tuple(None if doc.get(f) is None else _text(doc[f]) for f in fields)
+                counts[key] = counts.get(key, 0) + 1
+        return [{**dict(zip(fields, key)), "count": count} for key, count in counts.items()]
+
+
+class MemoryBinaryStore:
+    def __init__(self):
+        self.entries = {}
+        # Chunk sizes of each put_stream call, per key
+        self.streamed = {}
+
+    async def put(self, key: str, data: bytes, content_type: str) -> str:
+        etag = hashlib.sha256(data).hexdigest()[:32]
+        self.entries[key] = {"content_type": content_type, "etag": etag, "size": len(data), "data": bytes(data)}
+        return etag
+
+    async def put_stream(self, key: str, chunks, content_type: str) -> str:
+        sizes = self.streamed[key] = []
+        data = bytearray()
+        async for chunk in chunks:
+            sizes.append(len(chunk))
+            data += chunk
+        return await self.put(key, bytes(data), content_type)
+
+    async def head(self, key: str):
+        entry = self.entries.get(key)
+        return {k: v for k, v in entry.items() if k != "data"} if entry else None
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        return dict(entry) if entry else None
+
+    async def get_range(self, key: str, offset: int, length: int):
+        entry = self.entries.get(key)
+        return entry["data"][offset:offset + length] if entry else None
+
+    async def delete(self, key: str) -> bool:
+        return self.entries.pop(key, None) is not None
+
+    async def list_prefix(self, prefix: str) -> list:
+        return [{"key": k, "size": e["size"]} for k, e in sorted(self.entries.items()) if k.startswith(prefix)]
+
+    async def delete_prefix(self, prefix: str) -> int:
+        keys = [k for k in self.entries if k.startswith(prefix)]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self._collections = {}
+        self._binaries = {}
+        self._change_callbacks = {}
+        self._locks = {}
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def binary(self, name: str) -> MemoryBinaryStore:
+        if name not in self._binaries:
+            self._binaries[name] = MemoryBinaryStore()
+        return self._binaries[name]
+
+    def on_change(self, table: str, callback, fields=None):
+        watched = frozenset(fields) if fields is not None else None
+        self._change_callbacks.setdefault(table, []).append((callback, watched))
+
+    def _changed(self, table: str, fields=None):
+        for callback, watched in self._change_callbacks.get(table, []):
+            if watched is None or fields is None or not watched.isdisjoint(fields):
+                callback(table)
+
+    @asynccontextmanager
+    async def advisory_lock(self, name: str):
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            yield
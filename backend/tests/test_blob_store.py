@@ -0,0 +1,75 @@
+"""
+Blob store tests - backend interface and streamed writes
+"""
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+
+from blob_store import PG_READ_SIZE, AzureBlobStore, BlobStore, LocalFilesystemBlobStore, PostgresBlobStore
+from memory_db import MemoryDatabase
+
+
+class TestInterface:
+    """Backends must implement the whole BlobStore interface"""
+
+    def test_incomplete_backend_fails_on_creation(self):
+        class PutOnly(BlobStore):
+            async def put(self, data, content_type="application/octet-stream"):
+                return "key"
+
+        with pytest.raises(TypeError, match="iter_range"):
+            PutOnly()
+
+    @pytest.mark.parametrize("backend", [LocalFilesystemBlobStore, PostgresBlobStore, AzureBlobStore])
+    def test_backends_complete(self, backend):
+        assert not backend.__abstractmethods__
+
+
+class ReadRecorder(io.BytesIO):
+    """File object that records the size of every read"""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+class TestPostgresPutFile:
+    """Uploads are written to the postgres backend in bounded chunks"""
+
+    def test_multi_mb_upload_written_in_chunks(self):
+        data = os.urandom(5 * PG_READ_SIZE + 123)
+        key = hashlib.sha256(data).hexdigest()
+        binary = MemoryDatabase().binary("document_blobs")
+        store = PostgresBlobStore(binary)
+        fileobj = ReadRecorder(data)
+
+        async def run():
+            assert await store.put_file(fileobj, key, "application/pdf") == key
+            assert await store.get(key) == data
+            assert await store.size(key) == len(data)
+        asyncio.run(run())
+
+        assert binary.streamed[key] == [PG_READ_SIZE] * 5 + [123]
+        # Never the whole file at once
+        assert fileobj.reads and all(0 < size <= PG_READ_SIZE for size in fileobj.reads)
+
+    def test_existing_blob_not_rewritten(self):
+        data = b"x" * 1000
+        key = hashlib.sha256(data).hexdigest()
+        binary = MemoryDatabase().binary("document_blobs")
+        store = PostgresBlobStore(binary)
+
+        async def run():
+            await store.put(data)
+            fileobj = ReadRecorder(data)
+            assert await store.put_file(fileobj, key) == key
+            assert fileobj.reads == []
+        asyncio.run(run())
+        assert key not in binary.streamed
@@ -0,0 +1,86 @@
+"""
+Compression tests - packing large fields into the zstd side column and back
+"""
+import pytest
+
+from compression import PACKED_MARKER, FieldCompressor, train_dictionary
+
+HTML = "<html><body>" + "<p>Sehr geehrte Damen und Herren, anbei die Unterlagen.</p>" * 200 + "</body></html>"
+
+
+def make_compressor(table: str = "test_kommunikation") -> FieldCompressor:
+    return FieldCompressor(table, ["inhalt", "anhaenge"])
+
+
+class TestPackRestore:
+    """pack() and restore() round-trip documents unchanged"""
+
+    def test_round_trip(self):
+        compressor = make_compressor()
+        doc = {"id": "k1", "betreff": "Anfrage", "inhalt": HTML, "anhaenge": [{"name": "a.pdf", "size": 1}] * 100}
+        stored, blob = compressor.pack(doc)
+
+        assert blob is not None
+        assert len(blob) < len(HTML) / 5
+        assert "inhalt" not in stored and "anhaenge" not in stored
+        assert stored[PACKED_MARKER] == ["anhaenge", "inhalt"]
+        assert compressor.restore(dict(stored), blob) == doc
+
+    def test_small_values_stay_inline(self):
+        compressor = make_compressor()
+        doc = {"id": "k2", "inhalt": "kurz", "anhaenge": None}
+        stored, blob = compressor.pack(doc)
+        assert blob is None
+        assert stored == doc
+        assert compressor.restore(dict(stored), blob) == doc
+
+    def test_repack_drops_stale_marker(self):
+        compressor = make_compressor()
+        stored, blob = compressor.pack({"id": "k3", "inhalt": HTML})
+        # Field shrank below min_size on update: it moves back inline
+        restored = compressor.restore(dict(stored), blob)
+        restored["inhalt"] = "gekürzt"
+        repacked, blob = compressor.pack({**restored, PACKED_MARKER: ["inhalt"]})
+        assert blob is None
+        assert repacked == {"id": "k3", "inhalt": "gekürzt"}
+
+    @pytest.mark.parametrize("projection,expected", [
+        (None, {"id", "inhalt", "anhaenge"}),
+        ({"inhalt": 0}, {"id", "anhaenge"}),
+        ({"id": 1, "inhalt": 1}, {"id", "inhalt"}),
+    ])
+    def test_restore_honours_projection(self, projection, expected):
+        compressor = make_compressor()
+        stored, blob = compressor.pack({"id": "k4", "inhalt": HTML, "anhaenge": [HTML]})
+        if projection and set(projection.values()) == {1}:
+            stored = {k: v for k, v in stored.items() if k in projection or k == PACKED_MARKER}
+        assert set(compressor.restore(dict(stored), blob, projection)) == expected
+
+    def test_wants_packed(self):
+        compressor = make_compressor()
+        assert compressor.wants_packed(None)
+        assert compressor.wants_packed({"_id": 0})
+        assert not compressor.wants_packed({"inhalt": 0, "anhaenge": 0})
+        assert not compressor.wants_packed({"id": 1, "betreff": 1})
+        assert compressor.wants_packed({"id": 1, "inhalt": 1})
+
+
+class TestDictionaries:
+    """Values stay readable after the active dictionary changes"""
+
+    def test_old_frames_readable_after_new_dictionary(self):
+        samples = [f'{{"inhalt": "Anfrage {i}: Pflege-WG Zimmer frei? {HTML[:300]}"}}'.encode() for i in range(200)]
+        dictionary = train_dictionary(samples, dict_size=4096)
+
+        compressor = make_compressor()
+        plain_stored, plain_blob = compressor.pack({"id": "a", "inhalt": HTML})
+        dict_id = compressor.add_dictionary(dictionary)
+        assert compressor.dictionary_id == dict_id
+        dict_stored, dict_blob = compressor.pack({"id": "b", "inhalt": HTML})
+
+        assert compressor.restore(dict(plain_stored), plain_blob)["inhalt"] == HTML
+        assert compressor.restore(dict(dict_stored), dict_blob)["inhalt"] == HTML
+
+        # A process without the dictionary cannot guess the content
+        with pytest.raises(LookupError):
+            make_compressor().unpack(dict_blob)
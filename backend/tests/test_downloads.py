@@ -0,0 +1,102 @@
+"""
+Download tests - Range parsing, partial content and conditional GET
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from blob_store import LocalFilesystemBlobStore
+from downloads import _parse_range, blob_download, bytes_download
+
+CONTENT = bytes(range(256)) * 1000  # 256000 bytes
+ETAG = '"abc123"'
+
+
+class TestParseRange:
+    """_parse_range: single byte ranges per RFC 9110"""
+
+    @pytest.mark.parametrize("header,expected", [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=999-999", (999, 999)),
+    ])
+    def test_satisfiable(self, header, expected):
+        assert _parse_range(header, 1000) == expected
+
+    @pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-2000", "bytes=50-10", "bytes=-0"])
+    def test_unsatisfiable(self, header):
+        assert _parse_range(header, 1000) is False
+
+    @pytest.mark.parametrize("header", [None, "", "bytes=-", "bytes=0-10,20-30", "items=0-10", "bytes=a-b"])
+    def test_ignored(self, header):
+        """Missing, malformed and multi-range headers serve the full content"""
+        assert _parse_range(header, 1000) is None
+
+
+@pytest.fixture
+def client(tmp_path):
+    store = LocalFilesystemBlobStore(str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/bytes")
+    async def get_bytes(request: Request):
+        return await bytes_download(request, CONTENT, ETAG, content_type="application/pdf", filename="Übersicht.pdf")
+
+    @app.get("/blob/{key}")
+    async def get_blob(key: str, request: Request):
+        return await blob_download(request, store, key, content_type="application/pdf", filename="scan.pdf")
+
+    client = TestClient(app)
+    client.store = store
+    return client
+
+
+class TestStreamDownload:
+    """Full, partial and conditional responses"""
+
+    def test_full(self, client):
+        response = client.get("/bytes")
+        assert response.status_code == 200
+        assert response.content == CONTENT
+        assert response.headers["content-length"] == str(len(CONTENT))
+        assert response.headers["accept-ranges"] == "bytes"
+        assert "filename*=UTF-8''%C3%9Cbersicht.pdf" in response.headers["content-disposition"]
+
+    def test_partial(self, client):
+        response = client.get("/bytes", headers={"Range": "bytes=100000-165535"})
+        assert response.status_code == 206
+        assert response.content == CONTENT[100000:165536]
+        assert response.headers["content-range"] == f"bytes 100000-165535/{len(CONTENT)}"
+        assert response.headers["content-length"] == "65536"
+
+    def test_unsatisfiable_range_is_416(self, client):
+        response = client.get("/bytes", headers={"Range": f"bytes={len(CONTENT)}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+        assert response.content == b""
+
+    def test_if_none_match_is_304(self, client):
+        response = client.get("/bytes", headers={"If-None-Match": f'"other", {ETAG}'})
+        assert response.status_code == 304
+        assert response.headers["etag"] == ETAG
+        assert response.content == b""
+
+    def test_stale_if_range_serves_full_content(self, client):
+        response = client.get("/bytes", headers={"Range": "bytes=0-9", "If-Range": '"outdated"'})
+        assert response.status_code == 200
+        assert response.content == CONTENT
+
+    def test_blob_range_and_revalidation(self, client):
+        key = asyncio.run(client.store.put(CONTENT))
+        response = client.get(f"/blob/{key}", headers={"Range": "bytes=-10"})
+        assert response.status_code == 206
+        assert response.content == CONTENT[-10:]
+
+        etag = response.headers["etag"]
+        assert etag == f'"{key[:32]}"'
+        assert client.get(f"/blob/{key}", headers={"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,161 @@
+"""
+Graph subscription tests - webhook handshake, clientState and ownership
+
+Runs the backend app and scripts/graph_stub.py in-process: both sides'
+HTTP clients are routed to the ASGI apps by host name (graph / backend).
+"""
+import asyncio
+import importlib.util
+from pathlib import Path
+
+import httpx
+import pytest
+
+import email_service
+import graph_subscriptions
+import server
+from graph_subscriptions import InboxSubscription
+from memory_db import MemoryDatabase
+
+SECRET = "stub-secret"
+NOTIFICATION_URL = "http://backend/api/graph/notifications"
+
+_spec = importlib.util.spec_from_file_location(
+    "graph_stub", Path(__file__).resolve().parents[2] / "scripts" / "graph_stub.py"
+)
+graph_stub = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(graph_stub)
+
+
+_AsyncClient = httpx.AsyncClient
+
+
+class HostRouter(httpx.AsyncBaseTransport):
+    """Sends each request to the ASGI app registered for its host"""
+
+    def __init__(self, apps: dict):
+        self.transports = {host: httpx.ASGITransport(app=app) for host, app in apps.items()}
+
+    async def handle_async_request(self, request):
+        return await self.transports[request.url.host].handle_async_request(request)
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    stub_state = (graph_stub.messages, graph_stub.subscriptions, graph_stub.sent, graph_stub.drafts, graph_stub.uploads)
+    for state in stub_state:
+        state.clear()
+    router = HostRouter({"graph": graph_stub.app, "backend": server.app})
+    # The stub opens a new client per handshake / notification
+    monkeypatch.setattr(graph_stub.httpx, "AsyncClient", lambda **kwargs: _AsyncClient(transport=router))
+    monkeypatch.setattr(email_service, "_client", _AsyncClient(transport=router))
+    monkeypatch.setattr(email_service, "TOKEN_URL", "http://graph/token")
+    monkeypatch.setattr(email_service, "GRAPH_BASE", "http://graph/v1.0")
+    for name in ("TENANT_ID", "CLIENT_ID", "CLIENT_SECRET"):
+        monkeypatch.setattr(email_service, name, "stub")
+    monkeypatch.setitem(email_service._token_cache, "access_token", "")
+    monkeypatch.setitem(email_service._token_cache, "expires_at", 0)
+    monkeypatch.setattr(graph_subscriptions, "GRAPH_NOTIFICATION_URL", NOTIFICATION_URL)
+    monkeypatch.setattr(graph_subscriptions, "GRAPH_WEBHOOK_SECRET", SECRET)
+    db = MemoryDatabase()
+    subscription = InboxSubscription(db)
+    monkeypatch.setattr(server, "inbox_subscription", subscription)
+    subscription.stub = _AsyncClient(transport=router, base_url="http://graph")
+    subscription.backend = _AsyncClient(transport=router, base_url="http://backend")
+    return subscription
+
+
+class TestWebhook:
+    """The notification endpoint answers the handshake and checks clientState"""
+
+    def test_subscription_created_after_validation(self, graph):
+        async def run():
+            await graph._maintain()
+            assert len(graph_stub.subscriptions) == 1
+            created = next(iter(graph_stub.subscriptions.values()))
+            assert created["notificationUrl"] == NOTIFICATION_URL
+            state = await graph.db.mail_sync_state.find_one({"id": "subscription"})
+            assert state["subscription_id"] == created["id"]
+            assert graph.active
+        asyncio.run(run())
+
+    def test_failed_validation_creates_nothing(self, graph, monkeypatch):
+        monkeypatch.setattr(graph_subscriptions, "GRAPH_NOTIFICATION_URL", "http://backend/api/health")
+
+        async def run():
+            with pytest.raises(httpx.HTTPStatusError):
+                await graph._maintain()
+            assert graph_stub.subscriptions == {}
+            assert await graph.db.mail_sync_state.find_one({"id": "subscription"}) is None
+        asyncio.run(run())
+
+    def test_new_message_wakes_sync(self, graph):
+        async def run():
+            await graph._maintain()
+            graph._wakeup.clear()
+            resp = await graph.stub.post("/_stub/messages", json={"subject": "Anfrage", "from": "max@example.de"})
+            assert resp.status_code == 200
+            assert graph._wakeup.is_set()
+        asyncio.run(run())
+
+    def test_wrong_client_state_rejected(self, graph):
+        async def run():
+            rejected = graph_subscriptions.rejected_total.value
+            resp = await graph.backend.post("/api/graph/notifications", json={"value": [
+                {"subscriptionId": "x", "clientState": "guessed", "changeType": "created"},
+            ]})
+            assert resp.status_code == 403
+            resp = await graph.backend.post("/api/graph/notifications", content=b"not json")
+            assert resp.status_code == 400
+            # Handshake: the token comes back as plain text
+            resp = await graph.backend.post("/api/graph/notifications", params={"validationToken": "abc 123"})
+            assert resp.text == "abc 123"
+            assert resp.headers["content-type"].startswith("text/plain")
+            assert graph_subscriptions.rejected_total.value == rejected + 1
+            assert not graph._wakeup.is_set()
+        asyncio.run(run())
+
+    def test_subscription_removed_triggers_new_subscription(self, graph):
+        async def run():
+            await graph._maintain()
+            old_id = graph.subscription["subscription_id"]
+            await graph.stub.post("/_stub/lifecycle/subscriptionRemoved")
+            assert graph._renew.is_set()
+            await graph._maintain(force=True)
+            assert list(graph_stub.subscriptions) == [graph.subscription["subscription_id"]]
+            assert graph.subscription["subscription_id"] != old_id
+        asyncio.run(run())
+
+
+class TestOwnership:
+    """Workers sharing a database keep one subscription between them"""
+
+    def test_concurrent_workers_create_one_subscription(self, graph):
+        workers = [graph] + [InboxSubscription(graph.db) for _ in range(3)]
+
+        async def run():
+            await asyncio.gather(*(worker._maintain() for worker in workers))
+            assert len(graph_stub.subscriptions) == 1
+            assert {worker.subscription["subscription_id"] for worker in workers} == set(graph_stub.subscriptions)
+        asyncio.run(run())
+
+    def test_forced_renewal_reuses_one_made_after_the_request(self, graph, monkeypatch):
+        other = InboxSubscription(graph.db)
+        calls = []
+        renew = email_service.renew_subscription
+
+        async def counting(subscription_id, expires_at):
+            calls.append(subscription_id)
+            return await renew(subscription_id, expires_at)
+        monkeypatch.setattr(email_service, "renew_subscription", counting)
+
+        async def run():
+            await graph._maintain()
+            # Both workers were asked to reauthorize; the first one renews
+            for worker in (graph, other):
+                worker.handle({"value": [{"clientState": SECRET, "lifecycleEvent": "reauthorizationRequired"}]})
+            await graph._maintain(force=True)
+            await other._maintain(force=True)
+            assert len(calls) == 1
+            assert other.subscription["subscription_id"] == graph.subscription["subscription_id"]
+        asyncio.run(run())
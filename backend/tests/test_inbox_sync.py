@@ -0,0 +1,235 @@
+"""
+Inbox sync tests - delta link advancement, failed emails and duplicate claims
+"""
+import asyncio
+
+import pytest
+
+import email_service
+import server
+from memory_db import MemoryDatabase
+from routing_index import RoutingIndex
+
+POISON = "poison@example.de"
+
+
+def message(message_id: str, sender: str = "max@example.de", subject: str = "Hallo", is_read: bool = False) -> dict:
+    return {
+        "id": message_id, "subject": subject, "body": "Text", "from_email": sender, "from_name": "",
+        "received_at": "", "has_attachments": False, "is_read": is_read,
+    }
+
+
+class Mailbox:
+    """Delta pages per link; the initial sync uses the link None"""
+
+    def __init__(self):
+        self.pages = {}
+        self.read = []
+        self.requested = []
+
+    async def iter_inbox_delta(self, delta_link=None):
+        self.requested.append(delta_link)
+        for page in self.pages.get(delta_link, [{"messages": [], "delta_link": delta_link}]):
+            yield page
+
+    async def mark_many_as_read(self, message_ids):
+        self.read.extend(message_ids)
+        # Delta reports the current state: replayed pages show them as read
+        for pages in self.pages.values():
+            for page in pages:
+                for email in page["messages"]:
+                    if email["id"] in message_ids:
+                        email["is_read"] = True
+        return set(message_ids)
+
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    db = MemoryDatabase()
+    asyncio.run(db.email_eingang.create_index("message_id", unique=True))
+    index = RoutingIndex(db)
+    mailbox = Mailbox()
+
+    async def by_email(email):
+        if email == POISON:
+            raise ValueError("cannot route")
+        return await RoutingIndex.by_email(index, email)
+
+    async def no_summary(komm_id, text):
+        pass
+
+    monkeypatch.setattr(index, "by_email", by_email)
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "routing_index", index)
+    monkeypatch.setattr(server, "generate_and_store_summary", no_summary)
+    monkeypatch.setattr(email_service, "iter_inbox_delta", mailbox.iter_inbox_delta)
+    monkeypatch.setattr(email_service, "mark_many_as_read", mailbox.mark_many_as_read)
+    mailbox.db = db
+    return mailbox
+
+
+async def stored_link(db):
+    state = await db.mail_sync_state.find_one({"id": "inbox"})
+    return state["delta_link"] if state else None
+
+
+class TestDeltaLink:
+    """The delta link advances once every email of the sync is settled"""
+
+    def test_initial_sync_stores_last_link(self, mailbox):
+        mailbox.pages[None] = [
+            {"messages": [message("m1"), message("m2", is_read=True)], "delta_link": None},
+            {"messages": [message("m3")], "delta_link": "link-1"},
+        ]
+
+        async def run():
+            await server.process_incoming_emails()
+            assert await stored_link(mailbox.db) == "link-1"
+            # Already read mails are not processed
+            assert mailbox.read == ["m1", "m3"]
+            assert await mailbox.db.email_allgemein.count_documents({}) == 2
+            # The next sync continues from the stored link
+            await server.process_incoming_emails()
+            assert mailbox.requested == [None, "link-1"]
+        asyncio.run(run())
+
+    def test_repeated_message_processed_once(self, mailbox):
+        mailbox.pages[None] = [{"messages": [message("m1")], "delta_link": "link-1"}]
+        mailbox.pages["link-1"] = [{"messages": [message("m1")], "delta_link": "link-2"}]
+
+        async def run():
+            await server.process_incoming_emails()
+            await server.process_incoming_emails()
+            assert await stored_link(mailbox.db) == "link-2"
+            assert await mailbox.db.email_allgemein.count_documents({}) == 1
+        asyncio.run(run())
+
+    def test_deferred_email_holds_link(self, mailbox):
+        mailbox.pages[None] = [{"messages": [message("m1")], "delta_link": "link-1"}]
+
+        async def run():
+            # Another worker claimed m1 a moment ago
+            assert await server.claim_incoming_email("m1") == "claimed"
+            await server.process_incoming_emails()
+            assert await stored_link(mailbox.db) is None
+            assert mailbox.read == []
+        asyncio.run(run())
+
+    def test_expired_link_restarts_initial_sync(self, mailbox, monkeypatch):
+        mailbox.pages[None] = [{"messages": [message("m1")], "delta_link": "link-2"}]
+
+        async def expired(delta_link=None):
+            if delta_link:
+                raise email_service.DeltaExpired("SyncStateNotFound")
+            async for page in mailbox.iter_inbox_delta(None):
+                yield page
+        monkeypatch.setattr(email_service, "iter_inbox_delta", expired)
+
+        async def run():
+            await mailbox.db.mail_sync_state.insert_one({"id": "inbox", "delta_link": "link-1"})
+            await server.process_incoming_emails()
+            assert await stored_link(mailbox.db) == "link-2"
+        asyncio.run(run())
+
+
+class TestPoisonEmail:
+    """A permanently failing email is given up after EMAIL_MAX_ATTEMPTS syncs"""
+
+    def test_given_up_after_max_attempts(self, mailbox, monkeypatch):
+        monkeypatch.setattr(server, "EMAIL_MAX_ATTEMPTS", 3)
+        mailbox.pages[None] = [{"messages": [message("m1"), message("bad", sender=POISON)], "delta_link": "link-1"}]
+
+        async def run():
+            for attempt in range(1, 3):
+                await server.process_incoming_emails()
+                # Retried from the old position while attempts remain
+                assert await stored_link(mailbox.db) is None
+                entry = await mailbox.db.email_eingang.find_one({"message_id": "bad"})
+                assert entry["status"] == "fehlgeschlagen"
+                assert entry["versuche"] == attempt
+                assert "cannot route" in entry["fehler"]
+
+            await server.process_incoming_emails()
+            entry = await mailbox.db.email_eingang.find_one({"message_id": "bad"})
+            assert entry["status"] == "aufgegeben"
+            assert entry["versuche"] == 3
+            assert await stored_link(mailbox.db) == "link-1"
+            # The good email was processed once; the given-up one stays unread
+            assert mailbox.read == ["m1"]
+            assert await mailbox.db.email_allgemein.count_documents({}) == 1
+
+            # Seen again (e.g. after an expired link): skipped without a new attempt
+            assert await server.process_incoming_email(message("bad", sender=POISON)) == "aufgegeben"
+        asyncio.run(run())
+
+    def test_retry_succeeds_after_transient_failure(self, mailbox, monkeypatch):
+        mailbox.pages[None] = [{"messages": [message("m1")], "delta_link": "link-1"}]
+        original = server.routing_index.by_email
+        calls = []
+
+        async def flaky(email):
+            calls.append(email)
+            if len(calls) == 1:
+                raise ConnectionError("database unavailable")
+            return await original(email)
+        monkeypatch.setattr(server.routing_index, "by_email", flaky)
+
+        async def run():
+            await server.process_incoming_emails()
+            assert await stored_link(mailbox.db) is None
+            await server.process_incoming_emails()
+            assert await stored_link(mailbox.db) == "link-1"
+            entry = await mailbox.db.email_eingang.find_one({"message_id": "m1"})
+            assert entry["status"] == "verarbeitet"
+            assert entry["versuche"] == 1
+            assert mailbox.read == ["m1"]
+        asyncio.run(run())
+
+
+class TestClaim:
+    """The email_eingang ledger lets exactly one worker process a message"""
+
+    def test_concurrent_duplicates_processed_once(self, mailbox):
+        async def run():
+            email = message("m1")
+            results = await asyncio.gather(*(server.process_incoming_email(dict(email)) for _ in range(3)))
+            # Depending on timing the others see the claim or the finished entry
+            assert "verarbeitet" in results
+            assert set(results) <= {"verarbeitet", "in_bearbeitung"}
+            assert await mailbox.db.email_allgemein.count_documents({}) == 1
+            assert await mailbox.db.email_eingang.count_documents({"message_id": "m1"}) == 1
+            # Processed: a later delivery of the same message is skipped
+            assert await server.claim_incoming_email("m1") == "verarbeitet"
+        asyncio.run(run())
+
+    def test_stale_claim_taken_over(self, mailbox):
+        async def run():
+            await mailbox.db.email_eingang.insert_one({
+                "id": "e1", "message_id": "m1", "status": "in_bearbeitung",
+                "claimed_at": "2020-01-01T00:00:00+00:00", "versuche": 0,
+            })
+            assert await server.process_incoming_email(message("m1")) == "verarbeitet"
+            assert await mailbox.db.email_allgemein.count_documents({}) == 1
+        asyncio.run(run())
+
+    def test_inquiries_from_one_sender_create_one_klient(self, mailbox):
+        async def run():
+            emails = [message(f"m{i}", sender="familie@example.de", subject="Anfrage Pflege-WG") for i in range(4)]
+            results = await asyncio.gather(*(server.process_incoming_email(email) for email in emails))
+            assert results == ["verarbeitet"] * 4
+            assert await mailbox.db.klienten.count_documents({}) == 1
+            assert await mailbox.db.klient_kommunikation.count_documents({}) == 4
+        asyncio.run(run())
+
+    def test_inquiry_matches_existing_sender_in_any_case(self, mailbox):
+        async def run():
+            await server.process_incoming_email(message("m1", sender="Familie@Example.de", subject="Anfrage"))
+            klient = await mailbox.db.klienten.find_one({})
+            assert klient["kontakt_email"] == "familie@example.de"
+            # The routing index may lag behind: the table lookup must match as well
+            server.routing_index._dirty = False
+            await server.process_incoming_email(message("m2", sender="FAMILIE@example.de", subject="Anfrage Platz"))
+            assert await mailbox.db.klienten.count_documents({}) == 1
+            assert await mailbox.db.klient_kommunikation.count_documents({"klient_id": klient["id"]}) == 2
+        asyncio.run(run())
@@ -0,0 +1,80 @@
+"""
+Klient email tests - document attachments with missing content
+"""
+import asyncio
+
+import pytest
+
+import email_service
+import server
+from blob_store import PostgresBlobStore
+from memory_db import MemoryDatabase
+
+USER = {"name": "Test Benutzer"}
+
+
+class Outbox:
+    def __init__(self, db):
+        self.db = db
+        self.sent = []
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    db = MemoryDatabase()
+    outbox = Outbox(db)
+
+    async def send_email(to, subject, body, attachments=None):
+        outbox.sent.append({"to": to, "subject": subject, "attachments": [a.name for a in attachments or []]})
+        return True
+
+    async def no_summary(komm_id, text):
+        pass
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "blob_store", PostgresBlobStore(db.binary("document_blobs")))
+    monkeypatch.setattr(server, "generate_and_store_summary", no_summary)
+    monkeypatch.setattr(email_service, "send_email", send_email)
+
+    async def seed():
+        await db.klienten.insert_one({"id": "k1", "kontakt_email": "familie@example.de"})
+        key = await server.blob_store.put(b"%PDF-1.4 vertrag", "application/pdf")
+        await db.klient_dokumente.insert_many([
+            {"id": "d1", "klient_id": "k1", "name": "Vertrag.pdf", "file_type": "application/pdf", "blob_key": key},
+            # Content lost (e.g. blob deleted): must not be reported as sent
+            {"id": "d2", "klient_id": "k1", "name": "Ausweis.pdf", "file_type": "application/pdf",
+             "blob_key": "missing"},
+        ])
+    asyncio.run(seed())
+    return outbox
+
+
+class TestMissingAttachment:
+    """Documents without content are reported instead of listed as attached"""
+
+    def test_missing_document_reported(self, outbox):
+        async def run():
+            result = await server.send_klient_email(
+                "k1", {"betreff": "Unterlagen", "inhalt": "Anbei", "dokument_ids": ["d1", "d2"]}, current_user=USER
+            )
+            assert outbox.sent[0]["attachments"] == ["Vertrag.pdf"]
+            assert result["fehlende_anhaenge"] == ["Ausweis.pdf"]
+            komm = result["kommunikation"]
+            assert komm["anhaenge"] == ["Vertrag.pdf"]
+            assert "Anhänge: Vertrag.pdf" in komm["inhalt"]
+            assert "Nicht angehängt (Datei fehlt): Ausweis.pdf" in komm["inhalt"]
+            aktivitaet = await outbox.db.klient_aktivitaeten.find_one({"klient_id": "k1"})
+            assert "mit 1 Anhängen" in aktivitaet["aktion"]
+            # Only the attached document is marked as sent
+            assert (await outbox.db.klient_dokumente.find_one({"id": "d1"}))["status"] == "gesendet"
+            assert "status" not in await outbox.db.klient_dokumente.find_one({"id": "d2"})
+        asyncio.run(run())
+
+    def test_all_attached(self, outbox):
+        async def run():
+            result = await server.send_klient_email(
+                "k1", {"inhalt": "Anbei", "dokument_ids": ["d1"]}, current_user=USER
+            )
+            assert result["fehlende_anhaenge"] == []
+            assert "Nicht angehängt" not in result["kommunikation"]["inhalt"]
+        asyncio.run(run())
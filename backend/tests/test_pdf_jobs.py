@@ -0,0 +1,67 @@
+"""
+PDF job tests - jobs abandoned by a dead API process
+"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+import pdf_jobs
+from memory_db import MemoryDatabase
+from pdf_jobs import FEHLER, FERTIG, LAUFEND, WARTEND, PdfJobService
+
+LONG_AGO = "2020-01-01T00:00:00+00:00"
+
+
+def iso(delta: timedelta = timedelta(0)) -> str:
+    return (pdf_jobs._now() + delta).isoformat()
+
+
+@pytest.fixture
+def service():
+    return PdfJobService(MemoryDatabase())
+
+
+async def add_job(service, job_id, status, heartbeat_at=None):
+    job = {"id": job_id, "status": status, "created_at": LONG_AGO, "expires_at": iso(timedelta(hours=1))}
+    if heartbeat_at:
+        job["heartbeat_at"] = heartbeat_at
+    await service.jobs.insert_one(job)
+
+
+class TestStaleJobs:
+    """Unfinished jobs without heartbeat are failed instead of hanging until their TTL"""
+
+    def test_recover_stale(self, service):
+        async def run():
+            await add_job(service, "dead", LAUFEND, heartbeat_at=LONG_AGO)
+            await add_job(service, "queued-legacy", WARTEND)
+            await add_job(service, "alive", LAUFEND, heartbeat_at=iso())
+            await add_job(service, "done", FERTIG, heartbeat_at=LONG_AGO)
+            marked = await service.recover_stale()
+            return marked, {job["id"]: job for job in service.jobs.docs}
+
+        marked, jobs = asyncio.run(run())
+        assert marked == 2
+        assert jobs["dead"]["status"] == FEHLER and "neu gestartet" in jobs["dead"]["fehler"]
+        assert jobs["queued-legacy"]["status"] == FEHLER
+        assert jobs["alive"]["status"] == LAUFEND
+        assert jobs["done"]["status"] == FERTIG
+
+    def test_waiter_gets_failure(self, service):
+        async def run():
+            await add_job(service, "dead", LAUFEND, heartbeat_at=iso(-pdf_jobs.STALE_AFTER - timedelta(seconds=1)))
+            return await service.wait("dead", timeout=5)
+
+        assert asyncio.run(run())["status"] == FEHLER
+
+    def test_heartbeat_keeps_job_alive(self, service, monkeypatch):
+        monkeypatch.setattr(pdf_jobs, "HEARTBEAT_SECONDS", 0.01)
+
+        async def run():
+            await add_job(service, "running", LAUFEND, heartbeat_at=LONG_AGO)
+            async with service._heartbeat(service.jobs, "running"):
+                await asyncio.sleep(0.05)
+            return await service.get("running")
+
+        assert asyncio.run(run())["status"] == LAUFEND
@@ -0,0 +1,59 @@
+"""
+PDF optimizer tests - image downsampling, byte budget and PdfTooLarge
+"""
+import io
+import os
+
+import pytest
+from PIL import Image
+from pypdf import PdfReader
+
+from pdf_optimizer import PdfTooLarge, optimize_pdf
+
+
+def pdf_with_photo(pixels: int = 2400) -> bytes:
+    """One A4-ish page showing a noisy photo far larger than 150 DPI needs."""
+    photo = Image.frombytes("RGB", (pixels, pixels), os.urandom(pixels * pixels * 3))
+    output = io.BytesIO()
+    photo.save(output, format="PDF", resolution=pixels / 8.27, quality=95)
+    return output.getvalue()
+
+
+@pytest.fixture(scope="module")
+def photo_pdf():
+    return pdf_with_photo()
+
+
+class TestOptimizePdf:
+    """optimize_pdf shrinks images to the target DPI and enforces the budget"""
+
+    def test_first_pass_within_budget(self, photo_pdf):
+        optimized, stats = optimize_pdf(photo_pdf, budget=len(photo_pdf))
+        assert stats["passes"] == 1
+        assert stats["images_downsampled"] == 1
+        assert stats["original_bytes"] == len(photo_pdf)
+        assert stats["optimized_bytes"] == len(optimized) < len(photo_pdf) / 2
+
+        reader = PdfReader(io.BytesIO(optimized))
+        assert len(reader.pages) == 1
+        assert max(reader.pages[0].images[0].image.size) <= int(8.27 * stats["dpi"])
+
+    def test_lower_dpi_passes_when_over_budget(self, photo_pdf):
+        first, _ = optimize_pdf(photo_pdf, budget=len(photo_pdf))
+        optimized, stats = optimize_pdf(photo_pdf, budget=len(first) - 1)
+        assert stats["passes"] > 1
+        assert stats["dpi"] < 150
+        assert len(optimized) < len(first)
+
+    def test_too_large(self, photo_pdf):
+        with pytest.raises(PdfTooLarge) as raised:
+            optimize_pdf(photo_pdf, budget=1024)
+        assert raised.value.budget == 1024
+        assert raised.value.size > 1024
+        assert "budget 1024" in str(raised.value)
+
+    def test_never_grows(self):
+        small = pdf_with_photo(200)
+        optimized, stats = optimize_pdf(small, budget=len(small))
+        assert len(optimized) <= len(small)
+        assert stats["images_downsampled"] == 0
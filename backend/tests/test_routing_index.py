@@ -0,0 +1,161 @@
+"""
+Routing index tests - key normalisation, lookups and invalidation
+"""
+import asyncio
+
+import pytest
+
+from memory_db import MemoryDatabase
+from routing_index import RoutingIndex, normalize_email, normalize_phone
+
+OLDEST = "aaaaaaaa-0000-0000-0000-000000000001"
+NEWER = "bbbbbbbb-0000-0000-0000-000000000002"
+TWIN = "bbbbbbbb-0000-0000-0000-000000000003"
+
+
+class TestNormalize:
+    """Contact details in any common notation map to one key"""
+
+    @pytest.mark.parametrize("phone", [
+        "+49 30 1234567",
+        "+49 (30) 123-4567",
+        "0049 30 1234567",
+        "030 1234567",
+        "030/123 45 67",
+        "whatsapp:+49301234567",
+        "49301234567",
+    ])
+    def test_phone_notations(self, phone):
+        assert normalize_phone(phone) == "+49301234567"
+
+    def test_phone_default_country_code(self, monkeypatch):
+        monkeypatch.setattr("routing_index.DEFAULT_COUNTRY_CODE", "43")
+        assert normalize_phone("0664 1234567") == "+436641234567"
+        # Explicit country codes are kept
+        assert normalize_phone("+49 30 1234567") == "+49301234567"
+
+    @pytest.mark.parametrize("phone", [None, "", "  ", "whatsapp:", "n/a"])
+    def test_phone_without_digits(self, phone):
+        assert normalize_phone(phone) is None
+
+    def test_email(self):
+        assert normalize_email("  Max.Mustermann@Example.DE ") == "max.mustermann@example.de"
+        assert normalize_email("") is None
+        assert normalize_email(None) is None
+
+
+@pytest.fixture
+def index():
+    db = MemoryDatabase()
+    index = RoutingIndex(db)
+
+    async def seed():
+        await db.klienten.insert_many([
+            {"id": NEWER, "kontakt_email": "familie@example.de", "kontakt_telefon": "030 1234567",
+             "created_at": "2024-02-01T00:00:00+00:00"},
+            {"id": OLDEST, "kontakt_email": "Familie@Example.de", "kontakt_telefon": None,
+             "created_at": "2024-01-01T00:00:00+00:00"},
+            {"id": TWIN, "kontakt_email": "other@example.de", "kontakt_telefon": "+49 40 555",
+             "created_at": "2024-03-01T00:00:00+00:00"},
+        ])
+    asyncio.run(seed())
+    return index
+
+
+def count_loads(index, monkeypatch) -> list:
+    loads = []
+    load = index._load
+
+    async def counting():
+        loads.append(1)
+        return await load()
+    monkeypatch.setattr(index, "_load", counting)
+    return loads
+
+
+class TestLookup:
+    """Lookups hit the normalised snapshot"""
+
+    def test_by_email_ignores_case_and_prefers_oldest(self, index):
+        async def run():
+            assert await index.by_email("FAMILIE@example.de ") == OLDEST
+            assert await index.by_email("other@EXAMPLE.de") == TWIN
+            assert await index.by_email("unknown@example.de") is None
+            assert await index.by_email("") is None
+        asyncio.run(run())
+
+    def test_by_phone_any_notation(self, index):
+        async def run():
+            assert await index.by_phone("+49 30 1234567") == NEWER
+            assert await index.by_phone("whatsapp:+4940555") == TWIN
+            assert await index.by_phone("+49 89 1") is None
+        asyncio.run(run())
+
+    def test_ambiguous_id_prefix_not_routed(self, index):
+        async def run():
+            assert await index.by_id_prefix("AAAAAAAA") == OLDEST
+            # NEWER and TWIN share the prefix
+            assert await index.by_id_prefix("bbbbbbbb") is None
+        asyncio.run(run())
+
+    def test_find_by_email_asks_table(self, index):
+        async def run():
+            await index.setup()
+            await index.snapshot()
+            index._dirty = False
+            await index.db.klienten.insert_one(
+                {"id": "c", "kontakt_email": "neu@example.de", "created_at": "2024-04-01"}
+            )
+            assert await index.find_by_email("Neu@Example.DE ") == "c"
+            assert await index.find_by_email("FAMILIE@example.de") == OLDEST
+            # Exact matches only
+            assert await index.find_by_email("example.de") is None
+            assert await index.find_by_email("familie_example.de") is None
+            assert await index.find_by_email("") is None
+        asyncio.run(run())
+
+    def test_setup_normalises_stored_emails(self, index):
+        async def run():
+            await index.setup()
+            oldest = await index.db.klienten.find_one({"id": OLDEST})
+            assert oldest["kontakt_email"] == "familie@example.de"
+            assert await index.db.klienten.count_documents({"kontakt_email": "familie@example.de"}) == 2
+            assert "kontakt_email" in index.db.klienten.indexes
+        asyncio.run(run())
+
+
+class TestInvalidation:
+    """Only writes that affect routing reload the snapshot"""
+
+    def test_unrelated_update_keeps_snapshot(self, index, monkeypatch):
+        loads = count_loads(index, monkeypatch)
+
+        async def run():
+            await index.by_email("familie@example.de")
+            await index.db.klienten.update_one({"id": NEWER}, {"$set": {"status": "bewohner", "notizen": "x"}})
+            await index.by_email("familie@example.de")
+            assert len(loads) == 1
+        asyncio.run(run())
+
+    def test_contact_update_reloads(self, index, monkeypatch):
+        loads = count_loads(index, monkeypatch)
+
+        async def run():
+            assert await index.by_email("other@example.de") == TWIN
+            await index.db.klienten.update_one({"id": TWIN}, {"$set": {"kontakt_email": "neu@example.de"}})
+            assert await index.by_email("neu@example.de") == TWIN
+            assert await index.by_email("other@example.de") is None
+            assert len(loads) == 2
+        asyncio.run(run())
+
+    def test_insert_and_delete_reload(self, index, monkeypatch):
+        loads = count_loads(index, monkeypatch)
+
+        async def run():
+            await index.snapshot()
+            await index.db.klienten.insert_one({"id": "c", "kontakt_email": "c@example.de", "created_at": "2024-05-01"})
+            assert await index.by_email("c@example.de") == "c"
+            await index.db.klienten.delete_one({"id": "c"})
+            assert await index.by_email("c@example.de") is None
+            assert len(loads) == 3
+        asyncio.run(run())
@@ -0,0 +1,118 @@
+"""
+Ticket card tests - building, refreshing and reconciling the Handwerker read model
+"""
+import asyncio
+
+import pytest
+
+import ticket_cards
+from memory_db import MemoryDatabase
+from ticket_cards import CARD_VERSION, TicketCardProjector
+
+
+@pytest.fixture
+def projector():
+    db = MemoryDatabase()
+
+    async def seed():
+        await db.properties.insert_one({
+            "id": "p1", "name": "Haus A", "address": "Sterndamm 13", "postal_code": "12487", "city": "Berlin",
+        })
+        await db.units.insert_one({"id": "u1", "property_id": "p1", "is_vacant": False, "tenant_id": "c1"})
+        await db.contacts.insert_one({"id": "c1", "name": "Erika Muster", "phone": "030 123"})
+        await db.maintenance_tickets.insert_many([
+            {"id": "t1", "property_id": "p1", "title": "Heizung", "assigned_to_id": "h1",
+             "created_at": "2024-01-01T00:00:00+00:00"},
+            {"id": "t2", "property_id": "p1", "title": "Fenster", "created_at": "2024-01-02T00:00:00+00:00"},
+        ])
+        await db.ticket_photos.insert_one({
+            "id": "ph1", "ticket_id": "t1", "photo_url": "data:image/jpeg;base64,AAAA", "uploaded_at": "2024-01-03",
+        })
+        await db.work_reports.insert_one({"ticket_id": "t1", "material_cost": 40.0, "labor_cost": None})
+    asyncio.run(seed())
+    return TicketCardProjector(db)
+
+
+class TestBuild:
+    """A card contains everything the portal shows for a ticket"""
+
+    def test_card_contents(self, projector):
+        async def run():
+            card = await projector.build("t1")
+            assert card["card_version"] == CARD_VERSION
+            assert card["ticket_updated_at"] == "2024-01-01T00:00:00+00:00"
+            assert card["property_address"] == "Sterndamm 13, 12487 Berlin"
+            assert (card["tenant_name"], card["tenant_phone"]) == ("Erika Muster", "030 123")
+            assert card["work_report"]["total_cost"] == 40.0
+            # Photos are references, never the base64 data
+            assert card["photo_count"] == 1
+            assert card["photos"][0]["photo_url"] == "/api/photos/ph1/full"
+            assert await projector.build("missing") is None
+        asyncio.run(run())
+
+    def test_refresh_updates_and_removes(self, projector):
+        async def run():
+            await projector.refresh("t1")
+            await projector.db.maintenance_tickets.update_one({"id": "t1"}, {"$set": {"status": "Erledigt"}})
+            await projector.refresh("t1")
+            assert (await projector.cards.find_one({"id": "t1"}))["status"] == "Erledigt"
+            assert await projector.cards.count_documents({}) == 1
+            await projector.db.maintenance_tickets.delete_one({"id": "t1"})
+            await projector.refresh("t1")
+            assert await projector.cards.count_documents({}) == 0
+        asyncio.run(run())
+
+
+class TestSync:
+    """setup() reconciles cards with tickets at startup"""
+
+    def test_setup_builds_missing_cards(self, projector):
+        async def run():
+            await projector.setup()
+            assert sorted(c["id"] for c in await projector.cards.find({}).to_list(None)) == ["t1", "t2"]
+            # Nothing to do the second time
+            assert await projector.sync() == 0
+        asyncio.run(run())
+
+    def test_sync_rebuilds_outdated_and_removes_orphans(self, projector):
+        async def run():
+            await projector.setup()
+            # Written while no process was running: ticket changed, ticket deleted
+            await projector.db.maintenance_tickets.update_one(
+                {"id": "t1"}, {"$set": {"title": "Heizung defekt", "updated_at": "2024-02-01T00:00:00+00:00"}}
+            )
+            await projector.db.maintenance_tickets.delete_one({"id": "t2"})
+            assert await projector.sync() == 2
+            assert (await projector.cards.find_one({"id": "t1"}))["title"] == "Heizung defekt"
+            assert await projector.cards.find_one({"id": "t2"}) is None
+        asyncio.run(run())
+
+    def test_card_version_bump_rebuilds(self, projector, monkeypatch):
+        async def run():
+            await projector.setup()
+            monkeypatch.setattr(ticket_cards, "CARD_VERSION", CARD_VERSION + 1)
+            assert await projector.sync() == 2
+            assert {c["card_version"] for c in await projector.cards.find({}).to_list(None)} == {CARD_VERSION + 1}
+        asyncio.run(run())
+
+    def test_ticket_writes_do_not_trigger_sync(self, projector, monkeypatch):
+        calls = []
+
+        async def counting():
+            calls.append(1)
+            return 0
+        monkeypatch.setattr(projector, "sync", counting)
+
+        async def run():
+            await projector.db.maintenance_tickets.update_one({"id": "t1"}, {"$set": {"status": "In Arbeit"}})
+            await asyncio.sleep(0)
+            assert calls == []
+        asyncio.run(run())
+
+    def test_refresh_property_covers_deleted_tickets(self, projector):
+        async def run():
+            await projector.setup()
+            await projector.db.maintenance_tickets.delete_many({"property_id": "p1"})
+            await projector.refresh_property("p1")
+            assert await projector.cards.count_documents({}) == 0
+        asyncio.run(run())
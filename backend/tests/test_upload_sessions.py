@@ -0,0 +1,107 @@
+"""
+Upload session tests - resumable chunked photo uploads
+"""
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from memory_db import MemoryDatabase
+from upload_sessions import ABGESCHLOSSEN, OFFEN, VERARBEITUNG, UploadSessionStore, expected_chunk_size
+
+CHUNK = 1024
+CONTENT = os.urandom(CHUNK * 3 + 100)  # 4 chunks, the last one 100 bytes
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr("upload_sessions.CHUNK_SIZE", CHUNK)
+    return UploadSessionStore(MemoryDatabase())
+
+
+def chunk(index: int) -> bytes:
+    return CONTENT[index * CHUNK:(index + 1) * CHUNK]
+
+
+async def create(store, **fields):
+    return await store.create(len(CONTENT), id="u1", ticket_id="t1", **fields)
+
+
+class TestResume:
+    """An interrupted upload only resends the missing chunks"""
+
+    def test_progress_after_interruption(self, store):
+        async def run():
+            session = await create(store)
+            assert session["total_chunks"] == 4
+            assert expected_chunk_size(session, 3) == 100
+            # Connection lost after chunks 0 and 2
+            await store.put_chunk(session, 0, chunk(0))
+            await store.put_chunk(session, 2, chunk(2))
+            return await store.progress(await store.get("u1"))
+
+        progress = asyncio.run(run())
+        assert progress["status"] == OFFEN
+        assert progress["received_chunks"] == [0, 2]
+        assert progress["missing_chunks"] == [1, 3]
+        assert progress["offset"] == CHUNK
+
+    def test_resume_and_assemble(self, store):
+        async def run():
+            session = await create(store, sha256=hashlib.sha256(CONTENT).hexdigest())
+            await store.put_chunk(session, 0, chunk(0))
+            await store.put_chunk(session, 2, chunk(2))
+            # Resume: resend what is missing, repeating a chunk is harmless
+            progress = await store.progress(session)
+            for index in progress["missing_chunks"] + [2]:
+                await store.put_chunk(session, index, chunk(index))
+            progress = await store.progress(session)
+            assert progress["missing_chunks"] == []
+            assert progress["offset"] == len(CONTENT)
+
+            assert await store.claim(session)
+            path = await store.assemble(session)
+            try:
+                with open(path, "rb") as f:
+                    assert f.read() == CONTENT
+            finally:
+                os.unlink(path)
+            await store.finish(session, "photo-1")
+            return await store.get("u1"), await store.chunks.list_prefix("u1/")
+
+        session, chunks = asyncio.run(run())
+        assert session["status"] == ABGESCHLOSSEN
+        assert session["photo_id"] == "photo-1"
+        assert chunks == []
+
+    def test_checksum_mismatch(self, store):
+        async def run():
+            session = await create(store, sha256="0" * 64)
+            for index in range(4):
+                await store.put_chunk(session, index, chunk(index))
+            with pytest.raises(ValueError, match="Prüfsumme"):
+                await store.assemble(session)
+
+        asyncio.run(run())
+
+    def test_only_one_completion_wins(self, store):
+        async def run():
+            session = await create(store)
+            first, second = await store.claim(session), await store.claim(session)
+            status = (await store.get("u1"))["status"]
+            await store.release(session)
+            return first, second, status, (await store.get("u1"))["status"]
+
+        assert asyncio.run(run()) == (True, False, VERARBEITUNG, OFFEN)
+
+    def test_expired_sessions_are_removed(self, store):
+        async def run():
+            session = await create(store)
+            await store.put_chunk(session, 0, chunk(0))
+            await store.sessions.update_one({"id": "u1"}, {"$set": {"expires_at": "2000-01-01T00:00:00+00:00"}})
+            assert await store.get("u1") is None
+            await store.cleanup_expired()
+            return await store.sessions.count_documents({}), await store.chunks.list_prefix("u1/")
+
+        assert asyncio.run(run()) == (0, [])
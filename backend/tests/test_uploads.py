@@ -0,0 +1,77 @@
+"""
+Upload tests - request size cap and per-category limits
+"""
+import pytest
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+
+import uploads
+from uploads import RequestSizeLimitMiddleware, receive_upload
+
+LIMIT = 64 * 1024
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(uploads.UPLOAD_LIMITS, "dokument", 16 * 1024)
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=LIMIT)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        with await receive_upload(file, "dokument") as received:
+            return {"size": received.size, "sha256": received.sha256}
+
+    @app.post("/raw")
+    async def raw(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def chunked(data: bytes, size: int = 8192):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+class TestRequestSizeLimit:
+    """RequestSizeLimitMiddleware counts the body, not only Content-Length"""
+
+    def test_declared_length_over_limit(self, client):
+        response = client.post("/raw", content=b"x" * (LIMIT + 1))
+        assert response.status_code == 413
+
+    def test_chunked_body_over_limit(self, client):
+        """Without Content-Length the request is cut off once the cap is crossed"""
+        response = client.post("/raw", content=chunked(b"x" * (LIMIT * 4)))
+        assert response.status_code == 413
+        assert "zu groß" in response.json()["detail"]
+
+    def test_chunked_multipart_over_limit(self, client):
+        body = (
+            b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n\r\n"
+            + b"x" * (LIMIT * 4) + b"\r\n--b--\r\n"
+        )
+        response = client.post(
+            "/upload", content=chunked(body),
+            headers={"Content-Type": "multipart/form-data; boundary=b"},
+        )
+        assert response.status_code == 413
+
+    def test_chunked_body_within_limit(self, client):
+        response = client.post("/raw", content=chunked(b"x" * (LIMIT - 10)))
+        assert response.status_code == 200
+        assert response.json()["size"] == LIMIT - 10
+
+
+class TestReceiveUpload:
+    """receive_upload enforces the category limit below the request cap"""
+
+    def test_within_category_limit(self, client):
+        response = client.post("/upload", files={"file": ("a.pdf", b"%PDF" * 100, "application/pdf")})
+        assert response.status_code == 200
+        assert response.json()["size"] == 400
+
+    def test_over_category_limit(self, client):
+        response = client.post("/upload", files={"file": ("a.pdf", b"x" * (20 * 1024), "application/pdf")})
+        assert response.status_code == 413
@@ -0,0 +1,94 @@
+"""
+WG occupancy tests - room counts per WG, cost configuration and caching
+"""
+import asyncio
+
+import pytest
+
+from memory_db import MemoryDatabase
+from wg_occupancy import DEFAULT_KOSTEN_CONFIG, WGOccupancyService, kosten_pro_bewohner
+from wg_registry import WGRegistry
+
+
+@pytest.fixture
+def occupancy():
+    db = MemoryDatabase()
+
+    async def seed():
+        await db.wg_zimmer.insert_many([
+            {"id": "z1", "pflege_wg_id": "wg-a", "status": "frei"},
+            {"id": "z2", "pflege_wg_id": "wg-a", "status": "belegt"},
+            {"id": "z3", "pflege_wg_id": "wg-a", "status": "belegt"},
+            {"id": "z4", "pflege_wg_id": "wg-a", "status": "renovierung"},
+            {"id": "z5", "pflege_wg_id": "wg-b", "status": "reserviert"},
+        ])
+        await db.wg_kosten.insert_one({"wg_id": "wg-b", "miete_pro_zimmer": 700.0, "verpflegung": None})
+    asyncio.run(seed())
+    return WGOccupancyService(db, WGRegistry(db))
+
+
+def count_loads(service, monkeypatch) -> list:
+    loads = []
+    load = service._load
+
+    async def counting():
+        loads.append(1)
+        return await load()
+    monkeypatch.setattr(service, "_load", counting)
+    return loads
+
+
+class TestCounts:
+    """Room counts come from one grouped query over wg_zimmer"""
+
+    def test_counts_per_status(self, occupancy):
+        async def run():
+            stats = await occupancy.get_many(["wg-a", "wg-b", "wg-leer"])
+            a = stats["wg-a"]
+            assert (a["freie_zimmer"], a["belegte_zimmer"], a["reservierte_zimmer"]) == (1, 2, 0)
+            # Other states only count towards the total
+            assert a["gesamt_zimmer"] == 4
+            assert stats["wg-b"]["reservierte_zimmer"] == 1
+            assert stats["wg-leer"]["gesamt_zimmer"] == 0
+        asyncio.run(run())
+
+    def test_kosten_config_overrides_defaults(self, occupancy):
+        async def run():
+            assert (await occupancy.get("wg-a"))["kosten_config"] == DEFAULT_KOSTEN_CONFIG
+            kosten = (await occupancy.get("wg-b"))["kosten_config"]
+            assert kosten["miete_pro_zimmer"] == 700.0
+            # Unset positions keep their default
+            assert kosten["verpflegung"] == DEFAULT_KOSTEN_CONFIG["verpflegung"]
+            assert kosten_pro_bewohner(kosten) == sum(DEFAULT_KOSTEN_CONFIG.values()) + 50.0
+        asyncio.run(run())
+
+
+class TestCache:
+    """Counts are cached until wg_zimmer changes"""
+
+    def test_cached_until_rooms_change(self, occupancy, monkeypatch):
+        loads = count_loads(occupancy, monkeypatch)
+
+        async def run():
+            await occupancy.get("wg-a")
+            await occupancy.get("wg-b")
+            assert len(loads) == 1
+            await occupancy.db.wg_zimmer.update_one({"id": "z1"}, {"$set": {"status": "belegt"}})
+            assert (await occupancy.get("wg-a"))["belegte_zimmer"] == 3
+            assert len(loads) == 2
+        asyncio.run(run())
+
+    def test_change_during_load_not_cached(self, occupancy, monkeypatch):
+        load = occupancy._load
+
+        async def racing():
+            counts = await load()
+            # A room changes while the query result is on its way
+            await occupancy.db.wg_zimmer.insert_one({"id": "z6", "pflege_wg_id": "wg-a", "status": "frei"})
+            return counts
+        monkeypatch.setattr(occupancy, "_load", racing)
+
+        async def run():
+            await occupancy.get("wg-a")
+            assert occupancy._counts is None
+        asyncio.run(run())
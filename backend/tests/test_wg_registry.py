@@ -0,0 +1,83 @@
+"""
+WG registry tests - bootstrap, snapshot lookups and reloads
+"""
+import asyncio
+
+import pytest
+
+from memory_db import MemoryDatabase
+from wg_registry import PFLEGE_WGS_DATA, WG_STAMMDATEN_DEFAULTS, WGRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = WGRegistry(MemoryDatabase())
+    asyncio.run(registry.bootstrap())
+    return registry
+
+
+def count_loads(registry, monkeypatch) -> list:
+    loads = []
+    load = registry._load
+
+    async def counting():
+        loads.append(1)
+        return await load()
+    monkeypatch.setattr(registry, "_load", counting)
+    return loads
+
+
+class TestBootstrap:
+    """The initial WGs and Stammdaten are created once"""
+
+    def test_creates_wgs_in_order(self, registry):
+        async def run():
+            wgs = await registry.all()
+            assert [wg["id"] for wg in wgs] == [wg["id"] for wg in PFLEGE_WGS_DATA]
+            assert await registry.db.wg_stammdaten.count_documents({}) == len(WG_STAMMDATEN_DEFAULTS)
+        asyncio.run(run())
+
+    def test_rerun_keeps_edits(self, registry):
+        async def run():
+            await registry.db.pflege_wgs.update_one({"id": "wg-sterndamm"}, {"$set": {"kapazitaet": 11}})
+            await registry.bootstrap()
+            assert await registry.db.pflege_wgs.count_documents({}) == len(PFLEGE_WGS_DATA)
+            assert (await registry.get("wg-sterndamm"))["kapazitaet"] == 11
+        asyncio.run(run())
+
+
+class TestLookup:
+    """Lookups return copies from the snapshot"""
+
+    def test_get_and_defaults(self, registry):
+        async def run():
+            assert (await registry.get("wg-drachenblick"))["kapazitaet"] == 4
+            assert await registry.get("wg-unbekannt") is None
+            assert (await registry.stammdaten("wg-sterndamm"))["wg_beitrag"] == 30.0
+            assert await registry.stammdaten("wg-unbekannt") == {}
+            assert await registry.kosten("wg-sterndamm") is None
+        asyncio.run(run())
+
+    def test_results_are_copies(self, registry):
+        async def run():
+            wg = await registry.get("wg-sterndamm")
+            wg["kapazitaet"] = 99
+            assert (await registry.get("wg-sterndamm"))["kapazitaet"] == 10
+        asyncio.run(run())
+
+
+class TestReload:
+    """The snapshot reloads after writes to any watched table"""
+
+    def test_reload_after_change(self, registry, monkeypatch):
+        loads = count_loads(registry, monkeypatch)
+
+        async def run():
+            await registry.get("wg-sterndamm")
+            assert loads == []
+            await registry.db.wg_kosten.insert_one({"wg_id": "wg-sterndamm", "miete_pro_zimmer": 700.0})
+            assert (await registry.kosten("wg-sterndamm"))["miete_pro_zimmer"] == 700.0
+            await registry.db.pflege_wgs.insert_one({"id": "wg-neu", "kurzname": "Neu", "position": 99})
+            assert (await registry.all())[-1]["id"] == "wg-neu"
+            assert len(loads) == 2
+        asyncio.run(run())
@@ -0,0 +1,128 @@
+"""
+Worker pool tests - backpressure, timeouts and retiring stuck workers
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from worker_pool import WorkerPool, WorkerPoolBusy
+
+
+def square(x: int) -> int:
+    return x * x
+
+
+def sleep_then(seconds: float, value):
+    time.sleep(seconds)
+    return value
+
+
+def pid_of_worker() -> int:
+    return os.getpid()
+
+
+def is_running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Killed but not yet reaped: zombie
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(name: str, **options) -> WorkerPool:
+        pool = WorkerPool(f"test_{name}", **{"max_workers": 1, "queue_size": 1, "timeout": 10.0, **options})
+        pools.append(pool)
+        return pool
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+class TestBackpressure:
+    """At most max_workers + queue_size tasks are accepted"""
+
+    def test_full_queue_rejected(self, make_pool):
+        pool = make_pool("busy")
+
+        async def run():
+            running = [asyncio.create_task(pool.run(sleep_then, 0.5, i)) for i in range(2)]
+            await asyncio.sleep(0)
+            rejected = pool.rejected_counter.value
+            with pytest.raises(WorkerPoolBusy):
+                await pool.run(square, 2)
+            assert pool.rejected_counter.value == rejected + 1
+            assert await asyncio.gather(*running) == [0, 1]
+            # Capacity is free again
+            assert await pool.run(square, 3) == 9
+            assert pool.in_flight_gauge.value == 0
+        asyncio.run(run())
+
+
+class TestTimeout:
+    """Tasks exceeding the timeout fail without blocking the pool"""
+
+    def test_running_task_times_out(self, make_pool):
+        pool = make_pool("timeout", timeout=0.5)
+
+        async def run():
+            timeouts = pool.timeout_counter.value
+            started = time.monotonic()
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.run(sleep_then, 30, "never")
+            assert time.monotonic() - started < 5
+            assert pool.timeout_counter.value == timeouts + 1
+        asyncio.run(run())
+
+    def test_queued_task_cancelled(self, make_pool):
+        pool = make_pool("queued", timeout=1.0)
+
+        async def run():
+            # The first task occupies the only worker; the second never starts
+            results = await asyncio.gather(
+                pool.run(sleep_then, 30, "stuck"), pool.run(square, 4), return_exceptions=True
+            )
+            assert all(isinstance(r, asyncio.TimeoutError) for r in results)
+        asyncio.run(run())
+
+
+class TestRetire:
+    """A stuck worker is replaced and terminated; the pool stays usable"""
+
+    def test_pool_usable_after_retiring_worker(self, make_pool):
+        pool = make_pool("retire", max_workers=2, timeout=1.0)
+
+        async def run():
+            stuck_pid = await pool.run(pid_of_worker)
+            first = pool._current
+            # Other tasks of the retired executor still complete
+            slow = asyncio.create_task(pool.run(sleep_then, 1.5, "done"))
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.run(sleep_then, 30, "never")
+            assert pool._current is None
+            assert first in pool._retired
+
+            # New work goes to a fresh executor right away
+            assert await pool.run(square, 5) == 25
+            assert pool._current is not first
+            with pytest.raises(asyncio.TimeoutError):
+                await slow
+
+            # Once the retired executor is drained, its stuck worker is terminated
+            stuck = set(first.stuck_pids)
+            assert stuck
+            for _ in range(50):
+                if first not in pool._retired:
+                    break
+                await asyncio.sleep(0.1)
+            assert first not in pool._retired
+            await asyncio.sleep(0.5)
+            assert not any(is_running(pid) for pid in stuck)
+            assert stuck_pid > 0
+        asyncio.run(run())
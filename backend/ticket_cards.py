@@ -0,0 +1,184 @@
+"""
+Handwerker Ticket Cards
+Denormalised read model for the Handwerker portal.
+
+Each maintenance ticket has one document in handwerker_ticket_cards that
+already contains property, photos, status updates, work report and tenant
+contact. The portal list and detail endpoints read cards with a single
+indexed query; the write endpoints call the projector to rebuild the
+affected cards whenever tickets, photos, status updates, work reports,
+units, properties or contacts change. Cards live in the database, so a
+refresh by one worker is seen by all of them.
+
+At startup, setup() runs sync() once: it compares the ticket ids and
+updated_at stamps with the cards, builds missing or outdated cards
+(including ones of an older CARD_VERSION) and removes cards of deleted
+tickets. This covers writes made while no API process was running or by
+an older deploy. It runs under an advisory lock, so replicas starting
+together do not reconcile twice.
+
+Photos are embedded as URL references only; the image data itself is
+served by the /photos endpoint from the photo_blobs store.
+"""
+
+import logging
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Bump when the card layout changes; setup() rebuilds outdated cards
+CARD_VERSION = 4
+
+# Legacy photo fields holding base64 image data - never read into a card
+PHOTO_DATA_FIELDS = {"photo_url": 0, "thumbnail_url": 0}
+
+
+def _ticket_version(ticket: dict):
+    """Stamp a card is compared by: the ticket's last update (or creation)."""
+    return ticket.get("updated_at") or ticket.get("created_at")
+
+
+def photo_refs(photo: dict) -> dict:
+    """Set the /photos URLs of all size variants on a photo doc."""
+    photo["thumbnail_url"] = f"/api/photos/{photo['id']}/thumb"
+    photo["medium_url"] = f"/api/photos/{photo['id']}/medium"
+    photo["photo_url"] = f"/api/photos/{photo['id']}/full"
+    return photo
+
+
+class TicketCardProjector:
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def cards(self):
+        return self.db.handwerker_ticket_cards
+
+    async def setup(self):
+        """Create indexes and build missing, outdated or orphaned cards."""
+        await self.cards.create_index("id", unique=True)
+        await self.cards.create_index("assigned_to_id")
+        await self.sync()
+
+    async def sync(self) -> int:
+        """Reconcile cards with tickets by id and updated_at; returns cards touched."""
+        async with self.db.advisory_lock("ticket_cards"):
+            tickets = await self.db.maintenance_tickets.find(
+                {}, {"id": 1, "updated_at": 1, "created_at": 1}
+            ).to_list(None)
+            cards = await self.cards.find({}, {"id": 1, "card_version": 1, "ticket_updated_at": 1}).to_list(None)
+            current = {card["id"]: card for card in cards}
+            outdated = [
+                ticket["id"] for ticket in tickets
+                if ticket["id"] not in current
+                or current[ticket["id"]].get("card_version") != CARD_VERSION
+                or current[ticket["id"]].get("ticket_updated_at") != _ticket_version(ticket)
+            ]
+            orphaned = current.keys() - {ticket["id"] for ticket in tickets}
+            for ticket_id in [*outdated, *orphaned]:
+                await self.refresh(ticket_id)
+        if outdated or orphaned:
+            logger.info(f"Ticket cards synced: {len(outdated)} rebuilt, {len(orphaned)} removed")
+        return len(outdated) + len(orphaned)
+
+    async def build(self, ticket_id: str):
+        """Assemble the card for one ticket from the source collections."""
+        ticket = await self.db.maintenance_tickets.find_one({"id": ticket_id}, {"_id": 0})
+        if not ticket:
+            return None
+
+        prop = await self.db.properties.find_one({"id": ticket.get("property_id")}, {"_id": 0})
+
+        photos = await self.db.ticket_photos.find(
+            {"ticket_id": ticket_id}, {"_id": 0, **PHOTO_DATA_FIELDS}
+        ).sort("uploaded_at", 1).to_list(100)
+
+        status_updates = await self.db.status_updates.find(
+            {"ticket_id": ticket_id}, {"_id": 0}
+        ).sort("timestamp", -1).to_list(50)
+
+        work_report = await self.db.work_reports.find_one({"ticket_id": ticket_id}, {"_id": 0})
+        if work_report:
+            work_report["total_cost"] = (
+                (work_report.get("material_cost", 0) or 0) + (work_report.get("labor_cost", 0) or 0)
+            )
+
+        # Tenant contact of the property (first occupied unit)
+        tenant_name = None
+        tenant_phone = None
+        tenant_id = None
+        if prop:
+            unit = await self.db.units.find_one({"property_id": prop["id"], "is_vacant": False})
+            if unit and unit.get("tenant_id"):
+                tenant = await self.db.contacts.find_one({"id": unit["tenant_id"]})
+                if tenant:
+                    tenant_id = tenant.get("id")
+                    tenant_name = tenant.get("name")
+                    tenant_phone = tenant.get("phone")
+
+        return {
+            "id": ticket["id"],
+            "card_version": CARD_VERSION,
+            "ticket_updated_at": _ticket_version(ticket),
+            "assigned_to_id": ticket.get("assigned_to_id"),
+            "property_id": ticket.get("property_id"),
+            "property_name": prop.get("name") if prop else "Unbekannt",
+            "property_address": (
+                f"{prop.get('address', '')}, {prop.get('postal_code', '')} {prop.get('city', '')}" if prop else ""
+            ),
+            "property_city": prop.get("city", "") if prop else "",
+            "title": ticket.get("title"),
+            "description": ticket.get("description"),
+            "status": ticket.get("status", "Offen"),
+            "priority": ticket.get("priority", "Normal"),
+            "category": ticket.get("category"),
+            "scheduled_date": ticket.get("scheduled_date"),
+            "tenant_id": tenant_id,
+            "tenant_name": tenant_name,
+            "tenant_phone": tenant_phone,
+            "photos": [photo_refs(p) for p in photos],
+            "photo_count": len(photos),
+            "status_updates": status_updates,
+            "work_report": work_report,
+            "created_at": ticket.get("created_at"),
+        }
+
+    async def refresh(self, ticket_id: str):
+        """Rebuild (or remove) the card of one ticket."""
+        card = await self.build(ticket_id)
+        if card is None:
+            await self.cards.delete_one({"id": ticket_id})
+            return None
+        try:
+            await self.cards.update_one({"id": ticket_id}, {"$set": card}, upsert=True)
+        except asyncpg.UniqueViolationError:
+            # Another worker inserted the card concurrently - overwrite it
+            await self.cards.update_one({"id": ticket_id}, {"$set": card})
+        return card
+
+    async def refresh_property(self, property_id: str):
+        """Rebuild cards of all tickets of a property (property/unit changes)."""
+        tickets = await self.db.maintenance_tickets.find({"property_id": property_id}, {"id": 1}).to_list(1000)
+        # Include existing cards so tickets deleted with the property lose their card
+        cards = await self.cards.find({"property_id": property_id}, {"id": 1}).to_list(1000)
+        for ticket_id in {t["id"] for t in tickets} | {c["id"] for c in cards}:
+            await self.refresh(ticket_id)
+
+    async def refresh_contact(self, contact_id: str):
+        """Rebuild cards whose tenant contact is this contact."""
+        units = await self.db.units.find({"tenant_id": contact_id}, {"property_id": 1}).to_list(1000)
+        for property_id in {u["property_id"] for u in units if u.get("property_id")}:
+            await self.refresh_property(property_id)
+        cards = await self.cards.find({"tenant_id": contact_id}, {"property_id": 1}).to_list(1000)
+        for property_id in {c["property_id"] for c in cards if c.get("property_id")}:
+            await self.refresh_property(property_id)
+
+    async def rebuild_all(self):
+        """Rebuild every card from scratch (seeding)."""
+        async with self.db.advisory_lock("ticket_cards"):
+            await self.cards.delete_many({})
+            tickets = await self.db.maintenance_tickets.find({}, {"id": 1}).to_list(None)
+            for ticket in tickets:
+                await self.refresh(ticket["id"])
+        logger.info(f"Rebuilt {len(tickets)} ticket cards")
@@ -0,0 +1,160 @@
+"""
+Upload Sessions
+Resumable chunked uploads for the Handwerker mobile app.
+
+A client creates a session (total size, optional SHA-256), PUTs numbered
+chunks of chunk_size bytes in any order and as often as needed, can ask
+which chunks the server already has, and finally completes the session.
+Chunks are stored in the upload_chunks binary table, so an interrupted
+upload only has to resend the missing chunks. On completion the chunks are
+assembled into a temporary file and handed to the normal photo pipeline.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE_KB", "512")) * 1024
+SESSION_TTL = timedelta(hours=24)
+
+# Session status values
+OFFEN = "offen"
+VERARBEITUNG = "verarbeitung"
+ABGESCHLOSSEN = "abgeschlossen"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def chunk_key(upload_id: str, index: int) -> str:
+    return f"{upload_id}/{index:06d}"
+
+
+def expected_chunk_size(session: dict, index: int) -> int:
+    """Size chunk index must have (the last chunk holds the remainder)."""
+    return min(session["chunk_size"], session["total_size"] - index * session["chunk_size"])
+
+
+class UploadSessionStore:
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def sessions(self):
+        return self.db.upload_sessions
+
+    @property
+    def chunks(self):
+        return self.db.binary("upload_chunks")
+
+    async def create(self, total_size: int, **fields) -> dict:
+        """Create a session; fields are stored as-is (ticket_id, filename, ...)."""
+        await self.cleanup_expired()
+        created = _now()
+        session = {
+            **fields,
+            "total_size": total_size,
+            "chunk_size": CHUNK_SIZE,
+            "total_chunks": max(1, -(-total_size // CHUNK_SIZE)),
+            "status": OFFEN,
+            "created_at": created.isoformat(),
+            "expires_at": (created + SESSION_TTL).isoformat(),
+        }
+        await self.sessions.insert_one(session)
+        session.pop("_id", None)
+        return session
+
+    async def get(self, upload_id: str):
+        """Session by id, None if unknown or expired."""
+        session = await self.sessions.find_one({"id": upload_id}, {"_id": 0})
+        if session and session["status"] != ABGESCHLOSSEN and datetime.fromisoformat(session["expires_at"]) < _now():
+            return None
+        return session
+
+    async def put_chunk(self, session: dict, index: int, data: bytes):
+        """Store one chunk (re-sending a chunk overwrites it)."""
+        await self.chunks.put(chunk_key(session["id"], index), data, "application/octet-stream")
+
+    async def progress(self, session: dict) -> dict:
+        """Received chunks, missing chunks and contiguous byte offset."""
+        stored = await self.chunks.list_prefix(f"{session['id']}/")
+        received = sorted(int(entry["key"].rsplit("/", 1)[1]) for entry in stored)
+        received_set = set(received)
+        missing = [i for i in range(session["total_chunks"]) if i not in received_set]
+        first_missing = missing[0] if missing else session["total_chunks"]
+        return {
+            "upload_id": session["id"],
+            "status": session["status"],
+            "total_size": session["total_size"],
+            "chunk_size": session["chunk_size"],
+            "total_chunks": session["total_chunks"],
+            "received_chunks": received,
+            "missing_chunks": missing,
+            # Bytes the client can skip when resuming sequentially
+            "offset": min(first_missing * session["chunk_size"], session["total_size"]),
+            "photo_id": session.get("photo_id"),
+        }
+
+    async def claim(self, session: dict) -> bool:
+        """Mark an open session as being processed (only one completion wins)."""
+        result = await self.sessions.update_one(
+            {"id": session["id"], "status": OFFEN}, {"$set": {"status": VERARBEITUNG}}
+        )
+        return result.matched_count == 1
+
+    async def release(self, session: dict):
+        """Reopen a session after a failed completion so it can be retried."""
+        await self.sessions.update_one({"id": session["id"]}, {"$set": {"status": OFFEN}})
+
+    async def assemble(self, session: dict) -> str:
+        """Concatenate all chunks into a temp file and return its path.
+
+        Raises ValueError if the content does not match the announced size
+        or SHA-256. The caller removes the file.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        target = tempfile.NamedTemporaryFile(delete=False, suffix=".upload")
+        try:
+            with target:
+                for index in range(session["total_chunks"]):
+                    chunk = await self.chunks.get(chunk_key(session["id"], index))
+                    if chunk is None:
+                        raise ValueError(f"Chunk {index} fehlt")
+                    digest.update(chunk["data"])
+                    size += len(chunk["data"])
+                    target.write(chunk["data"])
+            if size != session["total_size"]:
+                raise ValueError(f"Größe {size} statt {session['total_size']} Bytes")
+            if session.get("sha256") and digest.hexdigest() != session["sha256"].lower():
+                raise ValueError("Prüfsumme stimmt nicht überein")
+        except BaseException:
+            os.unlink(target.name)
+            raise
+        return target.name
+
+    async def finish(self, session: dict, photo_id: str):
+        await self.sessions.update_one(
+            {"id": session["id"]},
+            {"$set": {"status": ABGESCHLOSSEN, "photo_id": photo_id, "completed_at": _now().isoformat()}}
+        )
+        await self.chunks.delete_prefix(f"{session['id']}/")
+
+    async def discard(self, session: dict):
+        await self.chunks.delete_prefix(f"{session['id']}/")
+        await self.sessions.delete_one({"id": session["id"]})
+
+    async def cleanup_expired(self):
+        """Drop chunks and sessions of uploads that were never completed."""
+        expired = await self.sessions.find(
+            {"status": {"$ne": ABGESCHLOSSEN}, "expires_at": {"$lt": _now().isoformat()}}, {"id": 1}
+        ).to_list(1000)
+        for session in expired:
+            await self.discard(session)
+        if expired:
+            logger.info(f"Removed {len(expired)} expired upload sessions")
@@ -0,0 +1,161 @@
+"""
+Uploads
+Size-bounded, incremental processing of uploaded files.
+
+Uploaded files are read in chunks: each chunk is hashed (SHA-256, the blob
+store key) and counted against the limit of the upload category, so no
+handler ever holds a whole file in memory. The multipart parser already
+spools file parts to a temporary file (max. 1 MB in memory); that file is
+rewound and handed on to the blob store as-is. Photos are copied to a named
+temporary file instead, because the image worker process opens them by path.
+
+Limits per category are configurable via UPLOAD_LIMIT_<CATEGORY>_MB.
+RequestSizeLimitMiddleware caps every request body at the largest limit
+(plus multipart overhead): a declared Content-Length above it is rejected
+before the body is read, and the bytes actually received are counted, so
+chunked requests without Content-Length are cut off with 413 as soon as
+they cross the cap instead of being spooled to disk completely.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse
+
+CHUNK_SIZE = 1024 * 1024
+
+# Category -> default limit in MB
+DEFAULT_LIMITS_MB = {
+    "dokument": 25,   # Klient documents
+    "document": 50,   # Property documents (plans, scans)
+    "photo": 20,      # Handwerker ticket photos
+}
+
+UPLOAD_LIMITS = {
+    category: int(os.environ.get(f"UPLOAD_LIMIT_{category.upper()}_MB", str(mb))) * 1024 * 1024
+    for category, mb in DEFAULT_LIMITS_MB.items()
+}
+
+# Multipart overhead on top of the file itself
+MAX_REQUEST_BYTES = max(UPLOAD_LIMITS.values()) + 1024 * 1024
+
+
+class ReceivedUpload:
+    """An upload that passed the size limit, ready to be stored.
+
+    file is positioned at the start; path is set for uploads received with
+    to_disk=True. Use as context manager to remove temporary files.
+    """
+
+    def __init__(self, file, sha256: str, size: int, filename: str, content_type: str, path: str = None):
+        self.file = file
+        self.sha256 = sha256
+        self.size = size
+        self.filename = filename
+        self.content_type = content_type or "application/octet-stream"
+        self.path = path
+
+    def close(self):
+        if self.path:
+            self.file.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _too_large(category: str):
+    limit_mb = UPLOAD_LIMITS[category] // (1024 * 1024)
+    return HTTPException(413, f"Datei zu groß (max. {limit_mb} MB)")
+
+
+async def receive_upload(file: UploadFile, category: str, to_disk: bool = False) -> ReceivedUpload:
+    """Hash and size-check an upload chunk by chunk (413 if over the category limit)."""
+    limit = UPLOAD_LIMITS[category]
+    if file.size is not None and file.size > limit:
+        raise _too_large(category)
+
+    target = tempfile.NamedTemporaryFile(delete=False, suffix=".upload") if to_disk else None
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        await file.seek(0)
+        while chunk := await file.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > limit:
+                raise _too_large(category)
+            digest.update(chunk)
+            if target:
+                target.write(chunk)
+    except BaseException:
+        if target:
+            target.close()
+            os.unlink(target.name)
+        raise
+
+    if target:
+        target.flush()
+        target.seek(0)
+        return ReceivedUpload(target, digest.hexdigest(), size, file.filename, file.content_type, path=target.name)
+    await file.seek(0)
+    return ReceivedUpload(file.file, digest.hexdigest(), size, file.filename, file.content_type)
+
+
+class RequestTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(413, f"Anfrage zu groß (max. {MAX_REQUEST_BYTES // (1024 * 1024)} MB)")
+
+
+class RequestSizeLimitMiddleware:
+    """ASGI middleware: answer 413 for request bodies over max_bytes."""
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            return await self._reject(scope, receive, send)
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Handled as HTTPException by FastAPI; caught below otherwise
+                    raise RequestTooLarge()
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except RequestTooLarge:
+            if response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        error = RequestTooLarge()
+        response = JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+        await response(scope, receive, send)
@@ -0,0 +1,99 @@
+"""
+WG Occupancy Service
+Room status counts and cost configuration for all Pflege-WGs.
+
+Room counts for all WGs come from one GROUP BY over wg_zimmer and are cached
+per WG until wg_zimmer changes. Cost configuration is read from the WG
+registry snapshot, so overview pages cost a constant number of queries no
+matter how many WGs exist.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Base costs per room (used when a WG has no wg_kosten entry)
+DEFAULT_KOSTEN_CONFIG = {
+    "miete_pro_zimmer": 650.0,
+    "nebenkosten_pro_zimmer": 180.0,
+    "betreuungspauschale": 420.0,
+    "verpflegung": 280.0,
+    "investitionskosten": 120.0,
+}
+
+# Zimmer status -> counter field in the stats dict
+STATUS_FIELDS = {
+    "frei": "freie_zimmer",
+    "belegt": "belegte_zimmer",
+    "reserviert": "reservierte_zimmer",
+}
+
+
+def _empty_counts() -> dict:
+    return {
+        "freie_zimmer": 0,
+        "belegte_zimmer": 0,
+        "reservierte_zimmer": 0,
+        "gesamt_zimmer": 0,
+    }
+
+
+class WGOccupancyService:
+    def __init__(self, db, registry):
+        self.db = db
+        self.registry = registry
+        self._counts = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        db.on_change("wg_zimmer", self.invalidate)
+
+    def invalidate(self, table: str = None):
+        """Drop cached room counts (called on wg_zimmer changes)."""
+        self._counts = None
+        self._generation += 1
+
+    async def get(self, wg_id: str) -> dict:
+        """Room counts plus kosten_config for a single WG."""
+        return (await self.get_many([wg_id]))[wg_id]
+
+    async def get_many(self, wg_ids: list) -> dict:
+        """Return {wg_id: stats} for the given WGs (zero counts if no rooms)."""
+        counts = await self._room_counts()
+        result = {}
+        for wg_id in wg_ids:
+            kosten_config = dict(DEFAULT_KOSTEN_CONFIG)
+            configured = await self.registry.kosten(wg_id) or {}
+            kosten_config.update({k: configured[k] for k in DEFAULT_KOSTEN_CONFIG if configured.get(k) is not None})
+            result[wg_id] = {**(counts.get(wg_id) or _empty_counts()), "kosten_config": kosten_config}
+        return result
+
+    async def _room_counts(self) -> dict:
+        counts = self._counts
+        if counts is not None:
+            return counts
+        async with self._lock:
+            if self._counts is not None:
+                return self._counts
+            generation = self._generation
+            counts = await self._load()
+            # Only keep the result if nothing changed while we were loading
+            if generation == self._generation:
+                self._counts = counts
+            return counts
+
+    async def _load(self) -> dict:
+        counts = {}
+        rows = await self.db.wg_zimmer.group_count(["pflege_wg_id", "status"])
+        for row in rows:
+            wg_counts = counts.setdefault(row["pflege_wg_id"], _empty_counts())
+            if row["status"] in STATUS_FIELDS:
+                wg_counts[STATUS_FIELDS[row["status"]]] += row["count"]
+            wg_counts["gesamt_zimmer"] += row["count"]
+        logger.debug(f"WG occupancy loaded for {len(counts)} WGs")
+        return counts
+
+
+def kosten_pro_bewohner(kosten_config: dict) -> float:
+    """Monthly cost per resident (sum of all cost positions)."""
+    return sum(kosten_config[k] for k in DEFAULT_KOSTEN_CONFIG)
@@ -0,0 +1,283 @@
+"""
+WG Registry
+Pflege-WG metadata, Stammdaten and cost configuration as an in-memory snapshot.
+
+WGs live in the pflege_wgs collection (bootstrapped from PFLEGE_WGS_DATA on
+first start), Stammdaten in wg_stammdaten and cost configuration in wg_kosten.
+The registry loads all three into an immutable, id-indexed snapshot and
+reloads it lazily after change notifications, so every lookup is a dict hit
+and new WGs need no deploy.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+WATCHED_TABLES = ("pflege_wgs", "wg_stammdaten", "wg_kosten")
+
+# Initiale Pflege-WG Liste mit Grundrissen (wird beim ersten Start in pflege_wgs angelegt)
+PFLEGE_WGS_DATA = [
+    {
+        "id": "wg-sterndamm",
+        "kurzname": "Sterndamm",
+        "property_name": "WG Sterndamm",
+        "property_address": "Sterndamm 13, 12487 Berlin",
+        "kapazitaet": 10,
+        "grundriss_url": (
+            "https://customer-assets.emergentagent.com/job_domushome/artifacts/"
+            "gv8gcuns_Grundriss%20Sterndamm.png"
+        ),
+        "beschreibung": "Ambulant betreute Wohngemeinschaft mit 10 Zimmern"
+    },
+    {
+        "id": "wg-kupferkessel",
+        "kurzname": "Kupferkessel",
+        "property_name": "WG Kupferkessel",
+        "property_address": "Baumschulenstraße 64, 1. OG, 12437 Berlin",
+        "kapazitaet": 8,
+        "grundriss_url": None,
+        "beschreibung": "Ambulant betreute Wohngemeinschaft mit 8 Zimmern (inkl. 1 Doppelzimmer)"
+    },
+    {
+        "id": "wg-kupferkessel-klein",
+        "kurzname": "Kupferkesselchen",
+        "property_name": "WG Kupferkesselchen",
+        "property_address": "Baumschulenstraße 64, EG rechts, 12437 Berlin",
+        "kapazitaet": 3,
+        "grundriss_url": (
+            "https://customer-assets.emergentagent.com/job_domushome/artifacts/"
+            "suv923c5_KUPFERKESSEL%20KLEIN%20GRUNDRISS.png"
+        ),
+        "beschreibung": "Kleinere Wohngemeinschaft mit 4 Zimmern"
+    },
+    {
+        "id": "wg-drachenwiese",
+        "kurzname": "Drachenwiese",
+        "property_name": "WG Drachenwiese",
+        "property_address": "Rudower Straße 228, 12557 Berlin",
+        "kapazitaet": 12,
+        "grundriss_url": (
+            "https://customer-assets.emergentagent.com/job_domushome/artifacts/"
+            "afidfcuk_Grundriss%20WG%20Drachenwiese%20Gro%C3%9F.png"
+        ),
+        "beschreibung": "Große ambulant betreute Wohngemeinschaft mit 12 Zimmern"
+    },
+    {
+        "id": "wg-drachenblick",
+        "kurzname": "Drachenblick",
+        "property_name": "WG Drachenblick",
+        "property_address": "Rudower Straße 226, 12557 Berlin",
+        "kapazitaet": 4,
+        "grundriss_url": (
+            "https://customer-assets.emergentagent.com/job_domushome/artifacts/"
+            "fti3j6nz_Grundriss%20Drachenblick.png"
+        ),
+        "beschreibung": "Ambulant betreute Wohngemeinschaft mit 4 Zimmern"
+    }
+]
+
+# Initiale Stammdaten fuer alle 5 WGs (aus Original-PDFs extrahiert, werden in wg_stammdaten angelegt)
+WG_STAMMDATEN_DEFAULTS = {
+    "wg-sterndamm": {
+        "vermieter_name": "DomusVita gGmbH",
+        "vermieter_strasse": "Sterndamm 13",
+        "vermieter_plz_ort": "12487 Berlin",
+        "vermieter_iban": "DE18 1005 0000 0190 6561 40",
+        "vermieter_bank": "Berliner Sparkasse",
+        "vermieter_bic": "BELADEBEXXX",
+        "wg_adresse_strasse": "Sterndamm 13",
+        "wg_adresse_plz_ort": "12487 Berlin",
+        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
+        "haushaltsbuch_bank": "Berliner Sparkasse",
+        "lebensmittelpauschale": 290.0,
+        "wg_beitrag": 30.0,
+        "wg_zuschlag": 224.0,
+        "entlastungsbetrag": 131.0,
+        "pflegedienst_name": "DomusVita gGmbH",
+    },
+    "wg-kupferkessel": {
+        "vermieter_name": "300&VIER GmbH",
+        "vermieter_strasse": "Baumschulenstraße 64",
+        "vermieter_plz_ort": "12437 Berlin",
+        "vermieter_iban": "DE18 1005 0000 0190 6561 40",
+        "vermieter_bank": "Berliner Sparkasse",
+        "vermieter_bic": "BELADEBEXXX",
+        "wg_adresse_strasse": "Baumschulenstraße 64, 1. OG",
+        "wg_adresse_plz_ort": "12437 Berlin",
+        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
+        "haushaltsbuch_bank": "Berliner Sparkasse",
+        "lebensmittelpauschale": 290.0,
+        "wg_beitrag": 30.0,
+        "wg_zuschlag": 224.0,
+        "entlastungsbetrag": 131.0,
+        "pflegedienst_name": "DomusVita gGmbH",
+        "hauptmieter": "DomusVita gGmbH",
+        "nettokaltmiete_pro_qm": 13.00,
+        "kalte_betriebskosten_pro_qm": 1.50,
+        "kooperationsgebuehr_monat": 800.0,
+    },
+    "wg-kupferkessel-klein": {
+        "vermieter_name": "300&VIER GmbH",
+        "vermieter_strasse": "Baumschulenstraße 64",
+        "vermieter_plz_ort": "12437 Berlin",
+        "vermieter_iban": "DE18 1005 0000 0190 6561 40",
+        "vermieter_bank": "Berliner Sparkasse",
+        "vermieter_bic": "BELADEBEXXX",
+        "wg_adresse_strasse": "Baumschulenstraße 64, EG rechts",
+        "wg_adresse_plz_ort": "12437 Berlin",
+        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
+        "haushaltsbuch_bank": "Berliner Sparkasse",
+        "lebensmittelpauschale": 290.0,
+        "wg_beitrag": 30.0,
+        "wg_zuschlag": 224.0,
+        "entlastungsbetrag": 131.0,
+        "pflegedienst_name": "DomusVita gGmbH",
+        "hauptmieter": "DomusVita gGmbH",
+        "nettokaltmiete_pro_qm": 13.25,
+        "kalte_betriebskosten_pro_qm": 1.50,
+        "kooperationsgebuehr_monat": 500.0,
+    },
+    "wg-drachenwiese": {
+        "vermieter_name": "Hilfe in Not GmbH",
+        "vermieter_strasse": "Rudower Straße 228",
+        "vermieter_plz_ort": "12557 Berlin",
+        "vermieter_iban": "DE53 1005 0000 0190 9988 90",
+        "vermieter_bank": "Berliner Sparkasse",
+        "vermieter_bic": "BELADEBEXXX",
+        "wg_adresse_strasse": "Rudower Straße 228",
+        "wg_adresse_plz_ort": "12557 Berlin",
+        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
+        "haushaltsbuch_bank": "Berliner Sparkasse",
+        "lebensmittelpauschale": 290.0,
+        "wg_beitrag": 30.0,
+        "wg_zuschlag": 224.0,
+        "entlastungsbetrag": 131.0,
+        "pflegedienst_name": "DomusVita gGmbH",
+        "mietvertragstyp": "Bruttomiete (Untermietvertrag)",
+        "nebenkosten_reparaturpauschale": 30.0,
+        "nebenkosten_sondermuell": 20.0,
+        "nebenkosten_strom": 45.0,
+        "nebenkosten_heizkosten": 50.0,
+        "kaution": "zwei_grundmieten",
+    },
+    "wg-drachenblick": {
+        "vermieter_name": "5D Living GmbH",
+        "vermieter_strasse": "Rudower Straße 226",
+        "vermieter_plz_ort": "12557 Berlin",
+        "vermieter_iban": "DE18 1005 0000 0190 6561 40",
+        "vermieter_bank": "Berliner Sparkasse",
+        "vermieter_bic": "BELADEBEXXX",
+        "wg_adresse_strasse": "Rudower Straße 226",
+        "wg_adresse_plz_ort": "12557 Berlin",
+        "haushaltsbuch_iban": "DE18 1005 0000 0190 6561 40",
+        "haushaltsbuch_bank": "Berliner Sparkasse",
+        "lebensmittelpauschale": 290.0,
+        "wg_beitrag": 30.0,
+        "wg_zuschlag": 224.0,
+        "entlastungsbetrag": 131.0,
+        "pflegedienst_name": "DomusVita gGmbH",
+        "mietvertragstyp": "Bruttomiete (Untermietvertrag)",
+        "nebenkosten_reparaturpauschale": 30.0,
+        "nebenkosten_sondermuell": 20.0,
+        "nebenkosten_strom": 50.0,
+        "nebenkosten_heizkosten": 45.0,
+        "kaution": "zwei_grundmieten",
+    },
+}
+
+
+def _freeze(doc: dict) -> Mapping:
+    return MappingProxyType({k: v for k, v in doc.items() if k != "_id"})
+
+
+@dataclass(frozen=True)
+class RegistrySnapshot:
+    """Immutable view of all WGs at one point in time."""
+    wgs: Mapping[str, Mapping]
+    order: tuple
+    stammdaten: Mapping[str, Mapping]
+    kosten: Mapping[str, Mapping]
+
+
+EMPTY_SNAPSHOT = RegistrySnapshot(MappingProxyType({}), (), MappingProxyType({}), MappingProxyType({}))
+
+
+class WGRegistry:
+    def __init__(self, db):
+        self.db = db
+        self._snapshot = EMPTY_SNAPSHOT
+        self._dirty = True
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        for table in WATCHED_TABLES:
+            db.on_change(table, self.invalidate)
+
+    def invalidate(self, table: str = None):
+        """Mark the snapshot stale; the next lookup reloads it."""
+        self._dirty = True
+        self._generation += 1
+
+    async def bootstrap(self):
+        """Create the initial WGs and their Stammdaten if they don't exist yet."""
+        await self.db.pflege_wgs.create_index("id", unique=True)
+        for position, wg in enumerate(PFLEGE_WGS_DATA):
+            if not await self.db.pflege_wgs.find_one({"id": wg["id"]}, {"id": 1}):
+                try:
+                    await self.db.pflege_wgs.insert_one({**wg, "position": position})
+                except Exception as e:
+                    logger.warning(f"WG bootstrap for {wg['id']} skipped: {e}")
+                    continue
+                logger.info(f"WG registry: created {wg['id']}")
+            defaults = WG_STAMMDATEN_DEFAULTS.get(wg["id"])
+            if defaults and not await self.db.wg_stammdaten.find_one({"wg_id": wg["id"]}, {"wg_id": 1}):
+                await self.db.wg_stammdaten.insert_one({**defaults, "wg_id": wg["id"]})
+        await self.snapshot()
+
+    async def snapshot(self) -> RegistrySnapshot:
+        """Return the current snapshot, reloading it first if it is stale."""
+        if not self._dirty:
+            return self._snapshot
+        async with self._lock:
+            if self._dirty:
+                generation = self._generation
+                snapshot = await self._load()
+                self._snapshot = snapshot
+                # A change during loading keeps the registry dirty
+                self._dirty = generation != self._generation
+        return self._snapshot
+
+    async def _load(self) -> RegistrySnapshot:
+        wgs = await self.db.pflege_wgs.find({}, {"_id": 0}).sort("position", 1).to_list(1000)
+        stammdaten = await self.db.wg_stammdaten.find({}, {"_id": 0}).to_list(1000)
+        kosten = await self.db.wg_kosten.find({}, {"_id": 0}).to_list(1000)
+        logger.info(f"WG registry loaded: {len(wgs)} WGs")
+        return RegistrySnapshot(
+            wgs=MappingProxyType({w["id"]: _freeze(w) for w in wgs}),
+            order=tuple(w["id"] for w in wgs),
+            stammdaten=MappingProxyType({s["wg_id"]: _freeze(s) for s in stammdaten if s.get("wg_id")}),
+            kosten=MappingProxyType({k["wg_id"]: _freeze(k) for k in kosten if k.get("wg_id")}),
+        )
+
+    async def get(self, wg_id: str) -> Optional[dict]:
+        """WG metadata as a fresh dict, or None if the WG does not exist."""
+        wg = (await self.snapshot()).wgs.get(wg_id)
+        return dict(wg) if wg is not None else None
+
+    async def all(self) -> list:
+        """All WGs in display order."""
+        snapshot = await self.snapshot()
+        return [dict(snapshot.wgs[wg_id]) for wg_id in snapshot.order]
+
+    async def stammdaten(self, wg_id: str) -> dict:
+        """Stammdaten of a WG ({} if none are configured)."""
+        stammdaten = (await self.snapshot()).stammdaten.get(wg_id)
+        return dict(stammdaten) if stammdaten is not None else {}
+
+    async def kosten(self, wg_id: str) -> Optional[dict]:
+        """Cost configuration of a WG, or None if only defaults apply."""
+        kosten = (await self.snapshot()).kosten.get(wg_id)
+        return dict(kosten) if kosten is not None else None
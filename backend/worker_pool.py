@@ -0,0 +1,197 @@
+"""
+Worker Pool
+Bounded process pool for CPU-heavy work (image processing, PDF rendering).
+
+Runs picklable functions in a ProcessPoolExecutor so the event loop stays
+responsive. At most max_workers + queue_size tasks are accepted at once;
+further submissions fail fast with WorkerPoolBusy so the API can answer 503
+instead of piling up work.
+
+Tasks exceeding the timeout fail with asyncio.TimeoutError. A task that was
+still queued is simply cancelled. A running one cannot be interrupted, so
+its executor is retired: new tasks go to a fresh executor, the other tasks
+of the retired one finish normally, and then the runaway worker (whose PID
+each task reports when it starts) is terminated.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolBusy(Exception):
+    """Raised when the pool's queue is full."""
+
+
+# Worker side: queue on which tasks report (task id, pid) when they start
+_started = None
+
+
+def _init_worker(started, initializer, initargs):
+    global _started
+    _started = started
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _call(task_id: int, fn, args):
+    _started.put((task_id, os.getpid()))
+    return fn(*args)
+
+
+class _Generation:
+    """One executor together with the tasks submitted to it."""
+
+    def __init__(self, executor, started):
+        self.executor = executor
+        self.started = started
+        self.futures = {}  # task id -> asyncio future
+        self.pids = {}  # task id -> worker pid, once the task runs
+        self.stuck_pids = set()
+        self.retired = False
+
+    def collect_pids(self):
+        """Read start reports from the queue (also keeps its pipe from filling up)."""
+        while not self.started.empty():
+            task_id, pid = self.started.get()
+            if task_id in self.futures:
+                self.pids[task_id] = pid
+
+    def stop(self):
+        for pid in self.stuck_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class WorkerPool:
+    def __init__(self, name: str, max_workers: int, queue_size: int, timeout: float,
+                 initializer=None, initargs=(), max_tasks_per_child: int = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + queue_size
+        self.timeout = timeout
+        self._initializer = initializer
+        self._initargs = initargs
+        self._max_tasks_per_child = max_tasks_per_child
+        # Recycling workers requires spawned processes (ProcessPoolExecutor default then)
+        self._context = multiprocessing.get_context("spawn" if max_tasks_per_child else None)
+        self._current = None
+        self._retired = set()
+        self._task_ids = itertools.count()
+        self._in_flight = 0
+
+        self.in_flight_gauge = metrics.gauge(f"{name}_pool_in_flight", f"Tasks running or queued in the {name} pool")
+        self.queue_depth_gauge = metrics.gauge(f"{name}_pool_queue_depth", f"Tasks waiting for a free {name} worker")
+        self.task_timer = metrics.timer(f"{name}_pool_task_seconds", f"Wall time of {name} pool tasks incl. queueing")
+        self.rejected_counter = metrics.counter(
+            f"{name}_pool_rejected_total", f"Tasks rejected because the {name} queue was full"
+        )
+        self.timeout_counter = metrics.counter(
+            f"{name}_pool_timeouts_total", f"Tasks that exceeded the {name} pool timeout"
+        )
+        self.error_counter = metrics.counter(f"{name}_pool_errors_total", f"Tasks that raised in the {name} pool")
+
+    def _generation(self) -> _Generation:
+        if self._current is None:
+            started = self._context.SimpleQueue()
+            executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(started, self._initializer, self._initargs),
+                max_tasks_per_child=self._max_tasks_per_child,
+            )
+            self._current = _Generation(executor, started)
+        return self._current
+
+    def _update_gauges(self):
+        self.in_flight_gauge.set(self._in_flight)
+        self.queue_depth_gauge.set(max(0, self._in_flight - self.max_workers))
+
+    def check_capacity(self):
+        """Raise WorkerPoolBusy if a task submitted now would be rejected."""
+        if self._in_flight >= self.capacity:
+            self.rejected_counter.inc()
+            raise WorkerPoolBusy(f"{self.name} pool busy ({self._in_flight} tasks)")
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in a worker process and return its result."""
+        self.check_capacity()
+        self._in_flight += 1
+        self._update_gauges()
+        start = time.perf_counter()
+        generation = self._generation()
+        task_id = next(self._task_ids)
+        try:
+            future = generation.executor.submit(_call, task_id, fn, args)
+            generation.futures[task_id] = asyncio.wrap_future(future)
+            return await asyncio.wait_for(generation.futures[task_id], self.timeout)
+        except asyncio.TimeoutError:
+            self.timeout_counter.inc()
+            if future.cancel():
+                logger.error(f"{self.name} pool task timed out after {self.timeout}s while queued")
+            else:
+                logger.error(f"{self.name} pool task timed out after {self.timeout}s, retiring its worker")
+                self._retire(generation, task_id)
+            raise
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OS); start over with a fresh executor
+            self.error_counter.inc()
+            if self._current is generation:
+                self._current = None
+                generation.stop()
+            raise
+        except Exception:
+            self.error_counter.inc()
+            raise
+        finally:
+            generation.futures.pop(task_id, None)
+            generation.pids.pop(task_id, None)
+            generation.collect_pids()
+            self._in_flight -= 1
+            self._update_gauges()
+            self.task_timer.observe(time.perf_counter() - start)
+
+    def _retire(self, generation: _Generation, task_id: int):
+        """Stop using generation's executor and terminate the worker running task_id."""
+        generation.collect_pids()
+        pid = generation.pids.get(task_id)
+        if pid is not None:
+            generation.stuck_pids.add(pid)
+        else:
+            logger.warning(f"{self.name} pool: worker of timed-out task unknown, it keeps running")
+        if generation.retired:
+            return
+        generation.retired = True
+        if self._current is generation:
+            self._current = None
+        self._retired.add(generation)
+        asyncio.get_running_loop().create_task(self._drain(generation))
+
+    async def _drain(self, generation: _Generation):
+        # Let the other tasks of the retired executor finish (they have their own timeouts)
+        while generation.futures:
+            await asyncio.gather(*list(generation.futures.values()), return_exceptions=True)
+            await asyncio.sleep(0)
+        generation.stop()
+        self._retired.discard(generation)
+
+    def shutdown(self):
+        for generation in [self._current, *self._retired]:
+            if generation is not None:
+                generation.stop()
+        self._current = None
+        self._retired.clear()
@@ -47,7 +47,36 @@ import {
 import { Label } from "../components/ui/label";
 import { toast } from "sonner";
 
-const API = `${import.meta.env.VITE_BACKEND_URL}/api`;
+const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+// Uploaded documents are served by the backend (relative /api/... URL) and need the
+// Bearer token, so they are fetched via axios and handed over as an object URL.
+const openDocument = async (doc, download = false) => {
+  if (!doc.file_url?.startsWith("/")) {
+    window.open(doc.file_url, "_blank");
+    return;
+  }
+  // Open the tab before awaiting the download, otherwise popup blockers interfere
+  const tab = download ? null : window.open("", "_blank");
+  try {
+    const response = await axios.get(`${BACKEND_URL}${doc.file_url}`, { responseType: "blob" });
+    const url = window.URL.createObjectURL(response.data);
+    if (tab) {
+      tab.location.href = url;
+    } else {
+      const a = document.createElement("a");
+      a.href = url;
+      a.download = doc.name;
+      a.click();
+    }
+    // The tab needs the URL until it has loaded the document
+    setTimeout(() => window.URL.revokeObjectURL(url), 60000);
+  } catch (error) {
+    tab?.close();
+    toast.error("Dokument konnte nicht geladen werden");
+  }
+};
 
 const categoryOptions = ["Vertrag", "Protokoll", "Rechnung", "Grundriss", "Sonstiges"];
 const categoryColors = {
@@ -379,7 +408,7 @@ export default function Dokumente() {
                           <Button
                             size="sm"
                             variant="ghost"
-                            onClick={() => window.open(doc.file_url, "_blank")}
+                            onClick={() => openDocument(doc)}
                             className="flex-1 text-slate-500 hover:text-slate-900 hover:bg-slate-50"
                           >
                             <Eye className="w-4 h-4 mr-1" /> Anzeigen
@@ -387,7 +416,7 @@ export default function Dokumente() {
                           <Button
                             size="sm"
                             variant="ghost"
-                            onClick={() => window.open(doc.file_url, "_blank")}
+                            onClick={() => openDocument(doc, true)}
                             className="text-slate-500 hover:text-slate-900 hover:bg-slate-50"
                           >
                             <Download className="w-4 h-4" />
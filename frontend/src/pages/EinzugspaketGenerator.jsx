@@ -137,13 +137,22 @@ export default function EinzugspaketGenerator() {
     }
     setGenerating(true);
     try {
-      const response = await axios.post(`${API_URL}/api/einzugspaket/generate`, {
+      // Rendering runs as a background job: submit, long-poll until done, then download
+      let { data: job } = await axios.post(`${API_URL}/api/einzugspaket/jobs`, {
         klient_id: selectedKlientId,
         wg_id: selectedWgId,
         zimmer_id: selectedZimmerId,
         mietbeginn: mietbeginn || null,
         dokumente: selectedSections.length === sections.length ? null : selectedSections,
-      }, { responseType: 'blob' });
+      });
+      while (job.status !== 'fertig' && job.status !== 'fehler') {
+        ({ data: job } = await axios.get(`${API_URL}/api/einzugspaket/jobs/${job.job_id}`, { params: { wait: 25 } }));
+      }
+      if (job.status === 'fehler') {
+        toast.error(job.fehler || 'Fehler beim Generieren');
+        return;
+      }
+      const response = await axios.get(`${API_URL}${job.download_url}`, { responseType: 'blob' });
 
       const url = window.URL.createObjectURL(new Blob([response.data], { type: 'application/pdf' }));
       const a = document.createElement('a');
@@ -88,6 +88,59 @@ const DOK_KATEGORIEN = [
   { value: 'sonstiges', label: 'Sonstiges' },
 ];
 
+// <img src> cannot send the Bearer token, so thumbnails are fetched via axios once
+// they scroll into view and shown from an object URL; the icon stays on failure.
+function DokumentThumbnail({ url }) {
+  const ref = useRef(null);
+  const [visible, setVisible] = useState(false);
+  const [src, setSrc] = useState(null);
+  const [failed, setFailed] = useState(false);
+
+  useEffect(() => {
+    const observer = new IntersectionObserver(([entry]) => {
+      if (entry.isIntersecting) {
+        setVisible(true);
+        observer.disconnect();
+      }
+    }, { rootMargin: '200px' });
+    if (ref.current) observer.observe(ref.current);
+    return () => observer.disconnect();
+  }, []);
+
+  useEffect(() => {
+    if (!visible) return undefined;
+    let objectUrl = null;
+    let cancelled = false;
+    axios.get(`${API_URL}${url}`, { responseType: 'blob' })
+      .then((response) => {
+        if (cancelled) return;
+        objectUrl = URL.createObjectURL(response.data);
+        setSrc(objectUrl);
+      })
+      .catch(() => { if (!cancelled) setFailed(true); });
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [url, visible]);
+
+  if (src && !failed) {
+    return (
+      <img
+        src={src}
+        alt=""
+        className="w-10 h-14 object-cover object-top rounded border border-slate-200 bg-white"
+        onError={() => setFailed(true)}
+      />
+    );
+  }
+  return (
+    <div ref={ref} className="p-2 bg-cyan-50 rounded-lg">
+      <FileText className="w-5 h-5 text-cyan-500" />
+    </div>
+  );
+}
+
 export default function KlientDetail() {
   const { klientId } = useParams();
   const navigate = useNavigate();
@@ -217,6 +270,9 @@ export default function KlientDetail() {
       } else {
         toast.success('E-Mail als Kommunikationseintrag gespeichert');
       }
+      if (result.fehlende_anhaenge?.length) {
+        toast.warning(`Nicht angehängt (Datei fehlt): ${result.fehlende_anhaenge.join(', ')}`);
+      }
       setShowEmailDialog(false);
       setEmailData({ betreff: '', inhalt: '', empfaenger: '', dokument_ids: [] });
       fetchKlient();
@@ -806,9 +862,13 @@ export default function KlientDetail() {
                   {dokumente.map((doc) => (
                     <div key={doc.id} className="flex items-center justify-between p-4 bg-white rounded-lg border border-slate-200 hover:bg-slate-50 transition-colors" data-testid={`dokument-${doc.id}`}>
                       <div className="flex items-center gap-3 flex-1">
-                        <div className="p-2 bg-cyan-50 rounded-lg">
-                          <FileText className="w-5 h-5 text-cyan-500" />
-                        </div>
+                        {doc.thumbnail_url ? (
+                          <DokumentThumbnail url={doc.thumbnail_url} />
+                        ) : (
+                          <div className="p-2 bg-cyan-50 rounded-lg">
+                            <FileText className="w-5 h-5 text-cyan-500" />
+                          </div>
+                        )}
                         <div className="flex-1">
                           <p className="text-slate-900 font-medium">{doc.name}</p>
                           <div className="flex items-center gap-3 text-slate-500 text-sm mt-1">
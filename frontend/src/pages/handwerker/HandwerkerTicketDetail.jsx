@@ -39,10 +39,12 @@ import {
 } from "../../components/ui/dialog";
 import { toast } from "sonner";
 
-const API = `${import.meta.env.VITE_BACKEND_URL}/api`;
+const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
 
 const statusOptions = ["Unterwegs", "Vor Ort", "In Arbeit", "Erledigt", "Material fehlt"];
 const photoCategories = ["Vorher", "Während", "Nachher"];
+const MAX_UPLOAD_RETRIES = 5;
 
 const statusColors = {
   Unterwegs: "bg-cyan-600",
@@ -130,21 +132,53 @@ export default function HandwerkerTicketDetail() {
     }
   };
 
+  // Resumable upload: only chunks that did not arrive are sent again
+  const uploadPhotoResumable = async (file, params) => {
+    const { data: session } = await axios.post(`${API}/handwerker/ticket/${ticketId}/photo-uploads`, {
+      total_size: file.size,
+      filename: file.name,
+      content_type: file.type,
+      ...params,
+    });
+    const uploadId = session.upload_id;
+    let missing = session.missing_chunks;
+
+    for (let attempt = 0; missing.length > 0; attempt++) {
+      if (attempt > MAX_UPLOAD_RETRIES) throw new Error("Upload nach mehreren Versuchen abgebrochen");
+      for (const index of missing) {
+        const start = index * session.chunk_size;
+        try {
+          await axios.put(
+            `${API}/handwerker/photo-uploads/${uploadId}/chunks/${index}`,
+            file.slice(start, start + session.chunk_size),
+            { headers: { "Content-Type": "application/octet-stream" } }
+          );
+        } catch (error) {
+          // Connection dropped - wait, then ask the server which chunks arrived
+          await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** attempt));
+          break;
+        }
+      }
+      const { data: progress } = await axios.get(`${API}/handwerker/photo-uploads/${uploadId}`);
+      missing = progress.missing_chunks;
+    }
+
+    await axios.post(`${API}/handwerker/photo-uploads/${uploadId}/complete`);
+  };
+
   const handlePhotoCapture = async (e) => {
     const file = e.target.files?.[0];
     if (!file) return;
     
     setUploadingPhoto(true);
-    const formData = new FormData();
-    formData.append("file", file);
     
     try {
       const handwerkerId = localStorage.getItem("handwerker_id");
-      await axios.post(
-        `${API}/handwerker/ticket/${ticketId}/photo?category=${photoCategory}&description=${encodeURIComponent(photoDescription)}&handwerker_id=${handwerkerId}`,
-        formData,
-        { headers: { "Content-Type": "multipart/form-data" } }
-      );
+      await uploadPhotoResumable(file, {
+        category: photoCategory,
+        description: photoDescription,
+        handwerker_id: handwerkerId,
+      });
       toast.success("Foto hochgeladen");
       setShowPhotoDialog(false);
       setPhotoCategory("Während");
@@ -323,7 +357,8 @@ export default function HandwerkerTicketDetail() {
               {ticket.photos.map((photo) => (
                 <div key={photo.id} className="relative group">
                   <img
-                    src={photo.thumbnail_url || photo.photo_url}
+                    src={`${BACKEND_URL}${photo.thumbnail_url}`}
+                    loading="lazy"
                     alt={photo.category}
                     onClick={() => setSelectedPhoto(photo)}
                     className="w-full aspect-square rounded-xl object-cover cursor-pointer"
@@ -523,7 +558,7 @@ export default function HandwerkerTicketDetail() {
             <X className="w-6 h-6" />
           </button>
           <img
-            src={selectedPhoto.photo_url}
+            src={`${BACKEND_URL}${selectedPhoto.medium_url || selectedPhoto.photo_url}`}
             alt={selectedPhoto.category}
             className="max-w-full max-h-full object-contain rounded-xl"
           />
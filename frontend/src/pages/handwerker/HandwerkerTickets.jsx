@@ -17,7 +17,8 @@ import {
 import { Button } from "../../components/ui/button";
 import { toast } from "sonner";
 
-const API = `${import.meta.env.VITE_BACKEND_URL}/api`;
+const BACKEND_URL = import.meta.env.VITE_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
 
 const statusColors = {
   Offen: "bg-amber-500/20 text-amber-400 border-amber-500/30",
@@ -241,20 +242,21 @@ export default function HandwerkerTickets() {
                 </div>
               )}
 
-              {ticket.photos?.length > 0 && (
+              {ticket.photo_count > 0 && (
                 <div className="mt-3 flex items-center gap-2">
                   <div className="flex -space-x-2">
                     {ticket.photos.slice(0, 3).map((photo, idx) => (
                       <img
                         key={photo.id}
-                        src={photo.thumbnail_url || photo.photo_url}
+                        src={`${BACKEND_URL}${photo.thumbnail_url}`}
+                        loading="lazy"
                         alt=""
                         className="w-8 h-8 rounded-lg border-2 border-white object-cover"
                       />
                     ))}
                   </div>
-                  {ticket.photos.length > 3 && (
-                    <span className="text-xs text-slate-400">+{ticket.photos.length - 3}</span>
+                  {ticket.photo_count > 3 && (
+                    <span className="text-xs text-slate-400">+{ticket.photo_count - 3}</span>
                   )}
                 </div>
               )}
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark Einzugspaket PDF rendering with sample data (no database needed).
+
+Modes:
+    cold       new EinzugspaketGenerator per run (templates, CSS and fonts loaded each time)
+    warm       one generator without fragment cache (shared templates, CSS, FontConfiguration)
+    fragments  one generator with fragment cache; each run changes mietbeginn,
+               so only the sections printing it are laid out again
+    templates  Jinja rendering of all sections only (no PDF layout)
+
+Usage:
+    python scripts/benchmark_einzugspaket.py [--runs 5] [--modes cold,warm,fragments,templates]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path for pdf_generator
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from pdf_generator import DOCUMENT_SECTIONS, EinzugspaketGenerator
+
+KLIENT = {
+    "vorname": "Erika", "nachname": "Mustermann", "geburtsdatum": "1938-04-12",
+    "geschlecht": "weiblich", "pflegegrad": "3", "diagnosen": "Demenz",
+    "kontakt_name": "Max Mustermann", "kontakt_beziehung": "Sohn",
+    "kontakt_email": "max@example.de", "kontakt_telefon": "+49 30 1234567",
+}
+WG = {"kurzname": "Sterndamm", "property_name": "Sterndamm 10", "kapazitaet": 8}
+ZIMMER = {"nummer": "3", "flaeche_qm": 18.5, "grundmiete_kalt": 520.0}
+STAMMDATEN = {
+    "pflegedienst_name": "DomusVita Pflegedienst",
+    "vermieter_name": "DomusVita GmbH", "vermieter_strasse": "Sterndamm 10",
+    "vermieter_plz_ort": "12109 Berlin", "vermieter_bank": "Berliner Bank",
+    "vermieter_iban": "DE00 1000 0000 0000 0000 00",
+    "wg_adresse_strasse": "Sterndamm 10", "wg_adresse_plz_ort": "12109 Berlin",
+    "haushaltsbuch_bank": "Berliner Bank", "haushaltsbuch_iban": "DE00 1000 0000 0000 0000 01",
+    "lebensmittelpauschale": 290.0, "wg_beitrag": 30.0, "wg_zuschlag": 224.0, "entlastungsbetrag": 125.0,
+}
+
+
+def params(run: int) -> dict:
+    return {
+        "klient": KLIENT, "wg": WG, "zimmer": ZIMMER, "stammdaten": STAMMDATEN,
+        "mietbeginn": f"{run % 28 + 1:02d}.01.2026",
+    }
+
+
+def bench_cold(runs: int) -> list:
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        EinzugspaketGenerator().generate(**params(run))
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_warm(runs: int) -> list:
+    generator = EinzugspaketGenerator()
+    generator.generate(**params(0))  # Warm-up: fonts, CSS, page number overlay
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        generator.generate(**params(run))
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_fragments(runs: int) -> list:
+    generator = EinzugspaketGenerator()
+    fragments = {}
+    generator.generate(**params(0), fragments=fragments)
+    times = []
+    for run in range(1, runs + 1):
+        start = time.perf_counter()
+        generator.generate(**params(run), fragments=fragments)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_templates(runs: int) -> list:
+    generator = EinzugspaketGenerator()
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        generator.generate_preview_html(**params(run), sections=DOCUMENT_SECTIONS)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+MODES = {
+    "cold": bench_cold,
+    "warm": bench_warm,
+    "fragments": bench_fragments,
+    "templates": bench_templates,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Einzugspaket PDF rendering")
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs per mode")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated modes")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'min ms':>9} {'median ms':>10} {'max ms':>9}")
+    for mode in args.modes.split(","):
+        times = [t * 1000 for t in MODES[mode](args.runs)]
+        print(f"{mode:<10} {min(times):>9.1f} {statistics.median(times):>10.1f} {max(times):>9.1f}")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Move large payload fields of existing rows into the zstd side column.
+
+Rows written before compression was enabled still carry email bodies and
+legacy file_data inline in JSONB. This script re-packs them and can train
+a zstd dictionary for the email collections (used for all new writes once
+the server restarts).
+
+Usage:
+    python scripts/compress_payloads.py [--train] [--samples 1000]
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend to path for database module
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from dotenv import load_dotenv
+
+# Load .env from backend
+load_dotenv(Path(__file__).parent.parent / "backend" / ".env")
+
+from compression import COMPRESSED_FIELDS
+from database import PgDatabase
+
+# Collections with many similar values, where a dictionary pays off
+DICTIONARY_TABLES = ("klient_kommunikation", "email_allgemein")
+
+
+async def main(train: bool, samples: int):
+    db = await PgDatabase.create()
+    try:
+        for table, fields in COMPRESSED_FIELDS.items():
+            db.compress(table, fields)
+        await db.load_compression_dictionaries()
+
+        for table in COMPRESSED_FIELDS:
+            moved = await getattr(db, table).repack()
+            print(f"{table}: {moved} rows compressed")
+
+        if train:
+            for table in DICTIONARY_TABLES:
+                try:
+                    dict_id = await db.train_compression_dictionary(table, samples=samples)
+                    print(f"{table}: dictionary {dict_id} trained")
+                except ValueError as e:
+                    print(f"{table}: {e}")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress large payload fields of existing rows")
+    parser.add_argument("--train", action="store_true", help="Train zstd dictionaries for email bodies")
+    parser.add_argument("--samples", type=int, default=1000, help="Sample rows per dictionary")
+    args = parser.parse_args()
+    asyncio.run(main(args.train, args.samples))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Microsoft Graph mail endpoints used by email_service.
+
+Implements token, subscriptions (including the validationToken handshake),
+inbox delta, $batch mark-as-read, sendMail and drafts with attachment upload
+sessions in memory. POST /_stub/messages drops a message into the inbox and
+sends a change notification to every subscription, so the webhook and
+large-attachment paths can be tested end to end without a tenant.
+
+Usage:
+    python scripts/graph_stub.py [--port 8100]
+
+    # Backend environment:
+    GRAPH_BASE_URL=http://localhost:8100/v1.0
+    GRAPH_TOKEN_URL=http://localhost:8100/token
+    AZURE_AD_TENANT_ID=stub AZURE_AD_CLIENT_ID=stub GRAPH_CLIENT_SECRET=stub
+    GRAPH_NOTIFICATION_URL=http://localhost:8001/api/graph/notifications
+    GRAPH_WEBHOOK_SECRET=stub-secret
+
+    # Deliver a message:
+    curl -X POST localhost:8100/_stub/messages -H 'Content-Type: application/json' \\
+         -d '{"subject": "Anfrage Pflege-WG", "from": "max@example.de", "body": "Hallo"}'
+    # Simulate a lifecycle event (subscriptionRemoved, reauthorizationRequired, missed):
+    curl -X POST localhost:8100/_stub/lifecycle/subscriptionRemoved
+"""
+
+import argparse
+import base64
+import re
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+app = FastAPI(title="Graph stub")
+
+messages = []  # Inbox in arrival order
+subscriptions = {}
+sent = []
+drafts = {}
+uploads = {}
+
+
+def _delta_link(request: Request, position: int) -> str:
+    return f"{request.base_url}v1.0/_delta?position={position}"
+
+
+def _delta_page(request: Request, position: int) -> dict:
+    return {"value": messages[position:], "@odata.deltaLink": _delta_link(request, len(messages))}
+
+
+async def _notify(payload_for):
+    async with httpx.AsyncClient() as client:
+        for subscription in list(subscriptions.values()):
+            url = subscription["notificationUrl"]
+            try:
+                await client.post(url, json={"value": [payload_for(subscription)]}, timeout=10.0)
+            except httpx.HTTPError as e:
+                print(f"Notification to {url} failed: {e}")
+
+
+@app.post("/token")
+async def token():
+    return {"access_token": "stub-token", "expires_in": 3600}
+
+
+@app.post("/v1.0/subscriptions", status_code=201)
+async def create_subscription(request: Request):
+    body = await request.json()
+    # Graph validates the endpoint before creating the subscription
+    validation_token = uuid.uuid4().hex
+    async with httpx.AsyncClient() as client:
+        for url in {body["notificationUrl"], body.get("lifecycleNotificationUrl") or body["notificationUrl"]}:
+            resp = await client.post(url, params={"validationToken": validation_token}, timeout=10.0)
+            if resp.status_code != 200 or resp.text != validation_token:
+                raise HTTPException(400, f"Validation of {url} failed")
+    subscription = {**body, "id": str(uuid.uuid4())}
+    subscriptions[subscription["id"]] = subscription
+    return subscription
+
+
+@app.patch("/v1.0/subscriptions/{subscription_id}")
+async def renew_subscription(subscription_id: str, request: Request):
+    if subscription_id not in subscriptions:
+        raise HTTPException(404, "Subscription not found")
+    subscriptions[subscription_id].update(await request.json())
+    return subscriptions[subscription_id]
+
+
+@app.delete("/v1.0/subscriptions/{subscription_id}", status_code=204)
+async def delete_subscription(subscription_id: str):
+    subscriptions.pop(subscription_id, None)
+
+
+@app.get("/v1.0/users/{user}/mailFolders/inbox/messages/delta")
+async def initial_delta(user: str, request: Request):
+    return _delta_page(request, 0)
+
+
+@app.get("/v1.0/_delta")
+async def delta(position: int, request: Request):
+    return _delta_page(request, position)
+
+
+@app.post("/v1.0/$batch")
+async def batch(request: Request):
+    responses = []
+    for item in (await request.json())["requests"]:
+        message_id = item["url"].rsplit("/", 1)[-1]
+        message = next((m for m in messages if m["id"] == message_id), None)
+        if message is not None:
+            message.update(item.get("body") or {})
+        responses.append({"id": item["id"], "status": 200 if message else 404})
+    return {"responses": responses}
+
+
+@app.post("/v1.0/users/{user}/sendMail", status_code=202)
+async def send_mail(user: str, request: Request):
+    sent.append(await request.json())
+    return Response(status_code=202)
+
+
+@app.post("/v1.0/users/{user}/messages", status_code=201)
+async def create_draft(user: str, request: Request):
+    draft = {**(await request.json()), "id": str(uuid.uuid4()), "attachments": []}
+    drafts[draft["id"]] = draft
+    return draft
+
+
+@app.delete("/v1.0/users/{user}/messages/{message_id}", status_code=204)
+async def delete_draft(user: str, message_id: str):
+    drafts.pop(message_id, None)
+
+
+@app.post("/v1.0/users/{user}/messages/{message_id}/attachments", status_code=201)
+async def add_attachment(user: str, message_id: str, request: Request):
+    attachment = await request.json()
+    size = len(base64.b64decode(attachment["contentBytes"]))
+    drafts[message_id]["attachments"].append({"name": attachment["name"], "size": size})
+    return {"id": str(uuid.uuid4()), "name": attachment["name"], "size": size}
+
+
+@app.post("/v1.0/users/{user}/messages/{message_id}/attachments/createUploadSession")
+async def create_upload_session(user: str, message_id: str, request: Request):
+    item = (await request.json())["AttachmentItem"]
+    upload_id = str(uuid.uuid4())
+    uploads[upload_id] = {"message_id": message_id, "name": item["name"], "size": item["size"], "received": 0}
+    return {"uploadUrl": f"{request.base_url}_upload/{upload_id}", "nextExpectedRanges": ["0-"]}
+
+
+@app.put("/_upload/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    if "authorization" in request.headers:
+        raise HTTPException(401, "Upload URLs must be called without Authorization")
+    upload = uploads[upload_id]
+    start, end, total = map(int, re.match(r"bytes (\d+)-(\d+)/(\d+)", request.headers["content-range"]).groups())
+    chunk = await request.body()
+    if start != upload["received"] or len(chunk) != end - start + 1 or total != upload["size"]:
+        raise HTTPException(416, "Unexpected range")
+    upload["received"] = end + 1
+    if upload["received"] < total:
+        return Response(
+            status_code=200, content=f'{{"nextExpectedRanges": ["{end + 1}-"]}}', media_type="application/json"
+        )
+    drafts[upload["message_id"]]["attachments"].append({"name": upload["name"], "size": total})
+    del uploads[upload_id]
+    return Response(status_code=201)
+
+
+@app.post("/v1.0/users/{user}/messages/{message_id}/send", status_code=202)
+async def send_draft(user: str, message_id: str):
+    sent.append(drafts.pop(message_id))
+    return Response(status_code=202)
+
+
+@app.post("/_stub/messages")
+async def deliver(request: Request):
+    body = await request.json()
+    message = {
+        "id": str(uuid.uuid4()),
+        "subject": body.get("subject", ""),
+        "body": {"contentType": "text", "content": body.get("body", "")},
+        "from": {"emailAddress": {"address": body.get("from", ""), "name": body.get("name", "")}},
+        "receivedDateTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "hasAttachments": False,
+        "isRead": False,
+    }
+    messages.append(message)
+    await _notify(lambda s: {
+        "subscriptionId": s["id"],
+        "clientState": s.get("clientState"),
+        "changeType": "created",
+        "resource": f"{s['resource']}/{message['id']}",
+    })
+    return message
+
+
+@app.post("/_stub/lifecycle/{event}")
+async def lifecycle(event: str):
+    if event == "subscriptionRemoved":
+        removed = list(subscriptions.values())
+        subscriptions.clear()
+    else:
+        removed = []
+    targets = removed or list(subscriptions.values())
+    async with httpx.AsyncClient() as client:
+        for s in targets:
+            await client.post(s.get("lifecycleNotificationUrl") or s["notificationUrl"], json={"value": [{
+                "subscriptionId": s["id"], "clientState": s.get("clientState"), "lifecycleEvent": event,
+            }]}, timeout=10.0)
+    return {"notified": len(targets)}
+
+
+@app.get("/_stub/state")
+async def state():
+    return {"messages": messages, "subscriptions": list(subscriptions.values()), "sent": sent}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Microsoft Graph stand-in")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port)